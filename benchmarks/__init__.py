@@ -0,0 +1,5 @@
+"""
+Benchmarks for the data preparation fetch paths.
+
+Run from the repo root with: python -m benchmarks.run
+"""
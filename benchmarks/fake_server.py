@@ -0,0 +1,250 @@
+"""
+Local stand-in for the Met Collection API, its image CDN and the
+leonardoda-vinci.org listing pages.
+
+Responses are deterministic per object ID / page number. Latency, a
+per-connection bandwidth cap, rate limiting (429 with Retry-After),
+random failures, connections reset mid-body and Range support are configurable, so the downloaders can be benchmarked
+under realistic conditions without touching the real sites.
+
+Run standalone with: python -m benchmarks.fake_server --port 8765 --latency 0.05
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+API_PATH = "/public/collection/v1/objects"
+LISTING_FIRST = "/the-complete-works.html"
+LISTING_PAGE = re.compile(r"^/the-complete-works_pageno-(\d+)\.html")
+
+
+@dataclass
+class ServerConfig:
+    """
+    Behaviour of the fake server.
+
+    Image sizes are log-normal around `image_median_bytes` (Met originals
+    are a few MB; use a smaller median for da Vinci thumbnails).
+    """
+    latency: float = 0.0              # seconds before each response
+    bandwidth: float = 0.0            # bytes/second per connection (0 = unlimited)
+    rate_limit: float = 0.0           # probability of a 429 response
+    retry_after: int = 1              # Retry-After seconds sent with 429s
+    failure_rate: float = 0.0         # probability of a 500 response
+    reset_rate: float = 0.0           # probability of closing the connection halfway through an image
+    ranges: bool = True               # honour Range requests for images
+    no_image_rate: float = 0.1        # share of objects without a primary image
+    image_median_bytes: int = 2_500_000
+    image_sigma: float = 0.8
+    image_max_bytes: int = 40_000_000
+    dv_pages: int = 4
+    dv_per_page: int = 96
+    dv_image_bytes: int = 200_000
+    seed: int = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _send(self, status, body=b"", content_type="application/octet-stream", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == "HEAD" or not body:
+            return
+        if content_type == "image/jpeg" and random.random() < self.config.reset_rate:
+            # Promise the full length but stop halfway, like a dropped connection
+            self.server.count("reset")
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        if not self.config.bandwidth:
+            self.wfile.write(body)
+            return
+        # Pace the body in small slices to cap this connection's throughput
+        chunk = max(1024, int(self.config.bandwidth / 20))
+        start = time.monotonic()
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            ahead = (offset + chunk) / self.config.bandwidth - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def _misbehave(self):
+        """Apply latency, rate limiting and failures; True if a response was sent."""
+        self.server.count(self.path)
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        roll = random.random()
+        if roll < self.config.rate_limit:
+            self.server.count("429")
+            self._send(429, b"Too Many Requests", "text/plain", {"Retry-After": str(self.config.retry_after)})
+            return True
+        if roll < self.config.rate_limit + self.config.failure_rate:
+            self.server.count("500")
+            self._send(500, b"Internal Server Error", "text/plain")
+            return True
+        return False
+
+    def do_GET(self):
+        if self._misbehave():
+            return
+        path = self.path.split("?")[0]
+        base = f"http://{self.headers.get('Host')}"
+
+        if path.startswith(API_PATH + "/"):
+            object_id = path.rsplit("/", 1)[-1]
+            if not object_id.isdigit():
+                return self._send(404, b'{"message": "Not a valid object"}', "application/json")
+            self._send(200, json.dumps(self.server.met_object(int(object_id))).encode(), "application/json")
+        elif path.startswith("/images/"):
+            self._send_image(self.server.payload(self.server.image_size(path)))
+        elif path == LISTING_FIRST or LISTING_PAGE.match(path):
+            match = LISTING_PAGE.match(path)
+            page = int(match.group(1)) if match else 1
+            if page > self.config.dv_pages:
+                return self._send(404, b"", "text/html")
+            self._send(200, self.server.listing_page(page), "text/html; charset=utf-8")
+        elif path.startswith("/dv/"):
+            self._send(200, self.server.payload(self.config.dv_image_bytes), "image/jpeg")
+        else:
+            self._send(404, b"", "text/plain")
+
+    do_HEAD = do_GET
+
+    def _send_image(self, body):
+        if not self.config.ranges:
+            return self._send(200, body, "image/jpeg")
+        # Bodies are slices of one buffer, so their length identifies them
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{len(body):x}"'}
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if not match or (if_range is not None and if_range != headers["ETag"]):
+            return self._send(200, body, "image/jpeg", headers)
+        first = int(match.group(1))
+        last = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+        if first >= len(body):
+            return self._send(416, b"", "image/jpeg", {"Content-Range": f"bytes */{len(body)}"})
+        headers["Content-Range"] = f"bytes {first}-{last}/{len(body)}"
+        self._send(206, body[first:last + 1], "image/jpeg", headers)
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    Threaded fake server; use as a context manager to run it in the background.
+
+    Args:
+        config: ServerConfig
+        host: Interface to bind
+        port: Port (0 picks a free one)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.config = config or ServerConfig()
+        # One random buffer sliced for every image body
+        self._payload = random.Random(self.config.seed).randbytes(self.config.image_max_bytes)
+        self.counts = {}
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, key):
+        key = key.split("/")[1] if key.startswith("/") else key
+        with self._count_lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def api_url(self):
+        # 'localhost' keeps API and image hosts apart for per-host limits
+        return f"http://localhost:{self.port}{API_PATH}"
+
+    @property
+    def image_base(self):
+        return f"http://127.0.0.1:{self.port}/images"
+
+    @property
+    def site_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def payload(self, size):
+        return self._payload[:size]
+
+    def image_size(self, path):
+        rng = random.Random(f"{self.config.seed}:{path}")
+        size = int(rng.lognormvariate(0, self.config.image_sigma) * self.config.image_median_bytes)
+        return max(1024, min(size, self.config.image_max_bytes))
+
+    def met_object(self, object_id):
+        rng = random.Random(f"{self.config.seed}:{object_id}")
+        has_image = rng.random() >= self.config.no_image_rate
+        return {
+            "objectID": object_id,
+            "isPublicDomain": True,
+            "primaryImage": f"{self.image_base}/{object_id}.jpg" if has_image else "",
+            "department": rng.choice(["European Paintings", "Drawings and Prints", "Asian Art"]),
+            "title": f"Object {object_id}",
+        }
+
+    def listing_page(self, page):
+        items = "".join(
+            f'<div class="item"><a href="/works/{page}-{i}.html">'
+            f'<img src="/dv/{page}-{i}.jpg" alt="Work {page}-{i}"></a></div>'
+            for i in range(self.config.dv_per_page)
+        )
+        pages = "".join(
+            f'<a href="/the-complete-works_pageno-{n}.html?ps=96">{n}</a>'
+            for n in range(2, self.config.dv_pages + 1)
+        )
+        return (f'<html><body><div class="row items-list-wrapper">{items}</div>'
+                f'<div class="pagination">{pages}</div></body></html>').encode()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the fake Met API / image CDN / da Vinci site")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--reset-rate', type=float, default=0.0)
+    parser.add_argument('--no-ranges', action='store_true')
+    args = parser.parse_args()
+
+    config = ServerConfig(latency=args.latency, bandwidth=args.bandwidth,
+                          rate_limit=args.rate_limit, failure_rate=args.failure_rate,
+                          reset_rate=args.reset_rate, ranges=not args.no_ranges)
+    server = FakeServer(config, port=args.port)
+    print(f"Serving on {server.site_url} (API: {server.api_url})")
+    server.serve_forever()
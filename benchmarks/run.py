@@ -0,0 +1,277 @@
+"""
+Fetch and conversion benchmarks against the local fake server.
+
+Each case runs in a fresh process so its peak memory is measured on its
+own. Results are written to benchmarks/results/<timestamp>-<commit>.json
+and compared with the previous run, flagging cases that got slower.
+
+Run from the repo root with:
+    python -m benchmarks.run
+    python -m benchmarks.run --cases met_download scraper --latency 0.05 --rate-limit 0.02
+"""
+
+import argparse
+import json
+import multiprocessing
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from benchmarks.fake_server import FakeServer, ServerConfig  # noqa: E402
+
+
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+# A case is reported as a regression when it is this much slower than last time
+REGRESSION_THRESHOLD = 0.10
+
+
+def bench_met_download(server, workdir, size):
+    from data_prep.met_museum.bulk_download import download_met_images
+    from data_prep.met_museum.client import MetClient
+    from data_prep.metrics import Metrics
+
+    metrics = Metrics("bench_met", progress_every=None)
+    with MetClient(cache_path=workdir / "api_cache.duckdb", api_url=server["api_url"], workers=16) as client:
+        counts = download_met_images(
+            range(1, size + 1), output_dir=workdir / "met", client=client, metrics=metrics,
+            host_limits={"localhost": 8, "127.0.0.1": 16}, progress_every=None,
+        )
+    return {"items": size, "bytes": metrics.total_of("bytes"), "counts": counts,
+            "request_p95_s": metrics.merged("request_seconds").percentile(0.95)}
+
+
+def bench_dv_download(server, workdir, size):
+    from data_prep.da_vinci.downloader import download_images
+    from data_prep.metrics import Metrics
+
+    metrics = Metrics("bench_dv", progress_every=None)
+    image_info = {f"Work {i}": f"{server['site_url']}/dv/{i}.jpg" for i in range(size)}
+    manifest = download_images(image_info, output_dir=workdir / "dv", metrics=metrics)
+    return {"items": size, "bytes": metrics.total_of("bytes"),
+            "failed": sum(1 for entry in manifest if entry["status"] != "success")}
+
+
+def bench_scraper(server, workdir, size):
+    from data_prep.da_vinci.scraper import extract_image_data
+
+    image_info = extract_image_data(base_url=server["site_url"])
+    return {"items": len(image_info)}
+
+
+def fixture_csv_to_parquet(server, workdir, size):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "Object Number": [f"{i}.{i % 97}" for i in range(size)],
+        "Is Highlight": rng.choice(["True", "False"], size),
+        "Is Timeline Work": rng.choice(["True", "False"], size),
+        "Is Public Domain": rng.choice(["True", "False"], size),
+        "Object ID": np.arange(1, size + 1),
+        "Department": rng.choice(["European Paintings", "Drawings and Prints", "Asian Art"], size),
+        "Title": [f"Untitled {i}" for i in range(size)],
+        "Artist Display Name": rng.choice(["Unknown", "Rembrandt", "Vermeer", ""], size),
+        "Object Begin Date": rng.integers(1200, 1900, size),
+        "Object End Date": rng.integers(1200, 1950, size),
+        "Medium": rng.choice(["Oil on canvas", "Pen and ink", "Bronze"], size),
+    })
+    frame.to_csv(workdir / "MetObjects.csv", index=False)
+    return {}
+
+
+def bench_csv_to_parquet(server, workdir, size):
+    from data_prep.met_museum.convert import csv_to_parquet
+
+    csv_path = workdir / "MetObjects.csv"
+    rows, _ = csv_to_parquet(csv_path, workdir / "MetObjects.parquet")
+    return {"items": rows, "bytes": csv_path.stat().st_size}
+
+
+# name -> (case, default size, optional fixture run beforehand in its own process
+# so that building it doesn't count towards the case's time or peak memory)
+CASES = {
+    "met_download": (bench_met_download, 2000, None),
+    "dv_download": (bench_dv_download, 331, None),
+    "scraper": (bench_scraper, None, None),
+    "csv_to_parquet": (bench_csv_to_parquet, 500_000, fixture_csv_to_parquet),
+}
+
+# Seconds a case may run before it is abandoned
+CASE_TIMEOUT = 1800
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process; ru_maxrss is in bytes on macOS and KiB elsewhere."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_case(func, server, workdir, size, results):
+    """Run one case (or fixture) in this child process and put its stats or error on `results`."""
+    try:
+        start = time.perf_counter()
+        stats = func(server, Path(workdir), size)
+        elapsed = time.perf_counter() - start
+
+        # Cases that time only their core step report it as 'seconds'
+        seconds = stats.pop("seconds", elapsed)
+        if "items" in stats:
+            stats.update({
+                "seconds": seconds,
+                "items_per_second": stats["items"] / seconds if seconds else None,
+                "mb_per_second": stats["bytes"] / seconds / 1024**2 if stats.get("bytes") and seconds else None,
+                "peak_rss_mb": _peak_rss_mb(),
+            })
+        results.put(stats)
+    except BaseException:
+        results.put({"error": traceback.format_exc()})
+        raise
+
+
+def _run_in_child(func, server, workdir, size, timeout=CASE_TIMEOUT):
+    """Run `func` in a fresh process and return what it reported; raises RuntimeError if it failed."""
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(func, server, workdir, size, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                outcome = results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    # Nothing was reported before the process ended (e.g. killed or crashed)
+                    raise RuntimeError(f"{func.__name__} exited with code {process.exitcode} without a result")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{func.__name__} did not finish within {timeout}s")
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+    if "error" in outcome:
+        raise RuntimeError(f"{func.__name__} failed:\n{outcome['error']}")
+    return outcome
+
+
+def run_case(name, server, size):
+    """Run a case (after its fixture, if any) in a fresh process; returns its stats dict."""
+    func, _, fixture = CASES[name]
+    with tempfile.TemporaryDirectory(prefix=f"leofinder-bench-{name}-") as workdir:
+        if fixture is not None:
+            _run_in_child(fixture, server, workdir, size)
+        return _run_in_child(func, server, workdir, size)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def previous_results(exclude=None):
+    """Load the most recent stored results (other than `exclude`), if any."""
+    if not RESULTS_DIR.exists():
+        return None
+    paths = sorted(p for p in RESULTS_DIR.glob("*.json") if p != exclude)
+    return json.loads(paths[-1].read_text()) if paths else None
+
+
+def compare(current, previous, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare case timings with a previous run.
+
+    Returns:
+        list: Names of cases that are slower by more than `threshold`
+    """
+    regressions = []
+    if previous is None or previous.get("server") != current["server"]:
+        print("\nNo comparable previous run (server settings differ or none stored)")
+        return regressions
+    print(f"\nCompared with {previous['commit']} ({previous['timestamp']}):")
+    for name, stats in current["cases"].items():
+        old = previous["cases"].get(name)
+        if not old or "error" in old or "error" in stats or old.get("size") != stats.get("size"):
+            continue
+        change = stats["seconds"] / old["seconds"] - 1
+        flag = "  <-- slower" if change > threshold else ""
+        print(f"  {name:<16} {old['seconds']:8.2f}s -> {stats['seconds']:8.2f}s ({change:+.0%}){flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fetch paths against a local fake server")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--size', type=int, default=None, help="Override the item count of every case")
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="Bytes/second per connection")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Probability of a 429")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Probability of a 500")
+    parser.add_argument('--reset-rate', type=float, default=0.0,
+                        help="Probability of an image connection dropped halfway")
+    parser.add_argument('--image-median-bytes', type=int, default=ServerConfig.image_median_bytes)
+    parser.add_argument('--no-save', action='store_true', help="Do not store the results")
+    args = parser.parse_args(argv)
+
+    config = ServerConfig(latency=args.latency, bandwidth=args.bandwidth, rate_limit=args.rate_limit,
+                          failure_rate=args.failure_rate, reset_rate=args.reset_rate,
+                          image_median_bytes=args.image_median_bytes)
+    current = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "server": asdict(config),
+        "cases": {},
+    }
+
+    print("=" * 60)
+    print(f"Benchmarking {', '.join(args.cases)} at commit {current['commit']}")
+    print("=" * 60)
+
+    with FakeServer(config) as server:
+        endpoints = {"api_url": server.api_url, "site_url": server.site_url}
+        for name in args.cases:
+            size = args.size or CASES[name][1]
+            try:
+                stats = run_case(name, endpoints, size)
+            except RuntimeError as e:
+                current["cases"][name] = {"size": size, "error": str(e)}
+                print(f"✗ {name:<16} {e}")
+                continue
+            stats["size"] = size
+            current["cases"][name] = stats
+            rate = f"{stats['items_per_second']:.1f} items/s" if stats["items_per_second"] else ""
+            mb = f", {stats['mb_per_second']:.1f} MB/s" if stats["mb_per_second"] else ""
+            print(f"✓ {name:<16} {stats['seconds']:8.2f}s  {rate}{mb}, peak RSS {stats['peak_rss_mb']:.0f} MB")
+        current["requests"] = dict(server.counts)
+
+    regressions = compare(current, previous_results())
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{current['timestamp'].replace(':', '')}-{current['commit']}.json"
+        path.write_text(json.dumps(current, indent=2, default=str))
+        print(f"\n✓ Results written to: {path}")
+    failed = [name for name, stats in current["cases"].items() if "error" in stats]
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,13 +8,34 @@ This package contains:
 
 # Re-export for backward compatibility and convenience
 from .da_vinci import extract_image_data, download_images, save_manifest, sanitize_filename
-from .met_museum import download_met_dataset
+from .met_museum import download_met_dataset, download_met_images
+from .state import DownloadState
+from .shards import ShardWriter, ShardReader, pack_manifest
+from .cas import ContentStore
+from .metrics import Metrics
+from .manifest_writer import ManifestWriter, read_manifest
+from .sampling import assign_splits, sample_met, balanced_stream
+from .probe import probe_image, build_probe_index
 
 __all__ = [
     'extract_image_data',
     'download_images', 
     'save_manifest',
     'sanitize_filename',
-    'download_met_dataset'
+    'download_met_dataset',
+    'download_met_images',
+    'DownloadState',
+    'ShardWriter',
+    'ShardReader',
+    'pack_manifest',
+    'ContentStore',
+    'Metrics',
+    'ManifestWriter',
+    'read_manifest',
+    'assign_splits',
+    'sample_met',
+    'balanced_stream',
+    'probe_image',
+    'build_probe_index'
 ]
 
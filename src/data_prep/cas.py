@@ -0,0 +1,274 @@
+"""
+Content-addressed image store.
+
+Every file is hashed with SHA-256 while it streams to disk and stored once
+under its digest (objects/ab/abcdef...). Named references (a title, an
+object ID) point to digests, so identical bytes fetched under different
+names are kept only once. The object and reference tables live in a
+DuckDB file next to the objects, so duplicates are recognised from the
+index without re-reading any file. The ETag and length every object was
+served with are recorded too; for hosts that send ETags, a URL announcing
+a known (ETag, length) pair in its HEAD response is not downloaded again.
+`verify` re-hashes the store in parallel.
+
+The store is opt-in (download_images(store=...)). Manifest rows, shards,
+derivatives and the inventory are still keyed by the sanitized title
+(the manifest's filename stem), so two titles that sanitize to the same
+filename still share one key downstream.
+"""
+
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+import duckdb
+import requests
+
+from .fetch import DEFAULT_CHUNK_SIZE, hash_file, stream_to_file
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    sha256 VARCHAR PRIMARY KEY,
+    size BIGINT,
+    created_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS refs (
+    namespace VARCHAR,
+    name VARCHAR,
+    sha256 VARCHAR,
+    url VARCHAR,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (namespace, name)
+);
+CREATE TABLE IF NOT EXISTS etags (
+    etag VARCHAR,
+    size BIGINT,
+    sha256 VARCHAR,
+    host VARCHAR,
+    PRIMARY KEY (etag, size)
+);
+ALTER TABLE etags ADD COLUMN IF NOT EXISTS host VARCHAR;
+"""
+
+
+class ContentStore:
+    """
+    Stores files by SHA-256 digest with named references to them.
+
+    Safe to share between download threads.
+
+    Args:
+        root: Store directory (relative to repo root)
+    """
+
+    def __init__(self, root='data/objects'):
+        repo_root = Path(__file__).parent.parent.parent
+        self.root = repo_root / root
+        self._tmp_dir = self.root / "tmp"
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.conn = duckdb.connect(str(self.root / "index.duckdb"))
+        self.conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._known = {sha for (sha,) in self.conn.execute("SELECT sha256 FROM objects").fetchall()}
+        rows = self.conn.execute("SELECT etag, size, sha256, host FROM etags").fetchall()
+        self._etags = {(etag, size): sha for etag, size, sha, _ in rows}
+        # Hosts known to send ETags; only their URLs are worth a HEAD request first
+        self._etag_hosts = {host for *_, host in rows}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Wait for a commit or tag in another thread to finish first
+        with self._lock:
+            self.conn.close()
+
+    def __contains__(self, sha256):
+        return sha256 in self._known
+
+    def __len__(self):
+        return len(self._known)
+
+    def path(self, sha256):
+        """Path of the object with the given digest."""
+        return self.root / sha256[:2] / sha256
+
+    def _remember_etag(self, etag, size, sha256, host):
+        """Record the ETag a digest was served with; call with the lock held."""
+        if etag and (etag, size) not in self._etags:
+            self.conn.execute("INSERT INTO etags VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING",
+                              [etag, size, sha256, host])
+            self._etags[(etag, size)] = sha256
+            self._etag_hosts.add(host)
+
+    def _commit(self, tmp_path, size, sha256, etag=None, host=None):
+        """Move a fully hashed temp file into place unless the digest is already stored."""
+        with self._lock:
+            self._remember_etag(etag, size, sha256, host)
+            if sha256 in self._known:
+                Path(tmp_path).unlink(missing_ok=True)
+                return False
+            target = self.path(sha256)
+            target.parent.mkdir(exist_ok=True)
+            os.replace(tmp_path, target)
+            self.conn.execute(
+                "INSERT INTO objects VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+                [sha256, size, datetime.now(timezone.utc).replace(tzinfo=None)],
+            )
+            self._known.add(sha256)
+            return True
+
+    @staticmethod
+    def _strong_etag(headers):
+        etag = headers.get('ETag')
+        return etag if etag and not etag.startswith('W/') else None
+
+    def _head(self, session, url, timeout):
+        """Strong ETag and Content-Length of a URL from a HEAD request; (None, None) if unavailable."""
+        try:
+            response = session.head(url, timeout=timeout, allow_redirects=True)
+        except requests.RequestException:
+            return None, None
+        etag = self._strong_etag(response.headers)
+        length = response.headers.get('Content-Length', '')
+        if not response.ok or not etag or not length.isdigit():
+            return None, None
+        return etag, int(length)
+
+    def put_url(self, session, url, chunk_size=DEFAULT_CHUNK_SIZE, timeout=30, metrics=None):
+        """
+        Download a URL into the store.
+
+        For hosts that sent an ETag before, a HEAD request comes first: when
+        the URL's ETag and Content-Length match an object already stored,
+        the body is not downloaded at all. The ETag of the download itself
+        is recorded for later lookups.
+
+        Args:
+            session: requests.Session to issue the request with
+            url: URL to download
+            chunk_size: Bytes read from the socket per write
+            timeout: Connect/read timeout in seconds
+            metrics: Optional Metrics passed to stream_to_file
+
+        Returns:
+            tuple: (sha256, bytes, True if the content was new)
+        """
+        host = urlparse(url).hostname
+        if host in self._etag_hosts:
+            etag, length = self._head(session, url, timeout)
+            sha256 = self._etags.get((etag, length))
+            if sha256 in self and self.path(sha256).exists():
+                return sha256, length, False
+        tmp_path = self._tmp_dir / f"{uuid.uuid4().hex}.part"
+        headers = {}
+        size, sha256 = stream_to_file(session, url, tmp_path, chunk_size=chunk_size, timeout=timeout,
+                                      metrics=metrics, response_headers=headers)
+        return sha256, size, self._commit(tmp_path, size, sha256, self._strong_etag(headers), host)
+
+    def put_file(self, path, move=False):
+        """
+        Add an existing file to the store.
+
+        Args:
+            path: File to add
+            move: Move the file instead of copying it
+
+        Returns:
+            tuple: (sha256, bytes, True if the content was new)
+        """
+        size, sha256 = hash_file(path)
+        if sha256 in self:
+            if move:
+                Path(path).unlink()
+            return sha256, size, False
+        tmp_name = self._tmp_dir / f"{uuid.uuid4().hex}.part"
+        if move:
+            shutil.move(path, tmp_name)
+        else:
+            shutil.copyfile(path, tmp_name)
+        return sha256, size, self._commit(tmp_name, size, sha256)
+
+    def tag(self, namespace, name, sha256, url=None):
+        """Point the reference `namespace/name` at a stored digest."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?)",
+                [namespace, str(name), sha256, url, datetime.now(timezone.utc).replace(tzinfo=None)],
+            )
+
+    def refs(self, namespace):
+        """
+        Return all references in a namespace.
+
+        Returns:
+            dict: name -> (sha256, url)
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT name, sha256, url FROM refs WHERE namespace = ?", [namespace]
+            ).fetchall()
+        return {name: (sha256, url) for name, sha256, url in rows}
+
+    def verify(self, workers=8, remove=False):
+        """
+        Re-hash every stored object in parallel.
+
+        Args:
+            workers: Number of hashing threads (hashlib releases the GIL)
+            remove: Delete corrupt or missing objects from the index so the
+                    next download fetches them again
+
+        Returns:
+            dict: Lists of 'corrupt' and 'missing' digests, and the 'checked' count
+        """
+        digests = sorted(self._known)
+        corrupt, missing = [], []
+
+        def check(sha256):
+            path = self.path(sha256)
+            if not path.exists():
+                return 'missing'
+            return None if hash_file(path)[1] == sha256 else 'corrupt'
+
+        print("=" * 60)
+        print(f"Verifying {len(digests):,} objects in {self.root}")
+        print("=" * 60)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(check, sha256): sha256 for sha256 in digests}
+            for done, future in enumerate(as_completed(futures), 1):
+                problem = future.result()
+                if problem == 'missing':
+                    missing.append(futures[future])
+                elif problem == 'corrupt':
+                    corrupt.append(futures[future])
+                if done % 1000 == 0:
+                    print(f"[{done:,}/{len(digests):,}] checked")
+
+        if remove and (corrupt or missing):
+            with self._lock:
+                for sha256 in corrupt + missing:
+                    self.path(sha256).unlink(missing_ok=True)
+                    self.conn.execute("DELETE FROM objects WHERE sha256 = ?", [sha256])
+                    self.conn.execute("DELETE FROM etags WHERE sha256 = ?", [sha256])
+                    self._known.discard(sha256)
+                removed = set(corrupt + missing)
+                self._etags = {key: sha for key, sha in self._etags.items() if sha not in removed}
+
+        print(f"✓ Checked: {len(digests):,}, corrupt: {len(corrupt)}, missing: {len(missing)}")
+        return {"checked": len(digests), "corrupt": corrupt, "missing": missing}
+
+
+if __name__ == "__main__":
+    with ContentStore() as store:
+        store.verify()
@@ -5,13 +5,19 @@ This package handles scraping, downloading, and organizing
 Leonardo da Vinci artwork data from leonardoda-vinci.org.
 """
 
-from .scraper import extract_image_data
+from .scraper import extract_image_data, iter_listing_pages, parse_listing_page
 from .downloader import download_images, save_manifest, sanitize_filename
+from .details import crawl_details, apply_details, parse_detail_page
 
 __all__ = [
     'extract_image_data',
+    'iter_listing_pages',
+    'parse_listing_page',
     'download_images',
     'save_manifest',
-    'sanitize_filename'
+    'sanitize_filename',
+    'crawl_details',
+    'apply_details',
+    'parse_detail_page'
 ]
 
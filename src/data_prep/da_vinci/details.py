@@ -0,0 +1,296 @@
+"""
+Incremental crawler for leonardoda-vinci.org artwork detail pages.
+
+Fills the manifest fields the listing pages don't carry (year, medium,
+dimensions, location, source) and finds each work's full-resolution image
+URL. The ETag, Last-Modified and SHA-256 of every page are kept in
+data/da-vinci-works/details.parquet, so later runs send conditional
+requests and only re-parse pages whose content actually changed.
+
+Detail rows are matched to manifest entries by the listing image URL,
+not the title, so works whose title was numbered ("Title (2)") get their
+own page's details. update_manifest() merges them into manifest.parquet
+and links each entry to its full-resolution image in
+data/da-vinci-works/full ('full_filename').
+
+Run from src/ with: python -m data_prep.da_vinci.details
+"""
+
+import glob
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urljoin
+
+import pandas as pd
+from bs4 import BeautifulSoup as bs
+
+from ..fetch import http_status_of, make_session
+from ..manifest_writer import ManifestWriter, read_manifest
+from .downloader import download_images, sanitize_filename
+from .scraper import BASE_URL, PARSER, iter_listing_pages
+
+
+DETAIL_COLUMNS = ['title', 'detail_url', 'image_url', 'etag', 'last_modified', 'content_sha256',
+                  'year', 'medium', 'dimensions', 'location', 'full_image_url',
+                  'checked_at', 'changed_at']
+
+# Labels used on detail pages for each manifest field, matched case-insensitively
+FIELD_LABELS = {
+    'year': ('date', 'year', 'created', 'painted'),
+    'medium': ('medium', 'technique', 'media', 'material', 'materials'),
+    'dimensions': ('dimensions', 'size'),
+    'location': ('location', 'current location', 'museum', 'collection', 'gallery'),
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff')
+
+
+def _label_pairs(soup):
+    """Collect (label, value) pairs from definition lists, tables and 'Label: value' text."""
+    pairs = []
+    for dt in soup.find_all('dt'):
+        dd = dt.find_next_sibling('dd')
+        if dd is not None:
+            pairs.append((dt.get_text(' ', strip=True), dd.get_text(' ', strip=True)))
+    for row in soup.find_all('tr'):
+        cells = row.find_all(['th', 'td'])
+        if len(cells) == 2:
+            pairs.append((cells[0].get_text(' ', strip=True), cells[1].get_text(' ', strip=True)))
+    for line in soup.get_text('\n').splitlines():
+        match = re.match(r"^\s*([A-Za-z][A-Za-z ]{1,30}?)\s*:\s*(.+?)\s*$", line)
+        if match:
+            pairs.append(match.groups())
+    return pairs
+
+
+def parse_detail_page(html, base_url=BASE_URL):
+    """
+    Extract metadata and the full-resolution image URL from a detail page.
+
+    Args:
+        html: Page HTML
+        base_url: URL relative image links are resolved against
+
+    Returns:
+        dict: year, medium, dimensions, location and full_image_url (None
+              for anything not found)
+    """
+    soup = bs(html, PARSER)
+    details = dict.fromkeys(FIELD_LABELS)
+
+    for label, value in _label_pairs(soup):
+        label = label.strip().rstrip(':').lower()
+        for field, names in FIELD_LABELS.items():
+            if details[field] is None and label in names and value:
+                details[field] = value
+
+    # Prefer the page's declared share image, then the first link to an image file
+    full_image_url = None
+    og_image = soup.find('meta', attrs={'property': 'og:image'})
+    if og_image is not None and og_image.get('content'):
+        full_image_url = og_image['content']
+    else:
+        for link in soup.find_all('a', href=True):
+            if link['href'].split('?')[0].lower().endswith(IMAGE_EXTENSIONS):
+                full_image_url = link['href']
+                break
+    if full_image_url:
+        full_image_url = urljoin(base_url, full_image_url)
+    details['full_image_url'] = full_image_url
+    return details
+
+
+def _load_details(details_path):
+    if details_path.exists():
+        return {row['detail_url']: row for row in pd.read_parquet(details_path).to_dict('records')}
+    return {}
+
+
+def _crawl_one(session, entry, previous, timeout):
+    """
+    Conditionally fetch one detail page.
+
+    Returns:
+        tuple: (detail row, outcome) with outcome 'not_modified', 'unchanged' or 'changed'
+    """
+    headers = {}
+    if previous is not None:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    response = session.get(entry['detail_url'], headers=headers, timeout=timeout)
+    if response.status_code == 304 and previous is not None:
+        return {**previous, 'image_url': entry.get('image_url'), 'checked_at': now}, 'not_modified'
+    response.raise_for_status()
+
+    content_sha256 = hashlib.sha256(response.content).hexdigest()
+    row = {
+        'title': entry['title'],
+        'detail_url': entry['detail_url'],
+        'image_url': entry.get('image_url'),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_sha256': content_sha256,
+        'checked_at': now,
+    }
+    if previous is not None and previous.get('content_sha256') == content_sha256:
+        # Server ignored the conditional headers but nothing changed: skip parsing
+        return {**previous, **row}, 'unchanged'
+
+    row.update(parse_detail_page(response.text, response.url))
+    row['changed_at'] = now
+    return row, 'changed'
+
+
+def crawl_details(entries=None, output_dir='data/da-vinci-works', workers=8, timeout=10):
+    """
+    Crawl detail pages, re-parsing only those that changed since the last run.
+
+    Args:
+        entries: Listing entries with 'title', 'image_url' and 'detail_url'
+                 (defaults to scraping the listing pages)
+        output_dir: Directory holding details.parquet (relative to repo root)
+        workers: Number of pages fetched in parallel
+        timeout: Request timeout in seconds
+
+    Returns:
+        tuple: (DataFrame of all detail rows, list of detail URLs whose page changed)
+    """
+    repo_root = Path(__file__).parent.parent.parent.parent
+    details_path = repo_root / output_dir / "details.parquet"
+    details_path.parent.mkdir(parents=True, exist_ok=True)
+
+    session = make_session(pool_maxsize=workers)
+    if entries is None:
+        entries = [e for _, page in iter_listing_pages(session=session) for e in page]
+    entries = [e for e in entries if e.get('detail_url')]
+    previous = _load_details(details_path)
+
+    print("=" * 60)
+    print(f"Checking {len(entries)} detail pages ({len(previous)} seen before)")
+    print("=" * 60)
+
+    rows = dict(previous)
+    changed = []
+    counts = {"not_modified": 0, "unchanged": 0, "changed": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_crawl_one, session, entry, previous.get(entry['detail_url']), timeout): entry
+            for entry in entries
+        }
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                row, outcome = future.result()
+            except Exception as e:
+                print(f"Failed: {entry['title']} ({http_status_of(e) or e})")
+                counts["failed"] += 1
+                continue
+            rows[entry['detail_url']] = row
+            counts[outcome] += 1
+            if outcome == 'changed':
+                changed.append(entry['detail_url'])
+
+    details = pd.DataFrame(list(rows.values()), columns=DETAIL_COLUMNS)
+    tmp_path = details_path.with_name(".details.parquet.part")
+    details.to_parquet(tmp_path, index=False, engine='pyarrow')
+    os.replace(tmp_path, details_path)
+
+    print(f"✓ 304 Not Modified: {counts['not_modified']}, same content: {counts['unchanged']}, "
+          f"changed: {counts['changed']}, failed: {counts['failed']}")
+    print(f"  Details: {details_path}")
+    return details, changed
+
+
+def apply_details(manifest, details):
+    """
+    Fill the manifest's metadata fields from crawled detail rows.
+
+    Entries are matched on the listing image URL, which numbered duplicate
+    titles don't change.
+
+    Args:
+        manifest: List of manifest entries
+        details: DataFrame returned by crawl_details
+
+    Returns:
+        list: The same manifest, updated in place
+    """
+    by_url = {row['image_url']: row for row in details.to_dict('records') if row.get('image_url')}
+    for entry in manifest:
+        row = by_url.get(entry['url'])
+        if row is None:
+            continue
+        for field in FIELD_LABELS:
+            entry[field] = row.get(field)
+        entry['source'] = row.get('detail_url')
+    return manifest
+
+
+def update_manifest(details, changed=(), manifest_path='data/da-vinci-works/manifest.parquet',
+                    full_dir='data/da-vinci-works/full', full_images=True):
+    """
+    Merge crawled details into the manifest and fetch full-resolution images.
+
+    Full-resolution images are saved under the manifest entry's title, so
+    they share its filename stem, and linked from the entry's
+    'full_filename' (relative to the manifest). Images of pages that
+    changed are fetched again; the others only if missing.
+
+    Args:
+        details: DataFrame returned by crawl_details
+        changed: Detail URLs whose page changed, from crawl_details
+        manifest_path: Manifest to update (relative to repo root)
+        full_dir: Directory of full-resolution images (relative to repo root)
+        full_images: Also download and link full-resolution images
+
+    Returns:
+        int: Number of entries in the updated manifest (0 if there is no manifest yet)
+    """
+    repo_root = Path(__file__).parent.parent.parent.parent
+    manifest = read_manifest(repo_root / manifest_path)
+    if manifest is None:
+        print("No manifest yet; download the images first")
+        return 0
+    entries = apply_details(manifest.to_dict('records'), details)
+
+    if full_images:
+        rows = details.to_dict('records')
+        full_urls = {row['image_url']: row['full_image_url'] for row in rows
+                     if row.get('image_url') and row.get('full_image_url')}
+        changed = set(changed)
+        changed_urls = {row['image_url'] for row in rows if row['detail_url'] in changed}
+        to_download = {}
+        for entry in entries:
+            full_url = full_urls.get(entry['url'])
+            if full_url is None:
+                continue
+            to_download[entry['original_title']] = full_url
+            if entry['url'] in changed_urls:
+                pattern = f"{glob.escape(sanitize_filename(entry['original_title']))}.*"
+                for stale in (repo_root / full_dir).glob(pattern):
+                    stale.unlink()
+        full = {row['original_title']: row for row in download_images(to_download, output_dir=full_dir)}
+        manifest_dir = (repo_root / manifest_path).parent
+        for entry in entries:
+            row = full.get(entry['original_title'])
+            if row is not None and row['status'] == 'success':
+                entry['full_filename'] = os.path.relpath(repo_root / full_dir / row['filename'], manifest_dir)
+
+    with ManifestWriter(manifest_path) as writer:
+        writer.write_many(entries)
+        total = writer.compact()
+    print(f"✓ Details merged into {writer.manifest_path} ({total} entries)")
+    return total
+
+
+if __name__ == "__main__":
+    details, changed = crawl_details()
+    update_manifest(details, changed)
@@ -1,7 +1,11 @@
-import pandas as pd
-import requests
+import os
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from ..fetch import http_status_of, make_session, stream_to_file
+from ..manifest_writer import ManifestWriter
+
 
 def sanitize_filename(filename):
     """
@@ -22,13 +26,102 @@ def sanitize_filename(filename):
     return filename
 
 
-def download_images(image_info, output_dir='data/da-vinci-works'):
+def new_manifest_entry(entry_id, title, url):
+    """
+    Create the manifest entry of one artwork, before it is downloaded.
+    
+    Args:
+        entry_id: 1-based position of the artwork in the manifest
+        title: Artwork title
+        url: Image URL
+    
+    Returns:
+        dict: Manifest entry with status 'unknown'
+    """
+    # Get file extension from URL (usually .jpg)
+    file_ext = '.jpg'
+    if '.' in url:
+        file_ext = '.' + url.split('.')[-1].split('?')[0]  # Handle URL params
+    
+    return {
+        "id": entry_id,
+        "filename": f"{sanitize_filename(title)}{file_ext}",
+        "original_title": title,
+        "url": url,
+        "status": "unknown",
+        "sha256": None,
+        "object": None,
+        "full_filename": None,
+        # Placeholder fields for future metadata
+        "year": None,
+        "source": None,
+        "medium": None,
+        "dimensions": None,
+        "location": None,
+        "notes": None
+    }
+
+
+def download_entry(session, manifest_entry, filepath, timeout, store=None, metrics=None):
+    """
+    Stream one image to disk (or into the store) and fill in the manifest entry's outcome.
+    
+    Args:
+        session: requests.Session to download with
+        manifest_entry: Entry from new_manifest_entry(); 'status', 'sha256'
+                        and, on failure, 'error' are updated in place
+        filepath: Destination file
+        timeout: Per-request timeout in seconds
+        store: Optional ContentStore to put the image into instead
+        metrics: Optional Metrics to record into
+    
+    Returns:
+        dict: bytes, sha256 and http_status, or http_status and error on failure
+    """
+    try:
+        if store is not None:
+            sha256, size, is_new = store.put_url(session, manifest_entry["url"], timeout=timeout,
+                                                  metrics=metrics)
+            store.tag('da_vinci', manifest_entry["original_title"], sha256, url=manifest_entry["url"])
+            manifest_entry["object"] = os.path.relpath(store.path(sha256), filepath.parent)
+            manifest_entry["duplicate"] = not is_new
+        else:
+            size, sha256 = stream_to_file(session, manifest_entry["url"], filepath, timeout=timeout,
+                                          metrics=metrics)
+        manifest_entry["status"] = "success"
+        manifest_entry["sha256"] = sha256
+        return {"bytes": size, "sha256": sha256, "http_status": 200}
+    except Exception as e:
+        manifest_entry["status"] = "failed"
+        manifest_entry["error"] = str(e)
+        return {"http_status": http_status_of(e), "error": str(e)}
+
+
+def download_images(image_info, output_dir='data/da-vinci-works', state=None, workers=8, timeout=10,
+                    store=None, metrics=None, manifest_writer=None):
     """
     Download all images from the image_info dictionary and create a manifest.
     
+    Images are fetched by `workers` threads over one shared session and
+    streamed chunk by chunk into a temporary file that is renamed into
+    place once complete, so an interrupted run never leaves a truncated
+    image that would later be mistaken for a finished download.
+    
     Args:
         image_info: Dictionary with artwork titles as keys and URLs as values
         output_dir: Directory to save images (relative to repo root)
+        state: Optional DownloadState; progress is then read from and recorded
+               to the 'da_vinci' dataset instead of checking files on disk
+        workers: Number of parallel downloads (1 downloads sequentially)
+        timeout: Per-request timeout in seconds
+        store: Optional ContentStore; images are then stored once per
+               digest and each entry's 'object' points at its stored file
+               (relative to output_dir) instead of a file named 'filename'
+        metrics: Optional Metrics; per-image success lines are then replaced
+                 by its periodic progress line and throughput counters
+        manifest_writer: Optional ManifestWriter; every entry is appended to
+                         it as soon as its outcome is known, so the manifest
+                         survives a crash and can be read mid-run
     
     Returns:
         list: Manifest data with metadata for each image
@@ -46,70 +139,89 @@ def download_images(image_info, output_dir='data/da-vinci-works'):
     total_images = len(image_info)
     successful = 0
     failed = 0
+    duplicates = 0
     manifest = []
+    to_download = []
+    
+    completed = set()
+    if state is not None:
+        state.register('da_vinci', image_info.keys(), urls=image_info.values())
+        completed = state.completed('da_vinci')
+    refs = store.refs('da_vinci') if store is not None else {}
     
     for i, (title, url) in enumerate(image_info.items(), 1):
-        # Sanitize the title to make it a valid filename
         safe_title = sanitize_filename(title)
+        manifest_entry = new_manifest_entry(i, title, url)
+        filepath = data_dir / manifest_entry["filename"]
         
-        # Get file extension from URL (usually .jpg)
-        file_ext = '.jpg'
-        if '.' in url:
-            file_ext = '.' + url.split('.')[-1].split('?')[0]  # Handle URL params
-        
-        # Create filename
-        filename = f"{safe_title}{file_ext}"
-        filepath = data_dir / filename
-        
-        # Create manifest entry
-        manifest_entry = {
-            "id": i,
-            "filename": filename,
-            "original_title": title,
-            "url": url,
-            "status": "unknown",
-            # Placeholder fields for future metadata
-            "year": None,
-            "source": None,
-            "medium": None,
-            "dimensions": None,
-            "location": None,
-            "notes": None
-        }
+        manifest.append(manifest_entry)
         
-        # Check if file already exists
-        if filepath.exists():
-            print(f"[{i}/{total_images}] Skipping (already exists): {safe_title}")
+        # Check if file already exists (files only appear once fully written)
+        if store is not None:
+            # Same title and URL already stored: no request and no file read needed
+            sha256, stored_url = refs.get(title, (None, None))
+            already_done = stored_url == url and sha256 in store
+            if already_done:
+                manifest_entry["sha256"] = sha256
+                manifest_entry["object"] = os.path.relpath(store.path(sha256), data_dir)
+        else:
+            already_done = title in completed if state is not None else filepath.exists()
+        if already_done:
+            if metrics is None:
+                print(f"[{i}/{total_images}] Skipping (already exists): {safe_title}")
+            else:
+                metrics.inc("items", status="skipped")
             manifest_entry["status"] = "success"
             successful += 1
-            manifest.append(manifest_entry)
+            if manifest_writer is not None:
+                manifest_writer.write(manifest_entry)
             continue
         
-        # Download the image
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            # Save the image
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+        to_download.append((manifest_entry, filepath))
+    
+    # Download the remaining images in parallel over one pooled session
+    session = make_session(pool_maxsize=workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_entry, session, entry, filepath, timeout, store, metrics): entry
+            for entry, filepath in to_download
+        }
+        for future in as_completed(futures):
+            entry = futures[future]
+            outcome = future.result()
+            safe_title = sanitize_filename(entry["original_title"])
             
-            print(f"[{i}/{total_images}] Downloaded: {safe_title}")
-            manifest_entry["status"] = "success"
-            successful += 1
+            if metrics is not None:
+                metrics.inc("items", status=entry["status"])
+            if entry["status"] == "success":
+                if entry.pop("duplicate", False):
+                    if metrics is None:
+                        print(f"[{entry['id']}/{total_images}] Downloaded (same bytes already stored): {safe_title}")
+                    duplicates += 1
+                elif metrics is None:
+                    print(f"[{entry['id']}/{total_images}] Downloaded: {safe_title}")
+                successful += 1
+            else:
+                print(f"[{entry['id']}/{total_images}] Failed to download {safe_title}: {entry['error']}")
+                failed += 1
             
-        except Exception as e:
-            print(f"[{i}/{total_images}] Failed to download {safe_title}: {e}")
-            manifest_entry["status"] = "failed"
-            manifest_entry["error"] = str(e)
-            failed += 1
-        
-        manifest.append(manifest_entry)
+            if state is not None:
+                state.record('da_vinci', entry["original_title"], entry["status"],
+                             url=entry["url"], filename=entry["filename"], **outcome)
+            if manifest_writer is not None:
+                manifest_writer.write(entry)
+    
+    if state is not None:
+        state.flush()
+    if manifest_writer is not None:
+        manifest_writer.flush()
     
     print("\n" + "=" * 60)
     print(f"✓ Download complete!")
     print(f"  Successful: {successful}/{total_images}")
     print(f"  Failed: {failed}/{total_images}")
+    if store is not None:
+        print(f"  Duplicate content: {duplicates} (stored once)")
     print(f"  Location: {data_dir}")
     
     return manifest
@@ -119,22 +231,19 @@ def save_manifest(manifest, output_dir='data/da-vinci-works', output_file='manif
     """
     Save the manifest to a parquet file in the data directory.
     
+    Entries are written with the typed manifest schema and merged with any
+    parts an earlier (possibly interrupted) run left behind; the newest
+    row per title wins, but metadata it leaves empty is kept.
+    
     Args:
         manifest: List of manifest entries
         output_dir: Directory to save manifest (relative to repo root)
         output_file: Filename for the manifest
     """
-    # Get repo root (parent of src/)
-    # __file__ is in src/data_prep/da_vinci/, so go up 4 levels to reach repo root
-    repo_root = Path(__file__).parent.parent.parent.parent
-    data_dir = repo_root / output_dir
-    manifest_path = data_dir / output_file
+    with ManifestWriter(f"{output_dir}/{output_file}") as writer:
+        writer.write_many(manifest)
+        total = writer.compact()
     
-    # Convert manifest list to DataFrame and save as parquet
-    df = pd.DataFrame(manifest)
-    df.to_parquet(manifest_path, index=False, engine='pyarrow')
-    
-    print(f"\n✓ Manifest saved to: {manifest_path}")
-    print(f"  Total entries: {len(manifest)}")
+    print(f"\n✓ Manifest saved to: {writer.manifest_path}")
+    print(f"  Total entries: {total}")
     print(f"  Format: Parquet")
-
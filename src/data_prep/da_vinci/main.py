@@ -4,15 +4,20 @@ Main entry point for the Leonardo da Vinci artwork scraper and downloader.
 This script orchestrates the complete workflow:
 1. Scrapes artwork data from leonardoda-vinci.org
 2. Downloads all images
-3. Creates a manifest file with metadata
+3. Creates a manifest file
+4. Fills in metadata from the detail pages and fetches full-resolution images
+
+Run from src/ with: python -m data_prep.da_vinci.main
 """
 
-from scraper import extract_image_data
-from downloader import download_images, save_manifest
+from ..manifest_writer import ManifestWriter
+from .scraper import extract_image_data
+from .details import crawl_details, update_manifest
+from .downloader import download_images, save_manifest
 
 
 if __name__ == "__main__":
-    print("Starting to extract images from all 4 pages...")
+    print("Starting to extract images from all listing pages...")
     print("=" * 60)
     
     image_info = extract_image_data()
@@ -21,8 +26,13 @@ if __name__ == "__main__":
     print(f"Total artworks found: {len(image_info)}")
     print("=" * 60)
     
-    # Download all images and get manifest data
-    manifest = download_images(image_info)
+    # Download all images, appending manifest entries as they finish
+    with ManifestWriter() as writer:
+        manifest = download_images(image_info, manifest_writer=writer)
     
-    # Save manifest to JSON file
+    # Compact into the final manifest file
     save_manifest(manifest)
+    
+    # Merge year, medium, dimensions, location and source from the detail pages
+    details, changed = crawl_details()
+    update_manifest(details, changed)
@@ -1,65 +1,158 @@
-import requests
-from bs4 import BeautifulSoup as bs
+import importlib.util
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
+from bs4 import BeautifulSoup as bs, SoupStrainer
 
-def extract_image_data():
+from ..fetch import make_session
+
+
+BASE_URL = "https://leonardoda-vinci.org"
+FIRST_PAGE = "/the-complete-works.html?ps=96"
+PAGE_TEMPLATE = "/the-complete-works_pageno-{}.html?ps=96"
+
+# Pagination links look like the-complete-works_pageno-3.html
+PAGE_LINK = re.compile(r"the-complete-works_pageno-(\d+)\.html")
+
+# Only the listing container is turned into a tree; lxml is used when installed
+ITEMS_ONLY = SoupStrainer('div', class_='row items-list-wrapper')
+PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+
+def _page_url(base_url, page_num):
+    path = FIRST_PAGE if page_num == 1 else PAGE_TEMPLATE.format(page_num)
+    return base_url + path
+
+
+def parse_listing_page(html, base_url=BASE_URL):
+    """
+    Parse the artwork entries of one listing page.
+
+    Args:
+        html: Page HTML
+        base_url: Site root used to build absolute URLs
+
+    Returns:
+        list: Dicts with 'title', 'image_url' and 'detail_url' (None if the
+              image is not wrapped in a link), or None if the page has no
+              artwork container
+    """
+    soup = bs(html, PARSER, parse_only=ITEMS_ONLY)
+    items_container = soup.find('div', class_='row items-list-wrapper')
+    if not items_container:
+        return None
+
+    entries = []
+    for img_tag in items_container.find_all('img'):
+        # Get the relative URL from the 'src' attribute and the title from 'alt'
+        relative_path = img_tag.get('src')
+        title = img_tag.get('alt', '').strip()
+        if not (relative_path and title):
+            continue
+
+        link = img_tag.find_parent('a')
+        href = link.get('href') if link is not None else None
+        if href and not href.startswith('http'):
+            href = base_url + href
+
+        entries.append({
+            "title": title,
+            "image_url": base_url + relative_path,
+            "detail_url": href,
+        })
+    return entries
+
+
+def iter_listing_pages(session=None, workers=4, base_url=BASE_URL, timeout=10):
+    """
+    Fetch listing pages concurrently, following pagination links.
+
+    The first page is fetched alone; every page number linked from a
+    fetched page is queued, so the page count never needs hard-coding.
+    Pages are yielded as soon as they are parsed, in completion order.
+
+    Args:
+        session: Optional requests.Session to reuse
+        workers: Number of pages fetched in parallel
+        base_url: Site root
+        timeout: Request timeout in seconds
+
+    Yields:
+        tuple: (page number, list of entries from parse_listing_page)
+    """
+    session = session or make_session(pool_maxsize=workers)
+
+    def fetch(page_num):
+        response = session.get(_page_url(base_url, page_num), timeout=timeout)
+        response.raise_for_status()
+        html = response.text
+        pages = {int(n) for n in PAGE_LINK.findall(html)}
+        return html, pages
+
+    seen = {1}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(fetch, 1): 1}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page_num = pending.pop(future)
+                try:
+                    html, linked_pages = future.result()
+                except Exception as e:
+                    print(f"Error fetching page {page_num} ({_page_url(base_url, page_num)}): {e}")
+                    continue
+
+                for linked in sorted(linked_pages - seen):
+                    seen.add(linked)
+                    pending[executor.submit(fetch, linked)] = linked
+
+                entries = parse_listing_page(html, base_url)
+                if entries is None:
+                    print(f"Warning: Could not find artwork container on page {page_num}")
+                    continue
+                print(f"Found {len(entries)} images on page {page_num}")
+                yield page_num, entries
+
+
+def extract_image_data(workers=4, base_url=BASE_URL, timeout=10):
     """
     Scrapes all Leonardo da Vinci artwork images from leonardoda-vinci.org.
-    
+
+    Titles that appear more than once with different images are kept
+    under a numbered key ("Title (2)") and reported instead of being
+    silently overwritten.
+
+    Args:
+        workers: Number of listing pages fetched in parallel
+        base_url: Site root
+        timeout: Request timeout in seconds
+
     Returns:
         dict: Dictionary with artwork titles as keys and image URLs as values.
     """
-    # 1. Define the Base URL for constructing absolute links
-    BASE_URL = "https://leonardoda-vinci.org"
-    
-    # 2. Define all page URLs
-    page_urls = [
-        "https://leonardoda-vinci.org/the-complete-works.html?ps=96",
-        "https://leonardoda-vinci.org/the-complete-works_pageno-2.html?ps=96",
-        "https://leonardoda-vinci.org/the-complete-works_pageno-3.html?ps=96",
-        "https://leonardoda-vinci.org/the-complete-works_pageno-4.html?ps=96"
-    ]
-    
+    pages = dict(iter_listing_pages(workers=workers, base_url=base_url, timeout=timeout))
+
     extracted_data = {}
-    
-    # 3. Loop through all pages
-    for page_num, url in enumerate(page_urls, 1):
-        print(f"\nFetching page {page_num}...")
-        
-        # Fetch HTML and create the soup object
-        try:
-            html = requests.get(url).text
-            soup = bs(html, "html.parser")
-        except requests.RequestException as e:
-            print(f"Error fetching page {page_num} ({url}): {e}")
-            continue  # Skip to next page if this one fails
-
-        # Find the main container holding all the artwork listings
-        items_container = soup.find('div', class_='row items-list-wrapper')
-
-        if not items_container:
-            print(f"Warning: Could not find artwork container on page {page_num}")
-            continue
+    collisions = []
 
-        # Find all <img> tags within the container
-        image_tags = items_container.find_all('img')
-        
-        print(f"Found {len(image_tags)} images on page {page_num}")
-        
-        # Iterate and extract the required attributes
-        for img_tag in image_tags:
-            # Get the relative URL from the 'src' attribute
-            relative_path = img_tag.get('src')
-            
-            # Get the title from the 'alt' attribute
-            title = img_tag.get('alt', '').strip()
-            
-            if relative_path and title:  # Only add if both title and path exist
-                # Construct the absolute URL
-                absolute_url = BASE_URL + relative_path
-                
-                # Add to dictionary: key = title, value = absolute URL
-                extracted_data[title] = absolute_url
+    # Merge in page order so keys are stable between runs
+    for page_num in sorted(pages):
+        for entry in pages[page_num]:
+            title, url = entry["title"], entry["image_url"]
+            if title in extracted_data:
+                if extracted_data[title] == url:
+                    continue  # Same work listed twice
+                n = 2
+                while f"{title} ({n})" in extracted_data:
+                    n += 1
+                collisions.append((title, url))
+                title = f"{title} ({n})"
+            extracted_data[title] = url
 
-    return extracted_data
+    print(f"\nPages scraped: {len(pages)}")
+    if collisions:
+        print(f"Warning: {len(collisions)} duplicate titles with different images were renamed:")
+        for title, url in collisions:
+            print(f"  {title}: {url}")
 
+    return extracted_data
@@ -0,0 +1,271 @@
+"""
+Memory-mapped PyTorch datasets over the combined da Vinci + Met corpus.
+
+`build_image_array` packs one derivative resolution from the preprocessing
+cache into a single uint8 file of shape (N, size, size, 3), letterboxed to
+a square, next to a labels parquet joining the da Vinci manifest and the
+Met catalog. The datasets below map that file into memory, so samples are
+zero-copy views: no per-sample file opens and no JPEG decoding while
+training.
+
+Run from src/ with: python -m data_prep.dataset --size 224
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+from PIL import Image
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+from .manifest_writer import read_manifest
+from .preprocess import derivative_path
+
+
+LABEL_DA_VINCI = 1
+LABEL_OTHER = 0
+
+
+def _array_paths(array_dir, size):
+    array_dir = Path(array_dir)
+    return (array_dir / f"images_{size}.u8",
+            array_dir / f"images_{size}.json",
+            array_dir / f"labels_{size}.parquet")
+
+
+def _fill_rows(array_path, shape, start, paths):
+    """Decode derivatives into rows [start, start + len(paths)) of the array. Runs in a worker."""
+    images = np.memmap(array_path, dtype=np.uint8, mode='r+', shape=shape)
+    size = shape[1]
+    for offset, path in enumerate(paths):
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+            if max(img.size) != size:
+                img.thumbnail((size, size), Image.LANCZOS)
+            # Letterbox into the square slot
+            top = (size - img.height) // 2
+            left = (size - img.width) // 2
+            row = images[start + offset]
+            row[:] = 0
+            row[top:top + img.height, left:left + img.width] = np.asarray(img)
+    images.flush()
+    return len(paths)
+
+
+def build_labels(index, repo_root=None):
+    """
+    Join the derivative index with manifest metadata and attach labels.
+
+    Args:
+        index: DataFrame from preprocess_images (source, key, sha256, ...)
+        repo_root: Repository root (defaults to the one containing src/)
+
+    Returns:
+        pd.DataFrame: One row per image with 'label', 'title' and 'department'
+    """
+    from .met_museum.catalog import MetCatalog
+
+    repo_root = Path(repo_root) if repo_root else Path(__file__).parent.parent.parent
+    labels = index[['source', 'key', 'sha256', 'width', 'height']].reset_index(drop=True)
+    labels['label'] = np.where(labels['source'] == 'da_vinci', LABEL_DA_VINCI, LABEL_OTHER).astype(np.int64)
+    labels['title'] = None
+    labels['department'] = None
+
+    dv_manifest_path = repo_root / "data" / "da-vinci-works" / "manifest.parquet"
+    manifest = read_manifest(dv_manifest_path, columns=['filename', 'original_title'])
+    if manifest is not None:
+        titles = dict(zip(manifest['filename'].map(lambda f: Path(f).stem), manifest['original_title']))
+        is_dv = labels['source'] == 'da_vinci'
+        labels.loc[is_dv, 'title'] = labels.loc[is_dv, 'key'].map(titles)
+        labels.loc[is_dv, 'department'] = 'Leonardo da Vinci'
+
+    met_catalog_path = repo_root / "data" / "met-museum" / "MetObjects.parquet"
+    is_met = labels['source'] == 'met'
+    if met_catalog_path.exists() and is_met.any():
+        with MetCatalog(met_catalog_path) as catalog:
+            met = catalog.select(['Object ID', 'Title', 'Department'], public_domain=True).to_pandas()
+        met = met.set_index(met['Object ID'].astype(str))
+        keys = labels.loc[is_met, 'key']
+        labels.loc[is_met, 'title'] = keys.map(met['Title'])
+        labels.loc[is_met, 'department'] = keys.map(met['Department'])
+
+    return labels
+
+
+def build_image_array(size=224, derivatives_dir='data/derivatives', output_dir='data/arrays',
+                      workers=None, chunk_rows=256):
+    """
+    Pack all derivatives of one resolution into a memory-mappable uint8 file.
+
+    Args:
+        size: Derivative resolution to pack (must exist in the cache)
+        derivatives_dir: Derivative cache root (relative to repo root)
+        output_dir: Where the array, its metadata and labels are written
+        workers: Number of decoding processes (defaults to all cores)
+        chunk_rows: Rows decoded per task
+
+    Returns:
+        Path: Path of the uint8 array file
+    """
+    repo_root = Path(__file__).parent.parent.parent
+    derivative_root = repo_root / derivatives_dir
+    array_dir = repo_root / output_dir
+    array_dir.mkdir(parents=True, exist_ok=True)
+    array_path, meta_path, labels_path = _array_paths(array_dir, size)
+
+    index = pd.read_parquet(derivative_root / "index.parquet")
+    labels = build_labels(index, repo_root)
+    paths = [str(derivative_path(derivative_root, size, sha)) for sha in labels['sha256']]
+    shape = (len(paths), size, size, 3)
+
+    print("=" * 60)
+    print(f"Packing {len(paths):,} images of {size}x{size} into {array_path}")
+    print(f"  Size on disk: {np.prod(shape) / 1024**3:.1f} GB")
+    print("=" * 60)
+
+    tmp_path = array_path.with_name(f".{array_path.name}.part")
+    if paths:
+        np.memmap(tmp_path, dtype=np.uint8, mode='w+', shape=shape).flush()
+    else:
+        # An empty file can't be memory-mapped; write it directly
+        tmp_path.write_bytes(b'')
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(_fill_rows, tmp_path, shape, start, paths[start:start + chunk_rows])
+            for start in range(0, len(paths), chunk_rows)
+        ]
+        done = 0
+        for future in futures:
+            done += future.result()
+            if done % (chunk_rows * 100) == 0:
+                print(f"[{done:,}/{len(paths):,}] rows written")
+
+    os.replace(tmp_path, array_path)
+    labels.to_parquet(labels_path, index=False, engine='pyarrow')
+    meta_path.write_text(json.dumps({"shape": list(shape), "dtype": "uint8", "layout": "NHWC"}))
+
+    print(f"✓ Array: {array_path}")
+    print(f"  Labels: {labels_path} (da Vinci: {(labels['label'] == LABEL_DA_VINCI).sum():,})")
+    return array_path
+
+
+class _MemmapImages:
+    """Shared lazy opening of the image array; the memmap is never pickled to workers."""
+
+    def __init__(self, size=224, array_dir='data/arrays', channels_first=True):
+        repo_root = Path(__file__).parent.parent.parent
+        self.array_path, meta_path, labels_path = _array_paths(repo_root / array_dir, size)
+        self.shape = tuple(json.loads(meta_path.read_text())["shape"])
+        self.labels = pd.read_parquet(labels_path)
+        self._targets = torch.from_numpy(self.labels['label'].to_numpy(dtype=np.int64))
+        self.channels_first = channels_first
+        self._images = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    @property
+    def images(self):
+        if self._images is None:
+            if not self.shape[0]:
+                # Nothing was packed, and an empty file can't be memory-mapped
+                self._images = np.zeros(self.shape, dtype=np.uint8)
+            else:
+                # Copy-on-write mapping: pages are shared with the file and other
+                # workers, and the resulting tensors are writable views
+                self._images = np.memmap(self.array_path, dtype=np.uint8, mode='c', shape=self.shape)
+        return self._images
+
+    def _sample(self, i):
+        image = torch.from_numpy(self.images[i])
+        if self.channels_first:
+            image = image.permute(2, 0, 1)
+        return image, self._targets[i]
+
+    def __len__(self):
+        return self.shape[0]
+
+
+class MemmapImageDataset(_MemmapImages, Dataset):
+    """
+    Map-style dataset of (uint8 image tensor, label) over the packed array.
+
+    Images are zero-copy views into the memory-mapped file, CHW by default.
+    Normalisation and augmentation belong on the GPU side of the loader.
+
+    Args:
+        size: Resolution of the packed array
+        array_dir: Directory written by build_image_array (relative to repo root)
+        channels_first: Return CHW views instead of HWC
+    """
+
+    def __getitem__(self, i):
+        return self._sample(i)
+
+
+class MemmapImageIterableDataset(_MemmapImages, IterableDataset):
+    """
+    Iterable dataset that splits the packed array across DataLoader workers
+    (and optionally distributed ranks) in contiguous blocks, so each worker
+    reads its part of the file sequentially.
+
+    Args:
+        size: Resolution of the packed array
+        array_dir: Directory written by build_image_array (relative to repo root)
+        channels_first: Return CHW views instead of HWC
+        block_size: Rows per contiguous block
+        shuffle: Shuffle block order (and rows within a block) every epoch
+        seed: Base seed for shuffling; combined with the epoch number
+        rank: Index of this process among `world_size` distributed processes
+        world_size: Number of distributed processes
+    """
+
+    def __init__(self, size=224, array_dir='data/arrays', channels_first=True, block_size=1024,
+                 shuffle=True, seed=0, rank=0, world_size=1):
+        super().__init__(size, array_dir, channels_first)
+        self.block_size = block_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        """Change the shuffling order for the next pass."""
+        self.epoch = epoch
+
+    def __iter__(self):
+        worker = get_worker_info()
+        num_workers = worker.num_workers if worker is not None else 1
+        worker_id = worker.id if worker is not None else 0
+        # Global slot of this worker across all ranks
+        slot = self.rank * num_workers + worker_id
+        slots = self.world_size * num_workers
+
+        starts = np.arange(0, len(self), self.block_size)
+        rng = np.random.default_rng((self.seed, self.epoch))
+        if self.shuffle:
+            rng.shuffle(starts)
+
+        for start in starts[slot::slots]:
+            rows = np.arange(start, min(start + self.block_size, len(self)))
+            if self.shuffle:
+                rng.shuffle(rows)
+            for i in rows:
+                yield self._sample(i)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack derivatives into a memory-mapped array")
+    parser.add_argument('--size', type=int, default=224)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    build_image_array(size=args.size, workers=args.workers)
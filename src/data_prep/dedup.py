@@ -0,0 +1,344 @@
+"""
+Perceptual-hash index for near-duplicate detection across da Vinci and Met.
+
+64-bit pHash (DCT) values are computed in NumPy batches from the small
+derivatives in the preprocessing cache. The index
+uses multi-index hashing: each hash is split into four 16-bit chunks, and
+two hashes within Hamming distance r < 4 must agree exactly on at least one
+chunk, so candidate lookup is a sorted-array search per chunk rather than a
+scan of the whole corpus. Hashes are stored with the sha256 of the image
+they were computed from (data/dedup/index.parquet), so only new or
+replaced images are hashed again.
+
+Duplicate clusters are written to data/dedup/clusters.parquet and the
+cluster ID is added to the da Vinci manifest as `dup_cluster`, so splits
+can keep a whole cluster on one side.
+
+Run from src/ with: python -m data_prep.dedup --radius 3
+"""
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from .manifest_writer import compact_manifest
+from .preprocess import derivative_path
+
+
+NUM_CHUNKS = 4
+CHUNK_BITS = 64 // NUM_CHUNKS
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(values):
+        """Number of set bits of each uint64 value."""
+        return np.bitwise_count(values).astype(np.int64)
+else:
+    _POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(values):
+        """Number of set bits of each uint64 value."""
+        as_bytes = np.ascontiguousarray(values, dtype=np.uint64).view(np.uint8)
+        return _POPCOUNT8[as_bytes].reshape(*np.shape(values), 8).sum(axis=-1, dtype=np.int64)
+
+
+def _pack_bits(bits):
+    """Pack a (N, 64) boolean array into N uint64 values."""
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def phash_batch(gray32):
+    """
+    pHash of a batch of 32x32 grayscale images.
+
+    Args:
+        gray32: float32 array of shape (N, 32, 32)
+
+    Returns:
+        np.ndarray: N uint64 hashes
+    """
+    coeffs = _DCT32 @ gray32 @ _DCT32.T
+    low = coeffs[:, :8, :8].reshape(len(gray32), 64)
+    return _pack_bits(low > np.median(low, axis=1, keepdims=True))
+
+
+def _load_thumbnails(paths):
+    """Decode images into the 32x32 grayscale arrays pHash needs. Runs in a worker."""
+    gray32 = np.zeros((len(paths), 32, 32), dtype=np.float32)
+    ok = np.zeros(len(paths), dtype=bool)
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                img.draft('L', (64, 64))
+                gray = img.convert('L')
+                gray32[i] = np.asarray(gray.resize((32, 32), Image.BILINEAR), dtype=np.float32)
+                ok[i] = True
+        except OSError:
+            pass
+    return gray32, ok
+
+
+def compute_hashes(paths, workers=None, batch_size=512):
+    """
+    Compute the pHash of many image files.
+
+    Decoding runs in a process pool; hashing is vectorised per batch.
+
+    Returns:
+        tuple: (phash uint64 array, ok boolean array)
+    """
+    paths = [str(p) for p in paths]
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    if not batches:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)
+    phashes, oks = [], []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for gray32, ok in executor.map(_load_thumbnails, batches):
+            phashes.append(phash_batch(gray32))
+            oks.append(ok)
+    return np.concatenate(phashes), np.concatenate(oks)
+
+
+class HashIndex:
+    """
+    Multi-index hashing over 64-bit perceptual hashes.
+
+    Args:
+        keys: Optional initial record keys
+        hashes: Optional initial uint64 hashes aligned with keys
+    """
+
+    def __init__(self, keys=(), hashes=()):
+        self.keys = list(keys)
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self._tables = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, keys, hashes):
+        """Append records; chunk tables are rebuilt lazily on the next query."""
+        self.keys.extend(keys)
+        self.hashes = np.concatenate([self.hashes, np.asarray(hashes, dtype=np.uint64)])
+        self._tables = None
+
+    def _chunks(self, hashes):
+        shifts = np.arange(NUM_CHUNKS, dtype=np.uint64) * np.uint64(CHUNK_BITS)
+        mask = np.uint64((1 << CHUNK_BITS) - 1)
+        return ((np.asarray(hashes, dtype=np.uint64)[..., None] >> shifts) & mask).astype(np.uint32)
+
+    def _build(self):
+        # Per chunk position: record order sorted by chunk value, and the sorted values
+        chunks = self._chunks(self.hashes)
+        self._tables = []
+        for c in range(NUM_CHUNKS):
+            order = np.argsort(chunks[:, c], kind='stable')
+            self._tables.append((order, chunks[order, c]))
+
+    @staticmethod
+    def _neighbours(value, flips):
+        """All chunk values within `flips` bit flips of value."""
+        yield value
+        for n in range(1, flips + 1):
+            for bits in itertools.combinations(range(CHUNK_BITS), n):
+                flipped = value
+                for b in bits:
+                    flipped ^= 1 << b
+                yield flipped
+
+    def query(self, hash_value, radius=3):
+        """
+        Find records within Hamming distance `radius` of one hash.
+
+        Returns:
+            list: (key, distance) pairs sorted by distance
+        """
+        if self._tables is None:
+            self._build()
+        flips = radius // NUM_CHUNKS
+        query_chunks = self._chunks(np.uint64(hash_value))
+        candidates = []
+        for c, (order, values) in enumerate(self._tables):
+            for v in self._neighbours(int(query_chunks[c]), flips):
+                lo, hi = np.searchsorted(values, [v, v + 1])
+                candidates.append(order[lo:hi])
+        if not candidates:
+            return []
+        candidates = np.unique(np.concatenate(candidates))
+        distances = popcount(self.hashes[candidates] ^ np.uint64(hash_value))
+        hits = distances <= radius
+        result = sorted(zip(distances[hits].tolist(), candidates[hits].tolist()))
+        return [(self.keys[i], d) for d, i in result]
+
+    def pairs(self, radius=3, max_bucket=2000):
+        """
+        All record pairs within Hamming distance `radius`.
+
+        Records sharing a chunk value are compared bucket by bucket, which
+        finds every pair for radius < 4; larger radii only find pairs that
+        also share a chunk. Buckets larger than `max_bucket` (e.g. blank
+        images) are skipped.
+
+        Returns:
+            np.ndarray: (M, 2) array of record index pairs with i < j
+        """
+        if self._tables is None:
+            self._build()
+        found = []
+        for order, values in self._tables:
+            boundaries = np.flatnonzero(np.diff(values)) + 1
+            for bucket in np.split(order, boundaries):
+                if len(bucket) < 2 or len(bucket) > max_bucket:
+                    continue
+                h = self.hashes[bucket]
+                distances = popcount(h[:, None] ^ h[None, :])
+                i, j = np.nonzero(np.triu(distances <= radius, k=1))
+                if len(i):
+                    found.append(np.stack([bucket[i], bucket[j]], axis=1))
+        if not found:
+            return np.zeros((0, 2), dtype=np.int64)
+        found = np.sort(np.concatenate(found), axis=1)
+        return np.unique(found, axis=0)
+
+    def clusters(self, radius=3):
+        """
+        Group records into near-duplicate clusters (connected components).
+
+        Returns:
+            np.ndarray: Cluster ID per record; singletons get -1
+        """
+        parent = np.arange(len(self))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for i, j in self.pairs(radius).tolist():
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+        roots = np.array([find(i) for i in range(len(self))], dtype=np.int64)
+        sizes = np.bincount(roots, minlength=len(self))
+        return np.where(sizes[roots] > 1, roots, -1)
+
+def _write_parquet(frame, path):
+    """Write a DataFrame to Parquet through a temporary file, so readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.part")
+    frame.to_parquet(tmp_path, index=False, engine='pyarrow')
+    os.replace(tmp_path, path)
+
+
+def build_dedup_index(size=224, radius=3, derivatives_dir='data/derivatives', output_dir='data/dedup',
+                      workers=None):
+    """
+    Hash new or replaced derivatives, update the index and write duplicate clusters.
+
+    Records are '<source>/<key>'. A record is hashed again only if it is
+    new or its sha256 differs from the one its hash was computed from; a
+    replaced image keeps its position in the index, so cluster roots stay
+    put. Records whose original was deleted, or that dropped out of the
+    derivative index, are removed from the index.
+
+    Returns:
+        pd.DataFrame: source, key, sha256, phash and dup_cluster per record
+    """
+    repo_root = Path(__file__).parent.parent.parent
+    derivative_root = repo_root / derivatives_dir
+    out_dir = repo_root / output_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    index_path = out_dir / "index.parquet"
+
+    if index_path.exists():
+        indexed = pd.read_parquet(index_path, columns=['record', 'sha256', 'phash'])
+    else:
+        indexed = pd.DataFrame({'record': pd.Series(dtype=object), 'sha256': pd.Series(dtype=object),
+                                'phash': pd.Series(dtype=np.uint64)})
+    record_keys = indexed['record'].to_numpy(dtype=object)
+    record_shas = indexed['sha256'].to_numpy(dtype=object)
+    record_hashes = indexed['phash'].to_numpy(dtype=np.uint64).copy()
+    positions = pd.Index(record_keys)
+
+    records = pd.read_parquet(derivative_root / "index.parquet", columns=['source', 'key', 'path', 'sha256'])
+    records = records[records['path'].map(os.path.exists)].copy()
+    records['record'] = records['source'] + '/' + records['key'].astype(str)
+    known_sha = records['record'].map(pd.Series(record_shas, index=positions))
+    todo = records[known_sha.ne(records['sha256'])]
+    # Originals deleted since they were indexed leave the index with their hash
+    keep = positions.isin(records['record'])
+
+    print("=" * 60)
+    print(f"Hashing {len(todo):,} new or changed images ({keep.sum():,} already indexed, "
+          f"{(~keep).sum():,} removed)")
+    print("=" * 60)
+
+    paths = [derivative_path(derivative_root, size, sha) for sha in todo['sha256']]
+    phashes, ok = compute_hashes(paths, workers=workers)
+
+    # Replaced images are updated in place, new ones appended; a replaced
+    # image that can no longer be decoded loses its stale hash
+    where = positions.get_indexer(todo['record'])
+    update = (where >= 0) & ok
+    record_hashes[where[update]] = phashes[update]
+    record_shas[where[update]] = todo['sha256'].to_numpy(dtype=object)[update]
+    keep[where[(where >= 0) & ~ok]] = False
+    append = (where < 0) & ok
+    indexed = pd.DataFrame({
+        'record': np.concatenate([record_keys[keep], todo['record'].to_numpy(dtype=object)[append]]),
+        'sha256': np.concatenate([record_shas[keep], todo['sha256'].to_numpy(dtype=object)[append]]),
+        'phash': np.concatenate([record_hashes[keep], phashes[append]]),
+    })
+    _write_parquet(indexed, index_path)
+
+    phash_index = HashIndex(indexed['record'], indexed['phash'].to_numpy(dtype=np.uint64))
+    result = indexed.assign(dup_cluster=phash_index.clusters(radius))
+    parts = result['record'].str.split('/', n=1)
+    result['source'], result['key'] = parts.str[0], parts.str[1]
+    cluster_sources = result[result['dup_cluster'] >= 0].groupby('dup_cluster')['source'].nunique()
+    result['cross_source'] = result['dup_cluster'].map(cluster_sources).fillna(0).gt(1)
+    _write_parquet(result, out_dir / "clusters.parquet")
+
+    # Emit cluster IDs back into the da Vinci manifest
+    dv_manifest_path = repo_root / "data" / "da-vinci-works" / "manifest.parquet"
+    # Fold in parts of an unfinished run first, so they don't shadow the new column
+    if compact_manifest(dv_manifest_path):
+        manifest = pd.read_parquet(dv_manifest_path)
+        dv_clusters = result[result['source'] == 'da_vinci'].set_index('key')['dup_cluster']
+        stems = manifest['filename'].map(lambda f: Path(f).stem)
+        manifest['dup_cluster'] = stems.map(dv_clusters).fillna(-1).astype(np.int64)
+        _write_parquet(manifest, dv_manifest_path)
+
+    in_clusters = result['dup_cluster'] >= 0
+    print(f"✓ Indexed {len(result):,} images ({ok.sum():,} hashed, {(~ok).sum():,} unreadable)")
+    print(f"  Near-duplicate clusters: {result.loc[in_clusters, 'dup_cluster'].nunique():,} "
+          f"covering {in_clusters.sum():,} images")
+    print(f"  Clusters spanning da Vinci and Met: "
+          f"{result.loc[result['cross_source'], 'dup_cluster'].nunique():,}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the near-duplicate index")
+    parser.add_argument('--size', type=int, default=224)
+    parser.add_argument('--radius', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    build_dedup_index(size=args.size, radius=args.radius, workers=args.workers)
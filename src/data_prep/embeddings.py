@@ -0,0 +1,294 @@
+"""
+Embedding store with memory-mapped vectors and an IVF nearest-neighbour index.
+
+Embeddings are stored per encoder checkpoint under
+data/embeddings/<encoder>/<version>/ as an append-only float16 matrix
+(`vectors.f16`) plus the IDs of its rows (`ids.txt`, e.g. 'met/436535' or
+'da_vinci/Mona-Lisa'). Head training reads them back in batches without
+re-running the encoder, and an inverted-file (IVF) index over k-means
+centroids answers "closest Met works to this da Vinci piece" queries on CPU.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Append-only float16 embedding matrix keyed by record ID.
+
+    Args:
+        encoder: Encoder name
+        version: Checkpoint identifier; each version is stored separately
+        dim: Embedding dimension (required when creating a new version)
+        root: Store root (relative to repo root)
+    """
+
+    def __init__(self, encoder, version, dim=None, root='data/embeddings'):
+        repo_root = Path(__file__).parent.parent.parent
+        self.path = repo_root / root / encoder / str(version)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.path / "vectors.f16"
+        self._ids_path = self.path / "ids.txt"
+        self._meta_path = self.path / "meta.json"
+
+        if self._meta_path.exists():
+            self.meta = json.loads(self._meta_path.read_text())
+            if dim is not None and dim != self.meta['dim']:
+                raise ValueError(f"Store {self.path} has dim {self.meta['dim']}, not {dim}")
+        else:
+            if dim is None:
+                raise ValueError("dim is required to create a new embedding store")
+            self.meta = {"encoder": encoder, "version": str(version), "dim": int(dim),
+                         "count": 0, "ids_bytes": 0}
+            self._write_meta()
+
+        self.dim = self.meta['dim']
+        self._ids = None
+        self._rows = None
+        self._vectors = None
+
+    @staticmethod
+    def versions(encoder, root='data/embeddings'):
+        """List stored versions of an encoder."""
+        repo_root = Path(__file__).parent.parent.parent
+        encoder_dir = repo_root / root / encoder
+        if not encoder_dir.exists():
+            return []
+        return sorted(p.name for p in encoder_dir.iterdir() if (p / "meta.json").exists())
+
+    def _write_meta(self):
+        tmp_path = self._meta_path.with_name(".meta.json.part")
+        tmp_path.write_text(json.dumps(self.meta, indent=2))
+        os.replace(tmp_path, self._meta_path)
+
+    def __len__(self):
+        return self.meta['count']
+
+    def append(self, ids, vectors):
+        """
+        Append embeddings for new records.
+
+        Vectors are written before their IDs and the row count is committed
+        last, so a crash mid-append leaves the committed rows intact.
+
+        Args:
+            ids: Record IDs, one per row
+            vectors: Array of shape (len(ids), dim)
+        """
+        ids = [str(i) for i in ids]
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if vectors.shape != (len(ids), self.dim):
+            raise ValueError(f"Expected vectors of shape ({len(ids)}, {self.dim}), got {vectors.shape}")
+        if any('\n' in i for i in ids):
+            raise ValueError("Record IDs must not contain newlines")
+
+        count = self.meta['count']
+        id_bytes = ''.join(i + '\n' for i in ids).encode('utf-8')
+        # Drop anything past the committed rows left by an interrupted append
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(count * self.dim * 2)
+            f.write(vectors.tobytes())
+        with open(self._ids_path, 'ab') as f:
+            f.truncate(self.meta['ids_bytes'])
+            f.write(id_bytes)
+
+        self.meta['count'] = count + len(ids)
+        self.meta['ids_bytes'] += len(id_bytes)
+        self._write_meta()
+        self._ids = self._rows = self._vectors = None
+
+    @property
+    def ids(self):
+        """Record IDs in row order."""
+        if self._ids is None:
+            self._ids = []
+            if self._ids_path.exists():
+                with open(self._ids_path, encoding='utf-8') as f:
+                    self._ids = f.read().split('\n')[:len(self)]
+        return self._ids
+
+    @property
+    def vectors(self):
+        """Read-only memory-mapped (count, dim) float16 matrix."""
+        if self._vectors is None:
+            if len(self) == 0:
+                return np.zeros((0, self.dim), dtype=np.float16)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode='r',
+                                      shape=(len(self), self.dim))
+        return self._vectors
+
+    def row(self, record_id):
+        """Return the row number of a record ID."""
+        if self._rows is None:
+            self._rows = {record_id: i for i, record_id in enumerate(self.ids)}
+        return self._rows[str(record_id)]
+
+    def get(self, record_ids):
+        """Return float32 embeddings for the given record IDs."""
+        rows = [self.row(r) for r in record_ids]
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def batches(self, batch_size=4096, shuffle=False, seed=0, prefix=None):
+        """
+        Yield (ids, float32 vectors) batches, e.g. for head training.
+
+        Args:
+            batch_size: Rows per batch
+            shuffle: Visit rows in a random order
+            seed: Shuffle seed
+            prefix: Only include record IDs starting with this prefix
+        """
+        rows = np.arange(len(self))
+        if prefix is not None:
+            rows = rows[[i.startswith(prefix) for i in self.ids]]
+        if shuffle:
+            np.random.default_rng(seed).shuffle(rows)
+        ids = self.ids
+        for start in range(0, len(rows), batch_size):
+            batch = np.sort(rows[start:start + batch_size]) if not shuffle else rows[start:start + batch_size]
+            yield [ids[i] for i in batch], np.asarray(self.vectors[batch], dtype=np.float32)
+
+    def build_index(self, nlist=None, **kwargs):
+        """Train and populate an IVFIndex over this store and save it alongside."""
+        nlist = nlist or max(1, int(4 * np.sqrt(len(self))))
+        index = IVFIndex(nlist=nlist)
+        index.train(self.vectors, **kwargs)
+        index.add(self.vectors)
+        index.save(self.path / "ivf.npz")
+        return index
+
+    def load_index(self):
+        """Load the IVF index saved by build_index."""
+        return IVFIndex.load(self.path / "ivf.npz")
+
+    def nearest(self, record_id, k=10, index=None, nprobe=8, prefix=None):
+        """
+        Find the records closest (cosine) to one stored record.
+
+        Args:
+            record_id: Query record ID
+            k: Number of neighbours to return
+            index: IVFIndex to use (defaults to the saved one)
+            nprobe: Number of inverted lists to scan
+            prefix: Only return record IDs starting with this prefix (e.g. 'met/')
+
+        Returns:
+            list: (record ID, similarity) pairs, best first
+        """
+        index = index or self.load_index()
+        query = self.get([record_id])[0]
+        fetch = k + 1
+        while True:
+            rows, scores = index.search(query, fetch, self.vectors, nprobe=nprobe)
+            results = [(self.ids[r], float(s)) for r, s in zip(rows, scores)
+                       if self.ids[r] != str(record_id) and (prefix is None or self.ids[r].startswith(prefix))]
+            if len(results) >= k or len(rows) < fetch:
+                return results[:k]
+            fetch *= 4
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine similarity search.
+
+    Vectors are assigned to their nearest of `nlist` k-means centroids; a
+    query scans only the lists of its `nprobe` closest centroids. The
+    index stores row numbers only and reads vectors from the store's
+    memory map at query time.
+
+    Args:
+        nlist: Number of inverted lists (centroids)
+    """
+
+    def __init__(self, nlist=256):
+        self.nlist = nlist
+        self.centroids = None
+        self.list_offsets = None
+        self.list_rows = None
+
+    def train(self, vectors, iterations=20, sample_size=100_000, seed=0):
+        """Fit centroids with spherical k-means on a sample of the vectors (none if there are no vectors)."""
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        if n == 0:
+            # An empty store gets an empty index; every search returns nothing
+            self.centroids = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            self.nlist = 0
+            return
+        sample_rows = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+        sample = _normalize(vectors[sample_rows])
+        nlist = min(self.nlist, len(sample))
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=empty.sum())]
+            centroids = _normalize(sums)
+
+        self.centroids = centroids
+        self.nlist = nlist
+
+    def _assign(self, vectors, batch_size=65536):
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            batch = _normalize(vectors[start:start + batch_size])
+            assignment[start:start + batch_size] = np.argmax(batch @ self.centroids.T, axis=1)
+        return assignment
+
+    def add(self, vectors):
+        """Assign every vector of the store to an inverted list (rebuilds the lists)."""
+        assignment = self._assign(vectors)
+        self.list_rows = np.argsort(assignment, kind='stable').astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.nlist))])
+
+    def search(self, query, k, vectors, nprobe=8):
+        """
+        Return the `k` most similar rows to `query`.
+
+        Args:
+            query: Query vector of shape (dim,)
+            k: Number of results
+            vectors: The store's vector matrix (memory map)
+            nprobe: Number of inverted lists to scan
+
+        Returns:
+            tuple: (row numbers, cosine similarities), best first
+        """
+        query = _normalize(query)
+        probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        rows = np.concatenate([self.list_rows[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes]
+                              + [np.zeros(0, dtype=np.int64)])
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+        rows = np.sort(rows)  # sequential reads from the memory map
+        scores = _normalize(vectors[rows]) @ query
+        top = np.argsort(scores)[::-1][:k]
+        return rows[top], scores[top]
+
+    def save(self, path):
+        """Write the index to an .npz file."""
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()."""
+        data = np.load(path)
+        index = cls(nlist=len(data['centroids']))
+        index.centroids = data['centroids']
+        index.list_offsets = data['list_offsets']
+        index.list_rows = data['list_rows']
+        return index
@@ -0,0 +1,405 @@
+"""
+Shared HTTP helpers for the download scripts.
+
+Provides pooled keep-alive sessions, per-host concurrency limits and
+chunked, resumable streaming of responses to disk.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import RateLimitedAdapter
+
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Errors after which a transfer is resumed from the bytes already on disk
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def make_session(pool_maxsize=16, pool_connections=4, rate_controller=None, max_retries=5):
+    """
+    Create a requests session that keeps connections alive between calls.
+
+    Args:
+        pool_maxsize: Maximum number of pooled connections kept per host
+        pool_connections: Number of distinct hosts to keep pools for
+        rate_controller: Optional RateController; requests are then paced
+                         per host and 429/503 responses retried
+        max_retries: Retries per request when a rate controller is used
+
+    Returns:
+        requests.Session: Session with pooled adapters mounted for http/https
+    """
+    session = requests.Session()
+    if rate_controller is not None:
+        adapter = RateLimitedAdapter(rate_controller, max_retries=max_retries,
+                                     pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host.
+
+    Hosts without an explicit limit share `default_limit`.
+    """
+
+    def __init__(self, limits=None, default_limit=4):
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                limit = self.limits.get(host, self.default_limit)
+                self._semaphores[host] = threading.BoundedSemaphore(limit)
+            return self._semaphores[host]
+
+    def slot(self, url):
+        """Return the semaphore of the URL's host; use it as a context manager to hold one request slot."""
+        return self._semaphore(urlparse(url).hostname)
+
+    @property
+    def total(self):
+        """Upper bound on concurrent requests across the configured hosts."""
+        return sum(self.limits.values()) or self.default_limit
+
+
+def hash_file(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return (size, sha256 hex digest) of a file, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def _expected_length(response, offset):
+    """Full size of the resource, from Content-Range or Content-Length; None if unknown."""
+    if response.status_code == 206:
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        if total.isdigit():
+            return int(total)
+    # A compressed body is decoded by iter_content, so its length won't match
+    if response.headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    length = response.headers.get('Content-Length', '')
+    return int(length) + offset if length.isdigit() else None
+
+
+def _record_response(metrics, host, response, start, op):
+    if metrics is not None:
+        metrics.inc("http_responses", host=host, status=response.status_code)
+        metrics.observe("request_seconds", time.monotonic() - start, host=host, op=op)
+
+
+def _download_ranges(session, url, path, size, parts, chunk_size, timeout, retries, metrics, validator=None,
+                     limiter=None):
+    """
+    Fetch `size` bytes as `parts` byte ranges in parallel, each written at its offset.
+
+    With a limiter, the calling thread fetches ranges under the host slot
+    its caller already holds, and every other thread only starts taking
+    ranges once it got a slot of its own. The host's limit thus holds, and
+    when no slot is free the calling thread fetches the ranges one by one
+    instead of waiting for slots held by other downloads.
+
+    Every connection error is recorded in `metrics` here, including one
+    that is raised after the last retry.
+
+    Returns:
+        tuple: (bytes received, seconds spent writing)
+    """
+    host = urlparse(url).hostname
+    step = -(-size // parts)
+    ranges = deque((first, min(first + step, size) - 1) for first in range(0, size, step))
+    ranges_lock = threading.Lock()
+    failed = threading.Event()
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    fd = os.open(path, os.O_WRONLY)
+
+    def fetch(first, last):
+        position, received, disk_seconds = first, 0, 0.0
+        for attempt in range(retries + 1):
+            start = time.monotonic()
+            headers = {'Range': f"bytes={position}-{last}"}
+            if validator:
+                headers['If-Range'] = validator
+            try:
+                with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+                    _record_response(metrics, host, response, start, "range")
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise IOError(f"Range request to {url} answered with {response.status_code}")
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        chunk = chunk[:last + 1 - position]
+                        write_start = time.monotonic()
+                        os.pwrite(fd, chunk, position)
+                        disk_seconds += time.monotonic() - write_start
+                        position += len(chunk)
+                        received += len(chunk)
+            except RETRYABLE_ERRORS as e:
+                if metrics is not None:
+                    metrics.inc("errors", host=host, type=type(e).__name__)
+                if attempt == retries:
+                    raise
+                continue
+            if position > last:
+                return received, disk_seconds
+        raise IOError(f"Incomplete range {first}-{last} of {url}")
+
+    def drain():
+        """Fetch ranges until none are left (or another thread failed)."""
+        results = []
+        while not failed.is_set():
+            with ranges_lock:
+                if not ranges:
+                    break
+                first, last = ranges.popleft()
+            try:
+                results.append(fetch(first, last))
+            except BaseException:
+                failed.set()
+                raise
+        return results
+
+    def helper():
+        if limiter is None:
+            return drain()
+        slot = limiter.slot(url)
+        while ranges and not failed.is_set():
+            if slot.acquire(timeout=0.1):
+                try:
+                    return drain()
+                finally:
+                    slot.release()
+        return []
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges) - 1 or 1) as executor:
+            helpers = [executor.submit(helper) for _ in range(len(ranges) - 1)]
+            results = drain()
+            for future in helpers:
+                results += future.result()
+    finally:
+        os.close(fd)
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def _validator(response):
+    """ETag or Last-Modified of a response, usable in If-Range (weak ETags are not); None if neither."""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def _range_start(response):
+    """First byte position of a 206 response's Content-Range; None if it can't be parsed."""
+    first = response.headers.get('Content-Range', '').removeprefix('bytes ').partition('-')[0]
+    return int(first) if first.isdigit() else None
+
+
+# Part files being written in this process: part path -> [lock, number of users]
+_part_locks = {}
+_part_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _part_lock(path):
+    """Hold the lock of one part file, so two downloads never write to it at once."""
+    with _part_locks_guard:
+        entry = _part_locks.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _part_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _part_locks[path]
+
+
+def stream_to_file(session, url, filepath, chunk_size=DEFAULT_CHUNK_SIZE, timeout=30, metrics=None,
+                   resume=True, retries=3, multipart_threshold=None, parts=4, response_headers=None,
+                   limiter=None):
+    """
+    Stream a URL to disk one chunk at a time, hashing it on the way.
+
+    The body is written to '.<name>.<url hash>.part' next to `filepath` and
+    renamed into place only once its length matches the server's
+    Content-Length, so an interrupted transfer never leaves a truncated
+    file behind. A transfer cut off by a timeout or reset continues from the
+    bytes already on disk with a Range request, both within this call (up to
+    `retries` times) and in a later call for the same URL and path.
+
+    The ETag (or Last-Modified) of the response is kept next to the part
+    file and sent as If-Range when resuming, so a resource that changed in
+    the meantime comes back whole (200) and replaces the part file instead
+    of being spliced onto it; so do servers that ignore Range. A part file
+    without a validator is never resumed. Downloads of the same URL to the
+    same path within this process wait for each other.
+
+    Args:
+        session: requests.Session to issue the request with
+        url: URL to download
+        filepath: Final destination path
+        chunk_size: Bytes read from the socket per write
+        timeout: Connect/read timeout in seconds
+        metrics: Optional Metrics receiving bytes, response status, latency
+                 to the first byte and the split between socket and disk time
+        resume: Continue from a part file left by an earlier attempt
+        retries: Resumed attempts after a connection error or short body
+        multipart_threshold: Files of at least this many bytes, from hosts
+                             advertising 'Accept-Ranges: bytes', are fetched
+                             as `parts` ranges in parallel (None disables this)
+        parts: Number of parallel ranges for multipart downloads
+        response_headers: Optional dict that receives the headers of the
+                          response the body was read from (e.g. its ETag)
+        limiter: Optional HostLimiter the caller holds a slot of for this
+                 URL's host; multipart ranges beyond the first then each
+                 need a further slot
+
+    Returns:
+        tuple: (bytes written, sha256 hex digest)
+    """
+    filepath = Path(filepath)
+    url_key = hashlib.sha1(url.encode()).hexdigest()[:12]
+    part_path = filepath.with_name(f".{filepath.name}.{url_key}.part")
+    validator_path = filepath.with_name(f".{filepath.name}.{url_key}.validator")
+    host = urlparse(url).hostname
+
+    def discard():
+        part_path.unlink(missing_ok=True)
+        validator_path.unlink(missing_ok=True)
+
+    received = 0
+    disk_seconds = 0.0
+    start = time.monotonic()
+    with _part_lock(str(part_path)):
+        if not resume:
+            discard()
+        try:
+            for attempt in range(retries + 1):
+                offset = part_path.stat().st_size if part_path.exists() else 0
+                validator = validator_path.read_text() if offset and validator_path.exists() else None
+                if offset and not validator:
+                    # Nothing proves the bytes on disk belong to the current resource
+                    discard()
+                    offset = 0
+                headers = {'Range': f"bytes={offset}-", 'If-Range': validator} if offset else None
+                ranged = False
+                # Only a body streamed from byte zero in one go can be hashed on the way
+                digest = hashlib.sha256() if not offset else None
+                request_start = time.monotonic()
+                try:
+                    with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+                        _record_response(metrics, host, response, request_start, "get")
+                        if offset and (response.status_code == 416
+                                       or response.status_code == 206 and _range_start(response) != offset):
+                            # The part file is not a prefix of the current resource
+                            discard()
+                            continue
+                        response.raise_for_status()
+                        if response_headers is not None:
+                            response_headers.update(response.headers)
+                        if response.status_code != 206:
+                            # A whole body: first request, changed resource or Range ignored
+                            offset = 0
+                            digest = hashlib.sha256()
+                            validator = _validator(response)
+                            if validator:
+                                validator_path.write_text(validator)
+                            else:
+                                validator_path.unlink(missing_ok=True)
+                        expected = _expected_length(response, offset)
+
+                        if (multipart_threshold and not offset and expected and expected >= multipart_threshold
+                                and response.headers.get('Accept-Ranges') == 'bytes'):
+                            response.close()
+                            ranges_path = filepath.with_name(f".{filepath.name}.{url_key}.ranges")
+                            ranged = True
+                            try:
+                                got, spent = _download_ranges(session, url, ranges_path, expected, parts,
+                                                              chunk_size, timeout, retries, metrics, validator,
+                                                              limiter)
+                            except BaseException:
+                                # Ranges may have left holes, so this file can't be resumed
+                                ranges_path.unlink(missing_ok=True)
+                                raise
+                            received += got
+                            disk_seconds += spent
+                            os.replace(ranges_path, part_path)
+                            digest = None
+                        else:
+                            with open(part_path, 'ab' if offset else 'wb') as f:
+                                for chunk in response.iter_content(chunk_size=chunk_size):
+                                    write_start = time.monotonic()
+                                    f.write(chunk)
+                                    disk_seconds += time.monotonic() - write_start
+                                    if digest is not None:
+                                        digest.update(chunk)
+                                    received += len(chunk)
+                except RETRYABLE_ERRORS as e:
+                    if attempt == retries:
+                        raise
+                    # Errors of range requests were recorded by _download_ranges
+                    if metrics is not None and not ranged:
+                        metrics.inc("errors", host=host, type=type(e).__name__)
+                    continue
+
+                size = part_path.stat().st_size
+                if expected is None or size == expected:
+                    break
+                if size > expected or attempt == retries:
+                    discard()
+                    raise IOError(f"Length mismatch for {url}: got {size:,} bytes, expected {expected:,}")
+            else:
+                raise IOError(f"Could not download {url} after {retries + 1} attempts")
+
+            if digest is None:
+                size, sha256 = hash_file(part_path, chunk_size)
+            else:
+                sha256 = digest.hexdigest()
+            os.replace(part_path, filepath)
+            validator_path.unlink(missing_ok=True)
+        except BaseException as e:
+            if isinstance(e, requests.HTTPError):
+                # The resource is gone or refused; a part file of it is of no use
+                discard()
+            if metrics is not None:
+                metrics.inc("errors", host=host, type=type(e).__name__)
+            raise
+        finally:
+            if metrics is not None:
+                metrics.inc("bytes", received, host=host)
+                metrics.inc("disk_seconds", disk_seconds)
+                metrics.inc("network_seconds", time.monotonic() - start - disk_seconds)
+    return size, sha256
+
+
+def http_status_of(error):
+    """Return the HTTP status code carried by a requests exception, if any."""
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
@@ -0,0 +1,235 @@
+"""
+Append-only manifest writer.
+
+Manifest entries are buffered and flushed as small Parquet part files (one
+row group each) next to the manifest, in '<manifest stem>.parts/', while a
+download runs. Every part is written to a temporary file and renamed into
+place, so a crash loses at most the unflushed buffer and readers can load
+the manifest mid-run with read_manifest(). compact() merges the parts into
+the single manifest.parquet the rest of the pipeline reads. Rows of one
+entry are merged column by column: the newest row decides the download
+outcome, and metadata it leaves empty keeps its earlier value.
+
+    with ManifestWriter() as writer:
+        for entry in entries:
+            writer.write(entry)
+    writer.compact()
+"""
+
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Typed schema of the da Vinci manifest; further columns (e.g. dup_cluster
+# from dedup) are not written by the writer, but compaction keeps them
+MANIFEST_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("filename", pa.string()),
+    ("original_title", pa.string()),
+    ("url", pa.string()),
+    ("status", pa.string()),
+    ("sha256", pa.string()),
+    ("object", pa.string()),     # content store path relative to the manifest, when stored there
+    ("full_filename", pa.string()),  # full-resolution image relative to the manifest, from details
+    ("year", pa.string()),
+    ("source", pa.string()),
+    ("medium", pa.string()),
+    ("dimensions", pa.string()),
+    ("location", pa.string()),
+    ("notes", pa.string()),
+    ("error", pa.string()),
+])
+
+
+# Columns describing an entry's latest download attempt: always taken from
+# its newest row. Every other column (metadata filled in later, columns only
+# the compacted file has) keeps an older value when the newer row leaves it
+# null or lacks the column, so rewriting an entry doesn't wipe them
+ATTEMPT_COLUMNS = ('id', 'filename', 'url', 'status', 'sha256', 'object', 'error')
+
+
+def _merge_rows(manifest, key):
+    """Collapse rows (oldest first) to one per key, merging column by column."""
+    latest = manifest.drop_duplicates(subset=key, keep='last').set_index(key)
+    merged = [name for name in manifest.columns if name != key and name not in ATTEMPT_COLUMNS]
+    if merged:
+        # GroupBy.last() takes the last non-null value of every column
+        last_known = manifest.groupby(key, sort=False)[merged].last()
+        latest[merged] = last_known.reindex(latest.index)
+    return latest.reset_index()[list(manifest.columns)]
+
+
+def _parts_dir(manifest_path):
+    return manifest_path.with_name(manifest_path.stem + ".parts")
+
+
+def _coerce(value, field):
+    """Normalise one value for `field`: missing/NaN becomes None, text fields become str."""
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return None
+    return str(value) if pa.types.is_string(field.type) else value
+
+
+def _to_table(frame, schema):
+    """Cast a DataFrame to `schema`, adding missing columns as nulls and keeping extra ones."""
+    frame = frame.copy()
+    for field in schema:
+        if field.name not in frame.columns:
+            frame[field.name] = None
+        elif pa.types.is_string(field.type):
+            frame[field.name] = frame[field.name].map(lambda v, field=field: _coerce(v, field))
+    table = pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+    for name in frame.columns:
+        if name not in schema.names:
+            table = table.append_column(name, pa.Table.from_pandas(frame[[name]], preserve_index=False).column(0))
+    return table
+
+
+def read_manifest(manifest_path, columns=None, key='original_title'):
+    """
+    Read a manifest, including parts not yet compacted.
+
+    Args:
+        manifest_path: Path of the compacted manifest.parquet
+        columns: Optional list of columns to return
+        key: Column identifying an entry; rows of one entry are merged, newest
+             first (see ATTEMPT_COLUMNS)
+
+    Returns:
+        pd.DataFrame or None: The manifest, or None if neither the file nor any part exists
+    """
+    manifest_path = Path(manifest_path)
+    paths = [manifest_path] if manifest_path.exists() else []
+    parts_dir = _parts_dir(manifest_path)
+    if parts_dir.exists():
+        # Part names start with a nanosecond timestamp, so sorting puts them in write order
+        paths += sorted(parts_dir.glob("part-*.parquet"))
+    if not paths:
+        return None
+
+    frames = [pd.read_parquet(path) for path in paths]
+    manifest = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if len(frames) > 1:
+        manifest = _merge_rows(manifest, key)
+        if 'id' in manifest.columns:
+            manifest = manifest.sort_values('id', kind='stable')
+        manifest = manifest.reset_index(drop=True)
+    return manifest[columns] if columns is not None else manifest
+
+
+def compact_manifest(manifest_path, schema=MANIFEST_SCHEMA, key='original_title'):
+    """
+    Merge a manifest and its parts into one Parquet file and remove the parts.
+
+    Args:
+        manifest_path: Path of the compacted manifest.parquet
+        schema: Schema the known columns are cast to
+        key: Column identifying an entry; rows of one entry are merged, newest first
+
+    Returns:
+        int: Number of entries in the compacted manifest (0 if there was nothing to compact)
+    """
+    manifest_path = Path(manifest_path)
+    parts_dir = _parts_dir(manifest_path)
+    parts = sorted(parts_dir.glob("part-*.parquet")) if parts_dir.exists() else []
+    manifest = read_manifest(manifest_path, key=key)
+    if manifest is None:
+        return 0
+
+    if parts:
+        tmp_path = manifest_path.with_name(f".{manifest_path.name}.part")
+        pq.write_table(_to_table(manifest, schema), tmp_path)
+        os.replace(tmp_path, manifest_path)
+        # Only remove what was merged; parts written meanwhile stay for the next compaction
+        for part in parts:
+            part.unlink()
+    return len(manifest)
+
+
+class ManifestWriter:
+    """
+    Buffered, thread-safe writer of manifest entries as Parquet parts.
+
+    Args:
+        manifest_path: Path of the compacted manifest (relative to repo root);
+                       parts are written to '<stem>.parts/' next to it
+        schema: pyarrow schema of the written rows
+        row_group_size: Entries per part file
+        flush_every: Seconds after which a partial buffer is flushed on the
+                     next write, so readers see recent progress
+        key: Column identifying an entry, used by compact()
+    """
+
+    def __init__(self, manifest_path='data/da-vinci-works/manifest.parquet', schema=MANIFEST_SCHEMA,
+                 row_group_size=1000, flush_every=10.0, key='original_title'):
+        repo_root = Path(__file__).parent.parent.parent
+        self.manifest_path = repo_root / manifest_path
+        self.parts_dir = _parts_dir(self.manifest_path)
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.flush_every = flush_every
+        self.key = key
+        self.written = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, entry):
+        """Buffer one manifest entry; a part is flushed once the buffer is full or old enough."""
+        row = {field.name: _coerce(entry.get(field.name), field) for field in self.schema}
+        with self._lock:
+            self._buffer.append(row)
+            if (len(self._buffer) >= self.row_group_size
+                    or time.monotonic() - self._last_flush >= self.flush_every):
+                self._flush()
+
+    def write_many(self, entries):
+        for entry in entries:
+            self.write(entry)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = pa.Table.from_pylist(self._buffer, schema=self.schema)
+        name = f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+        # Created on first use, so runs that write nothing leave no empty directory behind
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.parts_dir / f".{name}.part"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self.parts_dir / name)
+        self.written += len(self._buffer)
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write buffered entries as a part file."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Flush the remaining entries."""
+        self.flush()
+
+    def read(self, columns=None):
+        """Read the manifest as written so far (compacted file plus parts)."""
+        self.flush()
+        return read_manifest(self.manifest_path, columns=columns, key=self.key)
+
+    def compact(self):
+        """Flush and merge all parts into the manifest file; returns its number of entries."""
+        self.flush()
+        with self._lock:
+            return compact_manifest(self.manifest_path, schema=self.schema, key=self.key)
@@ -6,6 +6,19 @@ Met Museum Open Access dataset from Kaggle.
 """
 
 from .download import download_met_dataset
+from .convert import csv_to_parquet
+from .api import get_met_object_details
+from .catalog import MetCatalog
+from .client import MetClient
+from .bulk_download import download_met_images, load_public_domain_objects
 
-__all__ = ['download_met_dataset']
+__all__ = [
+    'download_met_dataset',
+    'csv_to_parquet',
+    'get_met_object_details',
+    'MetCatalog',
+    'MetClient',
+    'download_met_images',
+    'load_public_domain_objects'
+]
 
@@ -0,0 +1,33 @@
+"""
+Thin wrapper around the Met Museum Collection API.
+"""
+
+import requests
+
+
+MET_API_URL = "https://collectionapi.metmuseum.org/public/collection/v1/objects"
+
+# Starting points for the adaptive rate control (requests/second per host);
+# the API documents a limit of 80 requests per second
+MET_RATE_LIMITS = {
+    "collectionapi.metmuseum.org": {"rate": 20, "max_rate": 80},
+    "images.metmuseum.org": {"rate": 50, "max_rate": 400},
+}
+
+
+def get_met_object_details(object_id, session=None, timeout=10, api_url=MET_API_URL):
+    """
+    Fetch object details from the Met Museum API.
+
+    Args:
+        object_id: The Object ID from the CSV
+        session: Optional requests.Session to reuse pooled connections
+        timeout: Request timeout in seconds
+        api_url: Objects endpoint (override to point at a local stand-in)
+
+    Returns:
+        dict: Object details including image URL
+    """
+    response = (session or requests).get(f"{api_url}/{object_id}", timeout=timeout)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,288 @@
+"""
+Bulk download of Met Museum public domain images.
+
+Object IDs are resolved to their `primaryImage` through the Collection API
+and the images are streamed to disk by a bounded pool of worker threads
+sharing one keep-alive session. The API host and the image CDN get their
+own concurrency limits.
+
+Run from src/ with: python -m data_prep.met_museum.bulk_download
+
+To split the download across N machines, run on each:
+    python -m data_prep.met_museum.bulk_download --num-shards N --shard-index i
+optionally with --queue /shared/met-queue.sqlite so that nodes also take
+over the work of slow or dead ones (see sharding.py).
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from urllib.parse import urlparse
+
+from ..fetch import HostLimiter, http_status_of, make_session, stream_to_file
+from ..metrics import Metrics
+from ..ratelimit import RateController
+from ..state import DownloadState
+from .api import MET_API_URL, MET_RATE_LIMITS
+from .catalog import MetCatalog
+from .client import MetClient
+from .sharding import LeaseQueue, select_shard
+
+
+API_HOST = urlparse(MET_API_URL).hostname
+IMAGE_HOST = "images.metmuseum.org"
+
+DEFAULT_HOST_LIMITS = {
+    API_HOST: 8,
+    IMAGE_HOST: 16,
+}
+
+# Originals at least this large are fetched as parallel byte ranges
+MULTIPART_THRESHOLD = 32 * 1024 * 1024
+
+
+def load_public_domain_objects(parquet_path=None):
+    """
+    Read the public domain objects from the converted MetObjects parquet.
+
+    Args:
+        parquet_path: Path to MetObjects.parquet (defaults to data/met-museum)
+
+    Returns:
+        pd.DataFrame: 'Object ID' and 'Department' of public domain objects
+    """
+    with MetCatalog(parquet_path) as catalog:
+        return catalog.select(['Object ID', 'Department'], public_domain=True).to_pandas()
+
+
+def _download_object(object_id, client, session, limiter, data_dir, timeout, metrics):
+    """Resolve one object's primary image and stream it to disk."""
+    result = {"object_id": object_id, "image_url": None, "filename": None,
+              "bytes": 0, "sha256": None, "http_status": None}
+
+    api_host = urlparse(client.api_url).hostname
+    waited = time.monotonic()
+    with limiter.slot(client.api_url):
+        metrics.observe("slot_wait_seconds", time.monotonic() - waited, host=api_host)
+        with metrics.time("request_seconds", host=api_host, op="object"):
+            details = client.get(object_id)
+
+    image_url = details.get('primaryImage')
+    if not image_url:
+        result.update(status="no_image", http_status=200)
+        return result
+
+    file_ext = Path(urlparse(image_url).path).suffix or '.jpg'
+    filename = f"{object_id}{file_ext}"
+    waited = time.monotonic()
+    with limiter.slot(image_url):
+        metrics.observe("slot_wait_seconds", time.monotonic() - waited, host=urlparse(image_url).hostname)
+        size, sha256 = stream_to_file(session, image_url, data_dir / filename, timeout=timeout,
+                                      metrics=metrics, multipart_threshold=MULTIPART_THRESHOLD,
+                                      limiter=limiter)
+
+    result.update(status="success", image_url=image_url, filename=filename,
+                  bytes=size, sha256=sha256, http_status=200)
+    return result
+
+
+def download_met_images(object_ids, output_dir='data/met-museum/images', host_limits=None,
+                        default_host_limit=4, timeout=30, on_result=None, progress_every=5.0,
+                        state=None, client=None, metrics=None, api_url=MET_API_URL, rate_limits=None):
+    """
+    Download the primary image of every object in `object_ids`.
+
+    Args:
+        object_ids: Iterable of Met object IDs
+        output_dir: Directory to save images (relative to repo root)
+        host_limits: Dict of hostname -> max concurrent requests
+                     (defaults to DEFAULT_HOST_LIMITS)
+        default_host_limit: Limit for hosts not listed in `host_limits`
+        timeout: Per-request timeout in seconds
+        on_result: Optional callback receiving each per-object result dict
+        progress_every: Seconds between progress lines
+        state: Optional DownloadState; when given, every result is recorded
+               under the 'met' dataset and the output directory is not
+               scanned for existing files (pass `state.pending('met')` as
+               `object_ids` to resume)
+        client: Optional MetClient; object details already in its cache are
+                not requested again (a default cached client is used otherwise)
+        metrics: Optional Metrics to record into (e.g. one with an export
+                 path); by default a private one only prints progress
+        api_url: Objects endpoint used when no client is given
+        rate_limits: Dict of hostname -> AdaptiveRateLimiter arguments for
+                     image downloads (defaults to MET_RATE_LIMITS); rates
+                     adapt to 429/503 responses from there
+
+    Returns:
+        dict: Counts of success, skipped, no_image and failed objects
+    """
+    repo_root = Path(__file__).parent.parent.parent.parent
+    data_dir = repo_root / output_dir
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    limiter = HostLimiter(host_limits or DEFAULT_HOST_LIMITS, default_limit=default_host_limit)
+    workers = limiter.total
+    rate_controller = RateController(rate_limits or MET_RATE_LIMITS)
+    session = make_session(pool_maxsize=max(limiter.limits.values(), default=default_host_limit),
+                           rate_controller=rate_controller)
+    own_client = client is None
+    if own_client:
+        client = MetClient(session=session, timeout=timeout, api_url=api_url)
+
+    # One directory listing instead of a stat per object; with a state
+    # store the caller already passes only the pending objects
+    existing = set()
+    if state is None:
+        existing = {Path(entry.name).stem for entry in os.scandir(data_dir) if entry.is_file()}
+
+    own_metrics = metrics is None
+    if own_metrics:
+        total = len(object_ids) if hasattr(object_ids, '__len__') else None
+        metrics = Metrics("met_download", total=total, progress_every=progress_every)
+    metrics.start()
+
+    print(f"Saving images to: {data_dir}")
+    print(f"Workers: {workers} (host limits: {limiter.limits})")
+    print("=" * 60)
+
+    counts = dict.fromkeys(("success", "skipped", "no_image", "failed"), 0)
+    start = time.monotonic()
+
+    def record(result):
+        counts[result["status"]] += 1
+        metrics.inc("items", status=result["status"])
+        if state is not None and result["status"] != "skipped":
+            state.record("met", result["object_id"], result["status"],
+                         url=result.get("image_url"), filename=result.get("filename"),
+                         bytes=result.get("bytes"), sha256=result.get("sha256"),
+                         http_status=result.get("http_status"), error=result.get("error"))
+        if on_result is not None:
+            on_result(result)
+
+    # Keep a bounded number of futures in flight so memory does not grow
+    # with the size of `object_ids`
+    max_pending = workers * 4
+    pending = {}
+
+    def drain():
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            object_id = pending.pop(future)
+            try:
+                record(future.result())
+            except Exception as e:
+                record({"object_id": object_id, "status": "failed",
+                        "http_status": http_status_of(e), "error": str(e)})
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for object_id in object_ids:
+            if str(object_id) in existing:
+                record({"object_id": object_id, "status": "skipped"})
+                continue
+            future = executor.submit(_download_object, object_id, client, session, limiter, data_dir,
+                                     timeout, metrics)
+            pending[future] = object_id
+            if len(pending) >= max_pending:
+                drain()
+        while pending:
+            drain()
+
+    if state is not None:
+        state.flush()
+    metrics.inc("api_cache", client.hits, result="hit")
+    metrics.inc("api_cache", client.misses, result="miss")
+    metrics.inc("api_cache", client.revalidated, result="revalidated")
+    if own_client:
+        client.close()
+    if own_metrics:
+        metrics.close()
+
+    elapsed = time.monotonic() - start
+    print("\n" + "=" * 60)
+    print(f"✓ Download complete in {elapsed/60:.1f} minutes")
+    for name, count in counts.items():
+        print(f"  {name.replace('_', ' ').capitalize()}: {count:,}")
+    for host, control in rate_controller.summary().items():
+        print(f"  Rate {host}: {control['rate']:.1f} req/s ({control['throttled']:,} throttled responses)")
+    print(f"  Location: {data_dir}")
+
+    return counts
+
+
+def download_from_queue(work, state, **kwargs):
+    """
+    Download the objects of a LeaseQueue until no worker has any left.
+
+    Leased objects are downloaded in rounds: a round ends when nothing is
+    left to lease and this worker's own items are finished, and the next
+    round waits for (or takes over) what other workers still hold.
+
+    Args:
+        work: LeaseQueue of this worker
+        state: DownloadState; objects it already finished are completed in
+               the queue without being downloaded again
+        **kwargs: Passed on to download_met_images
+
+    Returns:
+        dict: Counts of success, skipped, no_image and failed objects over all rounds
+    """
+    # Objects without an image are final too; asking the API again won't change that
+    done = state.completed("met", statuses=('success', 'no_image'))
+
+    def finish(result):
+        status = 'failed' if result["status"] == 'failed' else 'done'
+        work.complete(result["object_id"], status, error=result.get("error"))
+
+    def leased():
+        for object_id in work.items():
+            if object_id in done:
+                # Already finished by this node in an earlier run
+                work.complete(object_id)
+            else:
+                yield object_id
+
+    counts = {}
+    while True:
+        for name, count in download_met_images(leased(), state=state, on_result=finish, **kwargs).items():
+            counts[name] = counts.get(name, 0) + count
+        if not work.remaining():
+            return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download Met public domain images")
+    parser.add_argument('--num-shards', type=int, default=1,
+                        help="Split the collection into this many hash shards (one per node)")
+    parser.add_argument('--shard-index', type=int, default=0, help="Shard downloaded by this node")
+    parser.add_argument('--queue', default=None,
+                        help="Shared SQLite lease queue; nodes then also take over unfinished "
+                             "work of other shards and of dead workers")
+    parser.add_argument('--lease-seconds', type=float, default=300)
+    parser.add_argument('--worker-id', default=None)
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.num_shards:
+        parser.error("--shard-index must be between 0 and --num-shards - 1")
+
+    objects = load_public_domain_objects()
+    print(f"Public domain objects: {len(objects):,}")
+
+    with DownloadState() as state:
+        new = state.register("met", objects['Object ID'], departments=objects['Department'])
+        pending = state.pending("met")
+        print(f"Newly registered: {new:,}, pending or failed: {len(pending):,}")
+        with Metrics("met_download", export_path="data/met-museum/metrics") as metrics:
+            if args.queue is None:
+                pending = select_shard(pending, args.shard_index, args.num_shards)
+                metrics.total = len(pending)
+                print(f"Shard {args.shard_index + 1}/{args.num_shards}: {len(pending):,} objects")
+                download_met_images(pending, state=state, metrics=metrics)
+            else:
+                with LeaseQueue(args.queue, worker_id=args.worker_id, lease_seconds=args.lease_seconds,
+                                num_shards=args.num_shards, shard_index=args.shard_index) as work:
+                    added = work.fill(objects['Object ID'])
+                    print(f"Queue {args.queue}: {added:,} objects added, worker {work.worker_id}")
+                    download_from_queue(work, state, metrics=metrics)
+                    print(f"  Queue: {work.summary()}")
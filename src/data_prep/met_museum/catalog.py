@@ -0,0 +1,141 @@
+"""
+DuckDB query layer over the converted MetObjects parquet.
+
+Filters are pushed down into the Parquet scan and only the requested
+columns are read, so selecting candidate objects takes milliseconds
+instead of a full Python-level parse of MetObjects.csv.
+"""
+
+from pathlib import Path
+
+import duckdb
+
+
+class MetCatalog:
+    """
+    Filtered, column-pruned queries over MetObjects.parquet.
+
+    All query methods accept the same filters:
+        public_domain: Match 'Is Public Domain' (True/False)
+        highlight: Match 'Is Highlight' (True/False)
+        department: Department name or list of names
+        begin_year: Keep objects whose date range ends on or after this year
+        end_year: Keep objects whose date range starts on or before this year
+        artist: Case-insensitive substring of 'Artist Display Name'
+
+    Args:
+        parquet_path: Path to MetObjects.parquet (defaults to data/met-museum)
+    """
+
+    def __init__(self, parquet_path=None):
+        if parquet_path is None:
+            repo_root = Path(__file__).parent.parent.parent.parent
+            parquet_path = repo_root / "data" / "met-museum" / "MetObjects.parquet"
+        self.parquet_path = Path(parquet_path)
+        self._con = duckdb.connect()
+        escaped = str(self.parquet_path).replace("'", "''")
+        self._con.execute(f"CREATE VIEW objects AS SELECT * FROM read_parquet('{escaped}')")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _where(public_domain=None, highlight=None, department=None,
+               begin_year=None, end_year=None, artist=None):
+        clauses, params = [], []
+        if public_domain is not None:
+            clauses.append('"Is Public Domain" = ?')
+            params.append(bool(public_domain))
+        if highlight is not None:
+            clauses.append('"Is Highlight" = ?')
+            params.append(bool(highlight))
+        if department is not None:
+            departments = [department] if isinstance(department, str) else list(department)
+            clauses.append(f'"Department" IN ({", ".join("?" * len(departments))})')
+            params.extend(departments)
+        if begin_year is not None:
+            clauses.append('"Object End Date" >= ?')
+            params.append(int(begin_year))
+        if end_year is not None:
+            clauses.append('"Object Begin Date" <= ?')
+            params.append(int(end_year))
+        if artist is not None:
+            clauses.append('"Artist Display Name" ILIKE ?')
+            params.append(f"%{artist}%")
+        sql = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return sql, params
+
+    def _query(self, select, filters, order_by=None, limit=None):
+        where, params = self._where(**filters)
+        sql = f"SELECT {select} FROM objects{where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._con.execute(sql, params)
+
+    def object_ids(self, limit=None, **filters):
+        """
+        Return matching object IDs.
+
+        Returns:
+            np.ndarray: int64 object IDs in ascending order
+        """
+        result = self._query('"Object ID"', filters, order_by='"Object ID"', limit=limit)
+        return result.fetchnumpy()['Object ID']
+
+    def select(self, columns, limit=None, **filters):
+        """
+        Return the given columns for matching objects.
+
+        Args:
+            columns: List of column names to read
+            limit: Optional maximum number of rows
+
+        Returns:
+            pyarrow.Table: Matching rows, ordered by object ID
+        """
+        select = ', '.join('"' + c.replace('"', '""') + '"' for c in columns)
+        return self._query(select, filters, order_by='"Object ID"', limit=limit).fetch_arrow_table()
+
+    def batches(self, columns, batch_size=65536, **filters):
+        """
+        Stream the given columns for matching objects in record batches.
+
+        Args:
+            columns: List of column names to read
+            batch_size: Rows per batch
+
+        Yields:
+            pyarrow.RecordBatch: Matching rows, ordered by object ID
+        """
+        select = ', '.join('"' + c.replace('"', '""') + '"' for c in columns)
+        reader = self._query(select, filters, order_by='"Object ID"').fetch_record_batch(batch_size)
+        yield from reader
+
+    def count(self, **filters):
+        """Return the number of matching objects."""
+        return self._query('count(*)', filters).fetchone()[0]
+
+    def value_counts(self, column, **filters):
+        """Return object counts per value of `column` among matching objects, as a dict."""
+        quoted = '"' + column.replace('"', '""') + '"'
+        where, params = self._where(**filters)
+        rows = self._con.execute(
+            f"SELECT {quoted}, count(*) FROM objects{where} GROUP BY ALL ORDER BY ALL", params
+        ).fetchall()
+        return dict(rows)
+
+    def departments(self):
+        """Return object counts per department as a dict."""
+        rows = self._con.execute(
+            'SELECT "Department", count(*) FROM objects GROUP BY ALL ORDER BY ALL'
+        ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        """Close the underlying DuckDB connection."""
+        self._con.close()
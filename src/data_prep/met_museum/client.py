@@ -0,0 +1,304 @@
+"""
+Met Collection API client with a persistent on-disk response cache.
+
+Object details are stored zlib-compressed in a DuckDB file keyed by
+object ID. Entries older than the TTL are revalidated with a conditional
+request (ETag / Last-Modified), and the least recently used entries are
+evicted once the cache grows past its size limit. Fetched entries and
+access times are buffered and written in batched transactions, so worker
+threads don't queue behind one DuckDB write per lookup.
+"""
+
+import json
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import duckdb
+
+from ..fetch import make_session
+from ..ratelimit import RateController
+from .api import MET_API_URL, MET_RATE_LIMITS
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS object_cache (
+    object_id BIGINT PRIMARY KEY,
+    body BLOB NOT NULL,
+    etag VARCHAR,
+    last_modified VARCHAR,
+    fetched_at DOUBLE NOT NULL,
+    accessed_at DOUBLE NOT NULL,
+    size INTEGER NOT NULL
+)
+"""
+
+
+class MetClient:
+    """
+    Cached access to Met object details.
+
+    Args:
+        cache_path: DuckDB cache file (defaults to data/met-museum/api_cache.duckdb)
+        ttl: Seconds before a cached entry is revalidated with the API
+        max_bytes: Compressed cache size above which LRU entries are evicted
+        session: Optional requests.Session (a pooled one is created otherwise)
+        workers: Concurrent API requests used by get_many
+        timeout: Request timeout in seconds
+        api_url: Objects endpoint (override to point at a local stand-in)
+        batch_size: Buffered entries and access times written per transaction
+    """
+
+    def __init__(self, cache_path=None, ttl=30 * 24 * 3600, max_bytes=2 * 1024**3,
+                 session=None, workers=8, timeout=10, api_url=MET_API_URL, batch_size=500):
+        if cache_path is None:
+            repo_root = Path(__file__).parent.parent.parent.parent
+            cache_path = repo_root / "data" / "met-museum" / "api_cache.duckdb"
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.cache_path = Path(cache_path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.timeout = timeout
+        self.api_url = api_url.rstrip('/')
+        self.batch_size = batch_size
+        self.session = session or make_session(pool_maxsize=workers,
+                                               rate_controller=RateController(MET_RATE_LIMITS))
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+        self._lock = threading.Lock()
+        # Not yet written: fetched rows by ID, and access / revalidation times
+        self._rows = {}
+        self._accessed = {}
+        self._revalidated = {}
+        self._con = duckdb.connect(str(self.cache_path))
+        self._con.execute(SCHEMA)
+        self._total_bytes = self._con.execute(
+            "SELECT coalesce(sum(size), 0) FROM object_cache"
+        ).fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _lookup(self, object_ids):
+        """Return {object_id: (body, etag, last_modified, fetched_at)} for cached IDs."""
+        now = time.time()
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT object_id, body, etag, last_modified, fetched_at FROM object_cache "
+                "WHERE object_id IN (SELECT unnest(?::BIGINT[]))",
+                [list(object_ids)],
+            ).fetchall()
+            found = {row[0]: row[1:] for row in rows}
+            # Entries fetched since the last flush are only in the buffer
+            for object_id in object_ids:
+                if object_id in self._rows:
+                    found[object_id] = self._rows[object_id][1:5]
+            for object_id in found:
+                self._accessed[object_id] = now
+            self._flush_if_full_locked()
+        return found
+
+    def _fetch(self, object_id, cached=None):
+        """
+        Request one object from the API, conditionally if a cached copy exists.
+
+        Returns:
+            tuple: (details, row to store or None if unchanged)
+        """
+        headers = {}
+        if cached is not None:
+            _, etag, last_modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        response = self.session.get(f"{self.api_url}/{object_id}", headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            return json.loads(zlib.decompress(cached[0])), None
+        response.raise_for_status()
+
+        body = zlib.compress(response.content, 6)
+        row = (int(object_id), body, response.headers.get('ETag'),
+               response.headers.get('Last-Modified'))
+        return response.json(), row
+
+    def _store(self, rows, revalidated=()):
+        """Buffer fetched rows and revalidated IDs; written once a batch is full."""
+        now = time.time()
+        with self._lock:
+            for object_id in revalidated:
+                object_id = int(object_id)
+                if object_id in self._rows:
+                    self._rows[object_id] = (*self._rows[object_id][:4], now, now, self._rows[object_id][6])
+                else:
+                    self._revalidated[object_id] = now
+            for row in rows:
+                self._rows[row[0]] = (*row, now, now, len(row[1]))
+                self._revalidated.pop(row[0], None)
+                self._accessed.pop(row[0], None)
+            self._flush_if_full_locked()
+
+    def _flush_if_full_locked(self):
+        if len(self._rows) + len(self._accessed) + len(self._revalidated) >= self.batch_size:
+            self._flush_locked()
+
+    def flush(self):
+        """Write buffered entries and access times in a single transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not (self._rows or self._accessed or self._revalidated):
+            return
+        rows = list(self._rows.values())
+        # Rows being replaced get fresh timestamps anyway; touching them twice
+        # in one transaction trips DuckDB's primary key checks
+        accessed = [(i, t) for i, t in self._accessed.items() if i not in self._rows]
+        revalidated = list(self._revalidated.items())
+        self._con.execute("BEGIN TRANSACTION")
+        try:
+            if accessed:
+                self._con.execute(
+                    "UPDATE object_cache SET accessed_at = a.t "
+                    "FROM (SELECT unnest(?::BIGINT[]) AS id, unnest(?::DOUBLE[]) AS t) a "
+                    "WHERE object_cache.object_id = a.id",
+                    [[i for i, _ in accessed], [t for _, t in accessed]],
+                )
+            if revalidated:
+                self._con.execute(
+                    "UPDATE object_cache SET fetched_at = r.t, accessed_at = greatest(accessed_at, r.t) "
+                    "FROM (SELECT unnest(?::BIGINT[]) AS id, unnest(?::DOUBLE[]) AS t) r "
+                    "WHERE object_cache.object_id = r.id",
+                    [[i for i, _ in revalidated], [t for _, t in revalidated]],
+                )
+            old = 0
+            if rows:
+                old = self._con.execute(
+                    "SELECT coalesce(sum(size), 0) FROM object_cache "
+                    "WHERE object_id IN (SELECT unnest(?::BIGINT[]))",
+                    [[row[0] for row in rows]],
+                ).fetchone()[0]
+                self._con.executemany("INSERT OR REPLACE INTO object_cache VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._con.execute("COMMIT")
+        except Exception:
+            self._con.execute("ROLLBACK")
+            raise
+        self._rows.clear()
+        self._accessed.clear()
+        self._revalidated.clear()
+        self._total_bytes += sum(row[6] for row in rows) - old
+        if self._total_bytes > self.max_bytes:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        """Drop least recently used entries until the cache is at 90% of max_bytes."""
+        target = self._total_bytes - int(self.max_bytes * 0.9)
+        self._con.execute("""
+            DELETE FROM object_cache WHERE object_id IN (
+                SELECT object_id FROM (
+                    SELECT object_id, size,
+                           sum(size) OVER (ORDER BY accessed_at, object_id) AS freed
+                    FROM object_cache
+                ) WHERE freed - size < ?
+            )
+        """, [target])
+        self._total_bytes = self._con.execute(
+            "SELECT coalesce(sum(size), 0) FROM object_cache"
+        ).fetchone()[0]
+
+    def _is_fresh(self, cached):
+        return time.time() - cached[3] < self.ttl
+
+    def get(self, object_id):
+        """
+        Return the details of one object, from cache when possible.
+
+        Args:
+            object_id: Met object ID
+
+        Returns:
+            dict: Object details as returned by the API
+        """
+        object_id = int(object_id)
+        cached = self._lookup([object_id]).get(object_id)
+        if cached is not None and self._is_fresh(cached):
+            self.hits += 1
+            return json.loads(zlib.decompress(cached[0]))
+
+        details, row = self._fetch(object_id, cached)
+        if row is None:
+            self.revalidated += 1
+            self._store([], revalidated=[object_id])
+        else:
+            self.misses += 1
+            self._store([row])
+        return details
+
+    def get_many(self, object_ids, errors=None):
+        """
+        Return details for many objects: hits come from the local cache and
+        only misses (or stale entries) are fetched, concurrently.
+
+        Results are held in memory, so pass chunks of a few thousand IDs
+        at a time for very large runs.
+
+        Args:
+            object_ids: Iterable of Met object IDs
+            errors: Optional dict that receives {object_id: exception} for failures
+
+        Returns:
+            dict: {object_id: details} for every object fetched successfully
+        """
+        object_ids = [int(i) for i in object_ids]
+        cached = self._lookup(object_ids)
+
+        results = {}
+        to_fetch = []
+        for object_id in object_ids:
+            entry = cached.get(object_id)
+            if entry is not None and self._is_fresh(entry):
+                results[object_id] = json.loads(zlib.decompress(entry[0]))
+            else:
+                to_fetch.append(object_id)
+        self.hits += len(results)
+
+        rows, revalidated = [], []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self._fetch, object_id, cached.get(object_id)): object_id
+                for object_id in to_fetch
+            }
+            for future in as_completed(futures):
+                object_id = futures[future]
+                try:
+                    details, row = future.result()
+                except Exception as e:
+                    if errors is not None:
+                        errors[object_id] = e
+                    continue
+                results[object_id] = details
+                if row is None:
+                    revalidated.append(object_id)
+                else:
+                    rows.append(row)
+
+        self.misses += len(rows)
+        self.revalidated += len(revalidated)
+        self._store(rows, revalidated=revalidated)
+        return results
+
+    def close(self):
+        """Write buffered entries and close the cache database."""
+        with self._lock:
+            self._flush_locked()
+            self._con.close()
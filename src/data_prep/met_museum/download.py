@@ -5,10 +5,11 @@ This script downloads the Met Museum dataset, converts to parquet, and organizes
 """
 
 import kagglehub
-import pandas as pd
 import shutil
 from pathlib import Path
 
+from .convert import csv_to_parquet
+
 
 def download_met_dataset():
     """
@@ -44,22 +45,13 @@ def download_met_dataset():
     for file in kaggle_path_obj.iterdir():
         if file.is_file():
             if file.suffix == '.csv':
-                # Convert CSV to Parquet
+                # Convert CSV to Parquet, streaming in chunks so memory stays
+                # bounded regardless of the file size
                 print(f"Converting {file.name} to parquet...")
-                # Read CSV with low_memory=False to handle mixed types
-                df = pd.read_csv(file, low_memory=False)
-                
-                # Convert all columns to string to avoid type issues, then back to appropriate types
-                # This handles mixed types gracefully
-                for col in df.columns:
-                    if df[col].dtype == 'object':
-                        # Keep as string (will be stored efficiently in parquet)
-                        df[col] = df[col].astype(str).replace('nan', None)
-                
                 parquet_file = target_dir / f"{file.stem}.parquet"
-                df.to_parquet(parquet_file, index=False, engine='pyarrow')
+                rows, columns = csv_to_parquet(file, parquet_file)
                 print(f"✓ Converted: {file.name} -> {parquet_file.name}")
-                print(f"  Rows: {len(df):,}, Columns: {len(df.columns)}")
+                print(f"  Rows: {rows:,}, Columns: {columns}")
                 files_processed += 1
             else:
                 # Copy non-CSV files as-is
@@ -1,139 +1,346 @@
 """
 Estimate the total download size for Met Museum public domain images.
+
+Public domain objects are sampled in proportion to their stratum
+(department by default), image sizes are read with concurrent HEAD
+requests, and bootstrap confidence intervals are reported for the total
+size and the image availability rate. Download time is projected from the
+throughput actually measured while fetching a handful of full images.
+
+Run from src/ with:
+    python -m data_prep.met_museum.estimate_download_size --sample-size 2000 --json estimate.json
 """
 
-import csv
-import requests
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import random
+from urllib.parse import urlparse
+
+import numpy as np
+
+from ..fetch import make_session
+from ..metrics import Metrics
+from ..ratelimit import RateController
+from .api import MET_RATE_LIMITS
+from .catalog import MetCatalog
+from .client import MetClient
+
+
+def stratified_sample(strata, sample_size, rng):
+    """
+    Draw a proportionally allocated sample from each stratum.
+
+    Every non-empty stratum gets at least one draw, so small departments
+    are still represented.
+
+    Args:
+        strata: pd.Series of stratum labels indexed by object ID
+        sample_size: Total number of objects to draw
+        rng: np.random.Generator
+
+    Returns:
+        dict: {stratum: np.ndarray of sampled object IDs}
+    """
+    counts = strata.value_counts()
+    total = counts.sum()
+    sample = {}
+    for stratum, population in counts.items():
+        n = min(population, max(1, round(sample_size * population / total)))
+        ids = strata.index[strata.values == stratum].to_numpy()
+        sample[stratum] = rng.choice(ids, size=n, replace=False)
+    return sample
+
+
+def _head_size(session, url, timeout, metrics):
+    """Return (Content-Length or None, latency in seconds) of a HEAD request."""
+    host = urlparse(url).hostname
+    start = time.monotonic()
+    response = session.head(url, timeout=timeout, allow_redirects=True)
+    latency = time.monotonic() - start
+    metrics.observe("request_seconds", latency, host=host, op="head")
+    metrics.inc("http_responses", host=host, status=response.status_code)
+    if response.status_code == 200 and 'content-length' in response.headers:
+        return int(response.headers['content-length']), latency
+    return None, latency
+
 
+def _download_bytes(session, url, timeout, metrics):
+    """Download a URL, discarding the body, and return the byte count."""
+    host = urlparse(url).hostname
+    size = 0
+    start = time.monotonic()
+    with session.get(url, stream=True, timeout=timeout) as response:
+        metrics.observe("request_seconds", time.monotonic() - start, host=host, op="get")
+        metrics.inc("http_responses", host=host, status=response.status_code)
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            size += len(chunk)
+    metrics.inc("bytes", size, host=host)
+    metrics.inc("network_seconds", time.monotonic() - start)
+    return size
 
-def get_met_object_details(object_id):
-    """Fetch object details from the Met Museum API."""
-    api_url = f"https://collectionapi.metmuseum.org/public/collection/v1/objects/{object_id}"
-    response = requests.get(api_url, timeout=10)
-    response.raise_for_status()
-    return response.json()
+
+def measure_throughput(session, urls, workers, timeout=60, metrics=None):
+    """
+    Fully download `urls` with `workers` parallel streams.
+
+    A failed download (HTTP error, timeout, reset) is counted and left out
+    rather than discarding the measurement.
+
+    Args:
+        session: requests.Session to download with
+        urls: Image URLs
+        workers: Number of parallel streams
+        timeout: Per-request timeout in seconds
+        metrics: Optional Metrics receiving bytes and latencies
+
+    Returns:
+        dict: Bytes and number of successful downloads, failures, seconds
+              and bytes/second over the successful downloads
+    """
+    if not urls:
+        return {"bytes": 0, "downloads": 0, "failed": 0, "seconds": 0.0, "bytes_per_second": None}
+    metrics = metrics or Metrics("throughput", progress_every=None)
+    sizes = []
+    failed = 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_download_bytes, session, url, timeout, metrics): url for url in urls}
+        for future, url in futures.items():
+            try:
+                sizes.append(future.result())
+            except Exception as e:
+                failed += 1
+                metrics.inc("errors", host=urlparse(url).hostname, type=type(e).__name__)
+    seconds = time.monotonic() - start
+    return {"bytes": sum(sizes), "downloads": len(sizes), "failed": failed, "seconds": seconds,
+            "bytes_per_second": sum(sizes) / seconds if sizes else None}
+
+
+def bootstrap_totals(observations, populations, rounds, rng):
+    """
+    Stratified bootstrap of total bytes and image availability.
+
+    Args:
+        observations: {stratum: (has_image array, bytes array)} with bytes 0
+                      for objects without an image
+        populations: {stratum: number of objects in the stratum}
+        rounds: Number of bootstrap replicates
+        rng: np.random.Generator
+
+    Returns:
+        tuple: (total bytes replicates, availability replicates)
+    """
+    total_bytes = np.zeros(rounds)
+    total_images = np.zeros(rounds)
+    for stratum, (has_image, sizes) in observations.items():
+        n = len(sizes)
+        idx = rng.integers(0, n, size=(rounds, n))
+        total_bytes += populations[stratum] * sizes[idx].mean(axis=1)
+        total_images += populations[stratum] * has_image[idx].mean(axis=1)
+    return total_bytes, total_images / sum(populations.values())
 
 
-def estimate_download_size(sample_size=50):
+def estimate_download_size(sample_size=1000, stratify_by='Department', workers=16,
+                           throughput_sample=20, bootstrap_rounds=2000, confidence=0.95,
+                           seed=None, output_json=None, metrics=None):
     """
     Estimate total download size by sampling public domain objects.
-    
+
     Args:
         sample_size: Number of objects to sample for size estimation
+        stratify_by: Catalog column to stratify the sample by
+        workers: Concurrent API / HEAD / download requests
+        throughput_sample: Number of sampled images fully downloaded to
+                           measure throughput
+        bootstrap_rounds: Bootstrap replicates for the confidence intervals
+        confidence: Confidence level of the reported intervals
+        seed: Random seed for reproducible samples
+        output_json: Optional path to write the results as JSON
+        metrics: Optional Metrics for request latencies and throughput; a
+                 snapshot is included in the results either way
+
+    Returns:
+        dict: Estimate summary (also written to `output_json` if given)
     """
-    # Get repo root
-    repo_root = Path(__file__).parent.parent.parent.parent
-    csv_path = repo_root / "data" / "met-museum" / "MetObjects.csv"
-    
+    rng = np.random.default_rng(seed)
+    metrics = metrics or Metrics("estimate", progress_every=None)
+
     print("=" * 60)
     print("Estimating Met Museum Download Size")
     print("=" * 60)
-    
-    # Read all public domain object IDs
-    public_domain_ids = []
-    total_objects = 0
-    
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            total_objects += 1
-            if row['Is Public Domain'] == 'True':
-                public_domain_ids.append(row['Object ID'])
-    
-    print(f"\nTotal objects in CSV: {total_objects:,}")
-    print(f"Public domain objects: {len(public_domain_ids):,}")
-    print(f"Percentage: {len(public_domain_ids)/total_objects*100:.1f}%")
-    
-    # Sample random objects
-    sample_ids = random.sample(public_domain_ids, min(sample_size, len(public_domain_ids)))
-    
-    print(f"\nSampling {len(sample_ids)} random public domain objects...")
+
+    # Read all public domain object IDs with their stratum
+    with MetCatalog() as catalog:
+        total_objects = catalog.count()
+        objects = catalog.select(['Object ID', stratify_by], public_domain=True).to_pandas()
+    strata = objects.set_index('Object ID')[stratify_by].fillna('Unknown')
+    populations = strata.value_counts().to_dict()
+
+    print(f"\nTotal objects in catalog: {total_objects:,}")
+    print(f"Public domain objects: {len(strata):,}")
+    print(f"Percentage: {len(strata)/total_objects*100:.1f}%")
+    print(f"Strata ({stratify_by}): {len(populations)}")
+
+    sample = stratified_sample(strata, sample_size, rng)
+    sample_ids = np.concatenate(list(sample.values())).tolist()
+
+    print(f"\nSampling {len(sample_ids):,} public domain objects with {workers} workers...")
     print("=" * 60)
-    
-    total_size = 0
-    objects_with_images = 0
-    image_sizes = []
-    
-    for i, object_id in enumerate(sample_ids, 1):
-        try:
-            # Fetch details
-            details = get_met_object_details(object_id)
-            
-            if details.get('primaryImage'):
-                image_url = details['primaryImage']
-                
-                # Get image size without downloading full file (HEAD request)
-                response = requests.head(image_url, timeout=10, allow_redirects=True)
-                
-                if response.status_code == 200 and 'content-length' in response.headers:
-                    size = int(response.headers['content-length'])
-                    total_size += size
-                    image_sizes.append(size)
-                    objects_with_images += 1
-                    
-                    print(f"[{i}/{len(sample_ids)}] Object {object_id}: {size/1024/1024:.2f} MB - {details.get('title', 'Untitled')[:50]}")
-            else:
-                print(f"[{i}/{len(sample_ids)}] Object {object_id}: No image")
-                
-        except Exception as e:
-            print(f"[{i}/{len(sample_ids)}] Object {object_id}: Error - {e}")
-            continue
-    
+
+    # Resolve object details (cached) and HEAD every primary image concurrently
+    # Throttled requests are retried rather than dropped from the sample
+    rate_controller = RateController(MET_RATE_LIMITS)
+    session = make_session(pool_maxsize=workers, rate_controller=rate_controller)
+    errors = {}
+    with MetClient(session=session, workers=workers) as client:
+        details = client.get_many(sample_ids, errors=errors)
+
+    image_urls = {oid: d['primaryImage'] for oid, d in details.items() if d.get('primaryImage')}
+
+    head_start = time.monotonic()
+    head_results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {oid: executor.submit(_head_size, session, url, 10, metrics) for oid, url in image_urls.items()}
+        for oid, future in futures.items():
+            try:
+                head_results[oid] = future.result()
+                metrics.inc("items", status="success")
+            except Exception as e:
+                errors[oid] = e
+                metrics.inc("items", status="failed")
+                metrics.inc("errors", host=urlparse(image_urls[oid]).hostname, type=type(e).__name__)
+    head_seconds = time.monotonic() - head_start
+
+    # Per-stratum observations: objects that errored are left out of the sample
+    observations = {}
+    for stratum, ids in sample.items():
+        has_image, sizes = [], []
+        for oid in ids.tolist():
+            if oid in errors or oid not in details:
+                continue
+            size = head_results.get(oid, (None, None))[0] if oid in image_urls else None
+            has_image.append(1.0 if size is not None else 0.0)
+            sizes.append(float(size or 0))
+        if sizes:
+            observations[stratum] = (np.array(has_image), np.array(sizes))
+
+    # Strata with no usable observation borrow the pooled sample
+    if observations:
+        pooled = tuple(np.concatenate([obs[k] for obs in observations.values()]) for k in range(2))
+        for stratum in populations:
+            observations.setdefault(stratum, pooled)
+
+    image_sizes = np.array([size for size, _ in head_results.values() if size is not None])
+    head_latencies = np.array([latency for _, latency in head_results.values()])
+
+    print(f"  Objects resolved: {len(details):,}, errors: {len(errors):,}")
+    print(f"  HEAD requests: {len(head_results):,} in {head_seconds:.1f}s")
+
+    # Measure real throughput on a few full downloads
+    measured_urls = [image_urls[oid] for oid in list(head_results)[:throughput_sample]]
+    print(f"\nMeasuring throughput on {len(measured_urls)} full downloads...")
+    throughput = measure_throughput(session, measured_urls, workers, metrics=metrics)
+    if throughput['failed']:
+        print(f"  {throughput['failed']} of {len(measured_urls)} downloads failed and were left out")
+
     print("\n" + "=" * 60)
     print("ESTIMATION SUMMARY")
     print("=" * 60)
-    
-    if objects_with_images > 0:
-        avg_size = total_size / objects_with_images
-        availability_rate = objects_with_images / len(sample_ids)
-        
+
+    result = {
+        'total_objects': total_objects,
+        'total_public_domain': len(strata),
+        'stratified_by': stratify_by,
+        'objects_sampled': len(sample_ids),
+        'sample_errors': len(errors),
+        'objects_with_images': int(len(image_sizes)),
+        'head_latency_p50_s': float(np.percentile(head_latencies, 50)) if len(head_latencies) else None,
+        'head_latency_p95_s': float(np.percentile(head_latencies, 95)) if len(head_latencies) else None,
+        'throughput': throughput,
+    }
+
+    if len(image_sizes) > 0:
+        point_bytes = sum(populations[s] * obs[1].mean() for s, obs in observations.items())
+        point_images = sum(populations[s] * obs[0].mean() for s, obs in observations.items())
+        availability_rate = point_images / len(strata)
+
+        boot_bytes, boot_availability = bootstrap_totals(observations, populations, bootstrap_rounds, rng)
+        tail = (1 - confidence) / 2 * 100
+        bytes_ci = np.percentile(boot_bytes, [tail, 100 - tail])
+        availability_ci = np.percentile(boot_availability, [tail, 100 - tail])
+
+        gb = 1024 ** 3
         print(f"\nSample Statistics:")
-        print(f"  Objects sampled: {len(sample_ids)}")
-        print(f"  Objects with images: {objects_with_images}")
-        print(f"  Image availability rate: {availability_rate*100:.1f}%")
-        print(f"  Average image size: {avg_size/1024/1024:.2f} MB")
-        print(f"  Median image size: {sorted(image_sizes)[len(image_sizes)//2]/1024/1024:.2f} MB")
-        print(f"  Min image size: {min(image_sizes)/1024/1024:.2f} MB")
-        print(f"  Max image size: {max(image_sizes)/1024/1024:.2f} MB")
-        
-        # Estimate total
-        estimated_images = len(public_domain_ids) * availability_rate
-        estimated_total_size = len(public_domain_ids) * availability_rate * avg_size
-        
-        print(f"\nEstimated Total Download:")
-        print(f"  Estimated images available: {estimated_images:,.0f}")
-        print(f"  Estimated total size: {estimated_total_size/1024/1024/1024:.1f} GB")
-        print(f"  Estimated total size: {estimated_total_size/1024/1024/1024/1024:.2f} TB")
-        
-        # Time estimates
-        print(f"\nEstimated Download Time:")
-        # Assuming 10 MB/s average download speed
-        download_speed_mbps = 10
-        seconds = estimated_total_size / (download_speed_mbps * 1024 * 1024)
-        hours = seconds / 3600
-        days = hours / 24
-        print(f"  At 10 MB/s: {hours:.1f} hours ({days:.1f} days)")
-        
-        # Assuming 50 MB/s fast connection
-        download_speed_mbps = 50
-        seconds = estimated_total_size / (download_speed_mbps * 1024 * 1024)
-        hours = seconds / 3600
-        print(f"  At 50 MB/s: {hours:.1f} hours ({hours/24:.1f} days)")
-        
+        print(f"  Objects sampled: {len(sample_ids):,} (errors: {len(errors):,})")
+        print(f"  Objects with images: {len(image_sizes):,}")
+        print(f"  Image availability rate: {availability_rate*100:.1f}% "
+              f"({availability_ci[0]*100:.1f}-{availability_ci[1]*100:.1f}%)")
+        print(f"  Average image size: {image_sizes.mean()/1024/1024:.2f} MB")
+        print(f"  Median image size: {np.median(image_sizes)/1024/1024:.2f} MB")
+        print(f"  Min image size: {image_sizes.min()/1024/1024:.2f} MB")
+        print(f"  Max image size: {image_sizes.max()/1024/1024:.2f} MB")
+
+        print(f"\nEstimated Total Download ({confidence*100:.0f}% CI):")
+        print(f"  Estimated images available: {point_images:,.0f}")
+        print(f"  Estimated total size: {point_bytes/gb:.1f} GB ({bytes_ci[0]/gb:.1f}-{bytes_ci[1]/gb:.1f} GB)")
+
+        result.update({
+            'availability_rate': float(availability_rate),
+            'availability_rate_ci': [float(x) for x in availability_ci],
+            'estimated_images': float(point_images),
+            'avg_size_mb': float(image_sizes.mean() / 1024 / 1024),
+            'median_size_mb': float(np.median(image_sizes) / 1024 / 1024),
+            'max_size_mb': float(image_sizes.max() / 1024 / 1024),
+            'estimated_total_gb': float(point_bytes / gb),
+            'estimated_total_gb_ci': [float(x / gb) for x in bytes_ci],
+        })
+
+        # Time estimates from the measured aggregate throughput
+        rate = throughput['bytes_per_second']
+        if rate:
+            hours = point_bytes / rate / 3600
+            hours_ci = [float(x / rate / 3600) for x in bytes_ci]
+            print(f"\nEstimated Download Time:")
+            print(f"  Measured throughput: {rate/1024/1024:.1f} MB/s ({workers} parallel streams)")
+            print(f"  At measured rate: {hours:.1f} hours ({hours/24:.1f} days), "
+                  f"CI {hours_ci[0]:.1f}-{hours_ci[1]:.1f} hours")
+            result.update({'estimated_hours': float(hours), 'estimated_hours_ci': hours_ci})
     else:
         print("\nNo images found in sample!")
-    
-    return {
-        'total_public_domain': len(public_domain_ids),
-        'objects_with_images': objects_with_images,
-        'availability_rate': availability_rate if objects_with_images > 0 else 0,
-        'avg_size_mb': avg_size/1024/1024 if objects_with_images > 0 else 0,
-        'estimated_total_gb': estimated_total_size/1024/1024/1024 if objects_with_images > 0 else 0
-    }
+        result.update({'availability_rate': 0, 'avg_size_mb': 0, 'estimated_total_gb': 0})
+
+    result['rate_control'] = rate_controller.summary()
+    result['metrics'] = metrics.snapshot()
+    metrics.export()
+
+    if output_json is not None:
+        Path(output_json).write_text(json.dumps(result, indent=2))
+        print(f"\n✓ Estimate written to: {output_json}")
+
+    return result
 
 
 if __name__ == "__main__":
-    estimate_download_size(sample_size=50)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sample-size', type=int, default=1000)
+    parser.add_argument('--stratify-by', default='Department')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--throughput-sample', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', dest='output_json', default=None)
+    parser.add_argument('--metrics', default=None,
+                        help="Base path (relative to repo root) for .json/.prom metrics exports")
+    args = parser.parse_args()
 
+    estimate_download_size(
+        sample_size=args.sample_size,
+        stratify_by=args.stratify_by,
+        workers=args.workers,
+        throughput_sample=args.throughput_sample,
+        seed=args.seed,
+        output_json=args.output_json,
+        metrics=Metrics("estimate", export_path=args.metrics, progress_every=None),
+    )
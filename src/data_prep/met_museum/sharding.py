@@ -0,0 +1,295 @@
+"""
+Splitting the Met download across several machines.
+
+Two modes, usable together:
+
+- Hash sharding: every object ID maps to one of N shards through a fixed
+  hash (splitmix64), so N nodes given `--shard-index i --num-shards N`
+  download disjoint slices without coordinating. The mapping does not
+  depend on the order or completeness of the ID list.
+- Lease queue: a SQLite file on a shared filesystem holds every object ID.
+  Workers lease small batches, which are renewed by a heartbeat while the
+  worker is alive; leases of a worker that died expire and are picked up
+  by the others, so no object is fetched twice and stragglers don't hold
+  up the run. Workers take their own shard's objects first and then help
+  with the rest.
+
+SQLite is used rather than DuckDB because several processes (on several
+machines) write to the queue at once; its rollback journal works on
+network filesystems that support POSIX locks, where WAL mode does not.
+"""
+
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    item_id TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, shard);
+"""
+
+
+def splitmix64(values, seed=0):
+    """
+    Vectorized splitmix64 hash of integer IDs.
+
+    Args:
+        values: Iterable or array of integers (or numeric strings)
+        seed: Changes every hash while keeping them deterministic
+
+    Returns:
+        np.ndarray: uint64 hashes
+    """
+    x = np.asarray(list(values) if not hasattr(values, '__array__') else values)
+    x = x.astype(np.uint64) + np.uint64((0x9E3779B97F4A7C15 * (seed + 1)) & 0xFFFFFFFFFFFFFFFF)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def shard_of(object_ids, num_shards, seed=0):
+    """
+    Map object IDs to shards with a splitmix64 hash.
+
+    Args:
+        object_ids: Iterable of integer object IDs (ints or numeric strings)
+        num_shards: Number of shards
+        seed: Changes the assignment while keeping it deterministic
+
+    Returns:
+        np.ndarray: Shard index (0 to num_shards - 1) of every ID
+    """
+    return (splitmix64(object_ids, seed) % np.uint64(num_shards)).astype(np.int64)
+
+
+def select_shard(object_ids, shard_index, num_shards, seed=0):
+    """Return the IDs of `object_ids` that belong to shard `shard_index`, in their original order."""
+    object_ids = list(object_ids)
+    if num_shards <= 1 or not object_ids:
+        return object_ids
+    mask = shard_of(object_ids, num_shards, seed) == shard_index
+    return [object_id for object_id, keep in zip(object_ids, mask) if keep]
+
+
+class LeaseQueue:
+    """
+    Work queue of object IDs with expiring leases, shared through a SQLite file.
+
+    Args:
+        db_path: SQLite file, on a filesystem every worker can reach
+        worker_id: Name of this worker (defaults to '<hostname>-<random>')
+        lease_seconds: How long a lease lasts without a heartbeat
+        max_attempts: Items failed this many times are not leased again
+        num_shards: Shard count used to tag items (1 disables shard preference)
+        shard_index: Shard this worker serves first
+    """
+
+    def __init__(self, db_path, worker_id=None, lease_seconds=300, max_attempts=3,
+                 num_shards=1, shard_index=0):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = Path(db_path)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self._con = sqlite3.connect(str(self.db_path), timeout=60, isolation_level=None,
+                                    check_same_thread=False)
+        self._con.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fill(self, object_ids):
+        """
+        Add object IDs to the queue; IDs already present keep their state.
+
+        Every worker may call this with the full list, so no node has to be
+        started first.
+
+        Returns:
+            int: Number of newly added items
+        """
+        object_ids = [str(object_id) for object_id in object_ids]
+        shards = shard_of(object_ids, self.num_shards) if object_ids else []
+        with self._lock:
+            before = self._con.execute("SELECT count(*) FROM items").fetchone()[0]
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                self._con.executemany(
+                    "INSERT OR IGNORE INTO items (item_id, shard) VALUES (?, ?)",
+                    zip(object_ids, map(int, shards)),
+                )
+                self._con.execute("COMMIT")
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+            return self._con.execute("SELECT count(*) FROM items").fetchone()[0] - before
+
+    def lease(self, n=64):
+        """
+        Lease up to `n` items: pending ones, retryable failures and expired leases.
+
+        Items of this worker's shard come first.
+
+        Returns:
+            list: Leased item IDs (empty when nothing is left to lease)
+        """
+        now = time.time()
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                # UPDATE ... RETURNING needs SQLite 3.35+
+                rows = self._con.execute("""
+                    UPDATE items SET status = 'leased', owner = ?, lease_expires = ?,
+                                     attempts = attempts + 1, updated_at = ?
+                    WHERE item_id IN (
+                        SELECT item_id FROM items
+                        WHERE status = 'pending'
+                           OR (status = 'failed' AND attempts < ?)
+                           OR (status = 'leased' AND lease_expires < ?)
+                        ORDER BY shard != ?, item_id
+                        LIMIT ?
+                    )
+                    RETURNING item_id
+                """, [self.worker_id, now + self.lease_seconds, now, self.max_attempts, now,
+                      self.shard_index, n]).fetchall()
+                self._con.execute("COMMIT")
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+        return [row[0] for row in rows]
+
+    def renew(self):
+        """Extend every lease this worker holds; returns the number renewed."""
+        now = time.time()
+        with self._lock:
+            cursor = self._con.execute(
+                "UPDATE items SET lease_expires = ? WHERE owner = ? AND status = 'leased'",
+                [now + self.lease_seconds, self.worker_id],
+            )
+            return cursor.rowcount
+
+    def complete(self, item_id, status='done', error=None):
+        """
+        Record the outcome of a leased item.
+
+        Args:
+            item_id: Object ID
+            status: 'done' (including objects without an image) or 'failed'
+            error: Optional error message for failures
+        """
+        with self._lock:
+            # A late result from a worker whose lease expired still counts, but
+            # never turns an item another worker finished back into a failure
+            self._con.execute(
+                "UPDATE items SET status = ?, owner = ?, error = ?, updated_at = ? "
+                "WHERE item_id = ? AND status != 'done'",
+                [status, self.worker_id, error, time.time(), str(item_id)],
+            )
+
+    def _beat(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            self.renew()
+
+    def start_heartbeat(self):
+        """Renew this worker's leases in the background until close()."""
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._beat, name="lease-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _next_expiry(self):
+        """Earliest lease expiry among items leased by other workers; None if they hold none."""
+        with self._lock:
+            return self._con.execute(
+                "SELECT min(lease_expires) FROM items WHERE status = 'leased' AND owner != ?",
+                [self.worker_id],
+            ).fetchone()[0]
+
+    def held(self):
+        """Number of items this worker has leased and not completed yet."""
+        with self._lock:
+            return self._con.execute(
+                "SELECT count(*) FROM items WHERE status = 'leased' AND owner = ?", [self.worker_id],
+            ).fetchone()[0]
+
+    def remaining(self):
+        """Number of items some worker may still lease or complete."""
+        with self._lock:
+            return self._con.execute(
+                "SELECT count(*) FROM items WHERE status IN ('pending', 'leased') "
+                "OR (status = 'failed' AND attempts < ?)", [self.max_attempts],
+            ).fetchone()[0]
+
+    def items(self, batch_size=64, poll_seconds=None):
+        """
+        Yield leased item IDs until nothing is left to lease, with the heartbeat running.
+
+        Leases are taken one batch at a time as the consumer advances, so a
+        worker never holds much more than it is working on. Once nothing is
+        left to lease, the worker keeps waiting while other workers still
+        hold leases: it sleeps until the earliest of them expires (checking
+        every `poll_seconds`, by default a tenth of the lease time, in case
+        they finish first) and takes over the items of any worker that died.
+
+        It only waits once its own leases are completed, though: while the
+        consumer still works on items of this worker, the generator ends so
+        the consumer can finish them. Call items() again until remaining()
+        is 0 to also pick up what other workers leave behind.
+        """
+        self.start_heartbeat()
+        poll_seconds = poll_seconds or max(1.0, self.lease_seconds / 10)
+        while True:
+            batch = self.lease(batch_size)
+            if batch:
+                yield from batch
+                continue
+            if self.held():
+                return
+            expires = self._next_expiry()
+            if expires is None:
+                return
+            delay = min(max(expires - time.time(), 0.0) + 0.1, poll_seconds)
+            if self._stop.wait(delay):
+                return
+
+    def summary(self):
+        """Count items by status."""
+        with self._lock:
+            return dict(self._con.execute("SELECT status, count(*) FROM items GROUP BY status").fetchall())
+
+    def close(self):
+        """Stop the heartbeat, release unfinished leases and close the connection."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        with self._lock:
+            self._con.execute(
+                "UPDATE items SET status = 'pending', owner = NULL, attempts = attempts - 1 "
+                "WHERE owner = ? AND status = 'leased'",
+                [self.worker_id],
+            )
+            self._con.close()
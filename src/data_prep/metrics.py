@@ -0,0 +1,248 @@
+"""
+Lightweight metrics for the fetch paths.
+
+A Metrics object collects labelled counters and latency histograms from
+any number of threads. A background thread prints one progress line every
+few seconds (instead of a line per item) and periodically exports a
+snapshot as JSON and in the Prometheus text format, so a long run can be
+watched, or scraped via a node-exporter textfile collector, to see whether
+it is bound by the network, the API rate limit or the disk.
+
+Conventions used by the downloaders:
+    items{status}                   one per finished item
+    bytes{host}                     payload bytes received
+    http_responses{host,status}     responses per host and status code
+    errors{host,type}               exceptions per host (timeouts, HTTP errors, ...)
+    request_seconds{host,op}        request latency (histogram)
+    slot_wait_seconds{host}         time spent waiting for a per-host slot
+    network_seconds / disk_seconds  time spent reading the socket vs writing files
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Latency bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are interpolated within buckets."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.sum += other.sum
+
+    def percentile(self, q):
+        """Approximate the q-th quantile (0-1); None when empty."""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= target:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower * 2 or 1.0
+                return lower + (upper - lower) * (target - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Thread-safe counters and histograms with progress display and export.
+
+    Args:
+        name: Run name, used as the metric prefix and in progress lines
+        total: Expected number of items, if known
+        export_path: Base path (relative to repo root) for periodic exports;
+                     '<path>.json' and '<path>.prom' are written
+        progress_every: Seconds between progress lines (None disables them)
+        export_every: Seconds between exports
+    """
+
+    def __init__(self, name, total=None, export_path=None, progress_every=5.0, export_every=30.0):
+        self.name = name
+        self.total = total
+        self.progress_every = progress_every
+        self.export_every = export_every
+        self.export_path = None
+        if export_path is not None:
+            repo_root = Path(__file__).parent.parent.parent
+            self.export_path = repo_root / export_path
+            self.export_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = (self.started, 0, 0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def inc(self, counter, value=1, **labels):
+        """Add `value` to a labelled counter."""
+        key = (counter, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, histogram, value, **labels):
+        """Record one observation (e.g. a latency in seconds)."""
+        key = (histogram, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def time(self, histogram, **labels):
+        """Observe the duration of the `with` block."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(histogram, time.monotonic() - start, **labels)
+
+    def total_of(self, counter, **match):
+        """Sum a counter over all label sets matching `match`."""
+        match = set(_label_key(match))
+        with self._lock:
+            return sum(v for (name, key), v in self.counters.items()
+                       if name == counter and match <= set(key))
+
+    def merged(self, histogram):
+        """A histogram of all label sets of `histogram` combined."""
+        merged = Histogram()
+        with self._lock:
+            for (name, _), hist in self.histograms.items():
+                if name == histogram:
+                    merged.merge(hist)
+        return merged
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serialisable dict."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(key), "value": value}
+                        for (name, key), value in sorted(self.counters.items())]
+            histograms = [{"name": name, "labels": dict(key), "count": h.count, "sum": h.sum,
+                           "p50": h.percentile(0.5), "p95": h.percentile(0.95), "p99": h.percentile(0.99),
+                           "buckets": dict(zip([*map(str, h.buckets), "+Inf"], h.counts))}
+                          for (name, key), h in sorted(self.histograms.items())]
+        return {"name": self.name, "elapsed_seconds": time.monotonic() - self.started,
+                "total": self.total, "counters": counters, "histograms": histograms}
+
+    def prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        prefix = f"leofinder_{self.name}"
+        lines = []
+        with self._lock:
+            for (name, key), value in sorted(self.counters.items()):
+                lines.append(f"{prefix}_{name}_total{_format_labels(key)} {value}")
+            for (name, key), h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, c in zip([*map(str, h.buckets), "+Inf"], h.counts):
+                    cumulative += c
+                    lines.append(f"{prefix}_{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{prefix}_{name}_sum{_format_labels(key)} {h.sum}")
+                lines.append(f"{prefix}_{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Write the JSON and Prometheus files atomically."""
+        if self.export_path is None:
+            return
+        for suffix, text in ((".json", json.dumps(self.snapshot(), indent=2)), (".prom", self.prometheus())):
+            path = self.export_path.with_name(self.export_path.name + suffix)
+            tmp_path = path.with_name(f".{path.name}.part")
+            tmp_path.write_text(text)
+            os.replace(tmp_path, path)
+
+    def progress_line(self):
+        """One-line summary: items, rates, latency percentiles and where time goes."""
+        now = time.monotonic()
+        items = self.total_of("items")
+        received = self.total_of("bytes")
+        last_time, last_items, last_bytes = self._last
+        window = max(now - last_time, 1e-9)
+        self._last = (now, items, received)
+
+        done = f"{items:,}/{self.total:,}" if self.total else f"{items:,}"
+        parts = [f"[{self.name}] {done}",
+                 f"{(items - last_items) / window:.1f} items/s",
+                 f"{(received - last_bytes) / window / 1024**2:.1f} MB/s"]
+        failed = self.total_of("items", status="failed")
+        if failed:
+            parts.append(f"failed {failed:,}")
+        latency = self.merged("request_seconds")
+        if latency.count:
+            parts.append(f"latency p50 {latency.percentile(0.5):.2f}s p95 {latency.percentile(0.95):.2f}s")
+        waited = self.merged("slot_wait_seconds")
+        if waited.count:
+            parts.append(f"slot wait p95 {waited.percentile(0.95):.2f}s")
+        network, disk = self.total_of("network_seconds"), self.total_of("disk_seconds")
+        if network + disk:
+            parts.append(f"disk {disk / (network + disk) * 100:.0f}% of transfer time")
+        return ", ".join(parts)
+
+    def _run(self):
+        last_export = time.monotonic()
+        interval = min(x for x in (self.progress_every, self.export_every) if x)
+        while not self._stop.wait(interval):
+            if self.progress_every:
+                print(self.progress_line())
+            if self.export_path is not None and time.monotonic() - last_export >= self.export_every:
+                self.export()
+                last_export = time.monotonic()
+
+    def start(self):
+        """Start the background progress/export thread."""
+        if self._thread is None and (self.progress_every or self.export_path is not None):
+            self._thread = threading.Thread(target=self._run, name=f"metrics-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the background thread, print a final progress line and export."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            if self.progress_every:
+                print(self.progress_line())
+        self.export()
@@ -0,0 +1,450 @@
+"""
+Streaming end-to-end data pipeline.
+
+Runs scrape -> fetch and catalog -> fetch, both feeding preprocess and
+pack, as a producer/consumer graph. Every stage has its own worker threads
+and a bounded inbox, so da Vinci downloads start as soon as the first
+listing page is parsed, preprocessing starts with the first finished
+download, and a slow stage applies back-pressure instead of buffering the
+whole corpus in memory. Once everything else is done, the 'details' step
+merges the da Vinci detail pages into the manifest.
+
+Source stages record a fingerprint of their inputs in data/.stamps/ and
+are skipped when it is unchanged; downstream stages only see new work,
+so they finish immediately when there is none.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .da_vinci.downloader import download_entry, new_manifest_entry, save_manifest
+from .da_vinci.scraper import BASE_URL, FIRST_PAGE, PAGE_LINK, PAGE_TEMPLATE, iter_listing_pages
+from .fetch import hash_file, make_session
+from .manifest_writer import ManifestWriter, read_manifest
+from .state import DownloadState
+
+
+STAGES = ('scrape', 'catalog', 'fetch', 'preprocess', 'pack', 'details')
+
+_DONE = object()
+
+
+class Stamps:
+    """
+    Input fingerprints of completed stages, one JSON file per stage.
+
+    Args:
+        root: Stamp directory (relative to repo root)
+    """
+
+    def __init__(self, root='data/.stamps'):
+        repo_root = Path(__file__).parent.parent.parent
+        self.root = repo_root / root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(*parts):
+        """Hash any JSON-serialisable description of a stage's inputs."""
+        return hashlib.sha256(json.dumps(parts, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def unchanged(self, stage, fingerprint):
+        """True if `stage` last completed with the same input fingerprint."""
+        path = self.root / f"{stage}.json"
+        return path.exists() and json.loads(path.read_text()).get("fingerprint") == fingerprint
+
+    def mark(self, stage, fingerprint):
+        """Record that `stage` completed for these inputs."""
+        path = self.root / f"{stage}.json"
+        tmp_path = path.with_name(f".{path.name}.part")
+        tmp_path.write_text(json.dumps({
+            "fingerprint": fingerprint,
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        }))
+        os.replace(tmp_path, path)
+
+
+class Stage:
+    """
+    One pipeline stage: `workers` threads each running `run(items, emit)`.
+
+    `items` iterates over the stage's bounded inbox (None for source
+    stages) and `emit` hands a result to every downstream inbox, blocking
+    while one of them is full.
+    """
+
+    def __init__(self, name, run, workers=1, queue_size=256):
+        self.name = name
+        self.run = run
+        self.workers = workers
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.downstream = []
+        self.upstream = 0
+        self.received = 0
+        self.emitted = 0
+        self.error = None
+        self._running = workers
+        self._lock = threading.Lock()
+
+    def items(self):
+        """Yield inbox items until every upstream stage has finished."""
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                return
+            with self._lock:
+                self.received += 1
+            yield item
+
+    def emit(self, item):
+        with self._lock:
+            self.emitted += 1
+        for stage in self.downstream:
+            stage.inbox.put(item)
+
+    def upstream_finished(self):
+        with self._lock:
+            self.upstream -= 1
+            last = self.upstream == 0
+        if last:
+            for _ in range(self.workers):
+                self.inbox.put(_DONE)
+
+    def worker_finished(self):
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last:
+            for stage in self.downstream:
+                stage.upstream_finished()
+
+
+class Pipeline:
+    """A graph of stages connected by bounded queues."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, run, workers=1, queue_size=256, after=()):
+        """
+        Add a stage.
+
+        Args:
+            name: Stage name
+            run: Callable(items, emit); items is None for source stages
+            workers: Number of threads running `run`
+            queue_size: Capacity of the stage's inbox
+            after: Names of the stages feeding this one
+        """
+        stage = Stage(name, run, workers, queue_size)
+        for upstream in after:
+            self.stages[upstream].downstream.append(stage)
+            stage.upstream += 1
+        self.stages[name] = stage
+        return stage
+
+    def _work(self, stage):
+        try:
+            stage.run(stage.items() if stage.upstream else None, stage.emit)
+        except Exception as e:
+            stage.error = e
+            print(f"✗ Stage '{stage.name}' failed: {e}")
+            if stage.upstream:
+                # Keep consuming so upstream stages are not blocked forever
+                for _ in stage.items():
+                    pass
+        finally:
+            stage.worker_finished()
+
+    def run(self):
+        """
+        Run every stage to completion.
+
+        Returns:
+            dict: Stage name -> error raised by the stage (None if it succeeded)
+        """
+        start = time.monotonic()
+        threads = [
+            threading.Thread(target=self._work, args=(stage,), name=f"{stage.name}-{i}", daemon=True)
+            for stage in self.stages.values() for i in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        print("\n" + "=" * 60)
+        print(f"✓ Pipeline finished in {(time.monotonic() - start)/60:.1f} minutes")
+        for stage in self.stages.values():
+            status = "failed" if stage.error else "ok"
+            print(f"  {stage.name:<14} in: {stage.received:>8,}  out: {stage.emitted:>8,}  ({status})")
+        return {name: stage.error for name, stage in self.stages.items()}
+
+
+def _scrape(stamps, session, workers, force, marks, listing):
+    """
+    Source stage: emit da Vinci listing entries, or only unfinished ones if the listing is unchanged.
+
+    Scraped entries are also appended to `listing`, for crawling their detail pages later.
+    """
+    repo_root = Path(__file__).parent.parent.parent
+    manifest_path = repo_root / "data" / "da-vinci-works" / "manifest.parquet"
+
+    def run(_, emit):
+        # New works can land on any page; they push later works onward, so the
+        # page count and the last page change along with the first page
+        response = session.get(BASE_URL + FIRST_PAGE, timeout=10)
+        response.raise_for_status()
+        page_count = max((int(n) for n in PAGE_LINK.findall(response.text)), default=1)
+        parts = [hashlib.sha256(response.content).hexdigest(), page_count]
+        if page_count > 1:
+            last_page = session.get(BASE_URL + PAGE_TEMPLATE.format(page_count), timeout=10)
+            last_page.raise_for_status()
+            parts.append(hashlib.sha256(last_page.content).hexdigest())
+        fingerprint = Stamps.fingerprint(*parts)
+
+        manifest = read_manifest(manifest_path, columns=['original_title', 'url', 'status'])
+        if not force and manifest is not None and stamps.unchanged('scrape', fingerprint):
+            retry = manifest[manifest['status'] != 'success']
+            print(f"scrape: listing unchanged, retrying {len(retry)} unfinished entries")
+            for row in retry.to_dict('records'):
+                emit({"title": row['original_title'], "url": row['url']})
+            return
+
+        # Titles are numbered in arrival order when the same title has a different image
+        seen = {}
+        for _, entries in iter_listing_pages(session=session, workers=workers):
+            listing.extend(entries)
+            for entry in entries:
+                title, url = entry["title"], entry["image_url"]
+                if seen.get(title, url) != url:
+                    n = 2
+                    while f"{title} ({n})" in seen:
+                        n += 1
+                    title = f"{title} ({n})"
+                if title in seen:
+                    continue
+                seen[title] = url
+                emit({"title": title, "url": url})
+        marks['scrape'] = fingerprint
+
+    return run
+
+
+def _catalog(stamps, force, marks, met_limit=None):
+    """Source stage: register public domain Met objects and emit the pending ones."""
+    from .met_museum import download_met_dataset
+    from .met_museum.bulk_download import load_public_domain_objects
+
+    repo_root = Path(__file__).parent.parent.parent
+    parquet_path = repo_root / "data" / "met-museum" / "MetObjects.parquet"
+
+    def run(_, emit):
+        if not parquet_path.exists():
+            download_met_dataset()
+        stat = parquet_path.stat()
+        fingerprint = Stamps.fingerprint(stat.st_size, stat.st_mtime_ns)
+
+        with DownloadState() as state:
+            if force or not stamps.unchanged('catalog', fingerprint):
+                objects = load_public_domain_objects(parquet_path)
+                new = state.register("met", objects['Object ID'], departments=objects['Department'])
+                print(f"catalog: registered {new:,} new public domain objects")
+            else:
+                print("catalog: MetObjects.parquet unchanged, skipping registration")
+            pending = state.pending("met")
+        print(f"catalog: {len(pending):,} objects pending")
+        for object_id in itertools.islice(pending, met_limit):
+            emit(object_id)
+        marks['catalog'] = fingerprint
+
+    return run
+
+
+def _fetch_da_vinci(session, manifest, manifest_lock, writer, timeout):
+    """Fetch stage for da Vinci entries; emits newly downloaded images and appends their manifest rows."""
+    repo_root = Path(__file__).parent.parent.parent
+    data_dir = repo_root / "data" / "da-vinci-works"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    # IDs of new titles continue after the highest existing one; the manifest
+    # may have gaps, so its length could hand out an ID that is already taken
+    new_ids = itertools.count(max((entry["id"] for entry in manifest.values()), default=0) + 1)
+
+    def run(items, emit):
+        for item in items:
+            with manifest_lock:
+                entry = manifest.get(item["title"])
+                # A file on disk only counts for an entry that finished with this URL;
+                # after a URL change it holds the old image and is downloaded again
+                trusted = entry is None or (entry["url"] == item["url"] and entry["status"] == "success")
+                if entry is None or entry["url"] != item["url"]:
+                    entry_id = entry["id"] if entry else next(new_ids)
+                    entry = manifest[item["title"]] = new_manifest_entry(entry_id, item["title"], item["url"])
+            filepath = data_dir / entry["filename"]
+            if trusted and filepath.exists():
+                if not entry.get("sha256"):
+                    entry["sha256"] = hash_file(filepath)[1]
+                entry["status"] = "success"
+                writer.write(entry)
+                continue
+            download_entry(session, entry, filepath, timeout)
+            writer.write(entry)
+            if entry["status"] == "success":
+                emit({"source": "da_vinci", "key": filepath.stem, "path": filepath, "metadata": entry})
+            else:
+                print(f"fetch: failed {item['title']}: {entry['error']}")
+
+    return run
+
+
+def _fetch_met(timeout):
+    """Fetch stage for Met objects; emits newly downloaded images."""
+    from .met_museum.bulk_download import download_met_images
+
+    repo_root = Path(__file__).parent.parent.parent
+    data_dir = repo_root / "data" / "met-museum" / "images"
+
+    def run(items, emit):
+        def on_result(result):
+            if result["status"] == "success":
+                emit({"source": "met", "key": str(result["object_id"]),
+                      "path": data_dir / result["filename"], "metadata": result})
+
+        with DownloadState() as state:
+            download_met_images(items, state=state, on_result=on_result, timeout=timeout)
+
+    return run
+
+
+def _preprocess(processes):
+    """Preprocess stage: resize new originals into the derivative cache."""
+    from .preprocess import preprocess_images
+
+    def run(items, emit):
+        first = next(items, None)
+        if first is None:
+            print("preprocess: no new images, skipping")
+            return
+        originals = ((i["source"], i["key"], i["path"]) for i in itertools.chain([first], items))
+        preprocess_images(originals=originals, workers=processes, keep_unseen=True)
+
+    return run
+
+
+def _pack():
+    """Pack stage: append new originals to the per-source tar shards."""
+    from .shards import ShardReader, ShardWriter
+
+    repo_root = Path(__file__).parent.parent.parent
+    shard_root = repo_root / "data" / "shards"
+    prefixes = {"da_vinci": "da-vinci", "met": "met"}
+
+    def run(items, emit):
+        writers = {}
+        packed = {}
+        try:
+            for item in items:
+                prefix = prefixes[item["source"]]
+                if prefix not in writers:
+                    shard_dir = shard_root / prefix
+                    packed[prefix] = set(ShardReader(shard_dir, prefix).keys()) if shard_dir.exists() else set()
+                    writers[prefix] = ShardWriter(shard_dir, prefix=prefix)
+                if item["key"] in packed[prefix]:
+                    continue
+                writers[prefix].write_file(item["key"], item["path"], metadata=item["metadata"])
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    return run
+
+
+def run_pipeline(stages=STAGES, da_vinci=True, met=True, scrape_workers=4, fetch_workers=8,
+                 preprocess_workers=None, queue_size=256, met_limit=None, force=False, timeout=30):
+    """
+    Run the data pipeline as overlapping stages.
+
+    Args:
+        stages: Stages to run; fetched images only flow into 'preprocess'
+                and 'pack' when those are included. 'details' runs once the
+                others are done and merges da Vinci detail pages into the
+                manifest
+        da_vinci: Include the da Vinci source
+        met: Include the Met source
+        scrape_workers: Listing pages fetched in parallel
+        fetch_workers: Parallel da Vinci downloads (Met downloads use the
+                       bulk downloader's per-host limits)
+        preprocess_workers: Resizing processes (defaults to all cores)
+        queue_size: Capacity of each stage's inbox
+        met_limit: Only fetch the first N pending Met objects (for trial runs)
+        force: Ignore stamps and re-run every source stage in full
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        dict: Stage name -> error raised by the stage (None if it succeeded)
+    """
+    stages = set(stages)
+    stamps = Stamps()
+    marks = {}
+    session = make_session(pool_maxsize=max(scrape_workers, fetch_workers))
+    pipeline = Pipeline()
+    fetchers = []
+
+    manifest = {}
+    manifest_lock = threading.Lock()
+    listing = []
+    repo_root = Path(__file__).parent.parent.parent
+    manifest_path = repo_root / "data" / "da-vinci-works" / "manifest.parquet"
+    # Includes rows an interrupted run appended but never compacted
+    previous = read_manifest(manifest_path)
+    if previous is not None:
+        manifest = {row['original_title']: row for row in previous.to_dict('records')}
+    writer = ManifestWriter(os.path.relpath(manifest_path, repo_root))
+
+    if da_vinci and 'scrape' in stages:
+        pipeline.add('scrape', _scrape(stamps, session, scrape_workers, force, marks, listing))
+        if 'fetch' in stages:
+            pipeline.add('fetch_da_vinci', _fetch_da_vinci(session, manifest, manifest_lock, writer, timeout),
+                         workers=fetch_workers, queue_size=queue_size, after=['scrape'])
+            fetchers.append('fetch_da_vinci')
+    if met and 'catalog' in stages:
+        pipeline.add('catalog', _catalog(stamps, force, marks, met_limit))
+        if 'fetch' in stages:
+            pipeline.add('fetch_met', _fetch_met(timeout), queue_size=queue_size, after=['catalog'])
+            fetchers.append('fetch_met')
+    if fetchers and 'preprocess' in stages:
+        pipeline.add('preprocess', _preprocess(preprocess_workers), queue_size=queue_size, after=fetchers)
+    if fetchers and 'pack' in stages:
+        pipeline.add('pack', _pack(), queue_size=queue_size, after=fetchers)
+
+    print("=" * 60)
+    print(f"Running pipeline: {' -> '.join(pipeline.stages)}")
+    print("=" * 60)
+    errors = pipeline.run()
+
+    writer.close()
+    if 'fetch_da_vinci' in pipeline.stages and manifest:
+        save_manifest(sorted(manifest.values(), key=lambda entry: entry['id']))
+    if da_vinci and 'details' in stages and not errors.get('fetch_da_vinci'):
+        from .da_vinci.details import crawl_details, update_manifest
+
+        try:
+            # Without a fresh listing (unchanged or not scraped) the crawler scrapes it itself
+            details, changed = crawl_details(entries=listing or None, workers=fetch_workers, timeout=timeout)
+            update_manifest(details, changed)
+            errors['details'] = None
+        except Exception as e:
+            print(f"✗ Stage 'details' failed: {e}")
+            errors['details'] = e
+
+    # Only stamp sources once their images were fetched and every stage succeeded
+    if 'fetch' in stages and not any(errors.values()):
+        for stage, fingerprint in marks.items():
+            stamps.mark(stage, fingerprint)
+    return errors
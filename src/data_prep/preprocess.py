@@ -0,0 +1,213 @@
+"""
+Multiprocess image preprocessing into a resized-derivative cache.
+
+Originals from the da Vinci manifest and the Met catalog are decoded,
+EXIF-oriented, converted to RGB and resized to each configured resolution
+(longest side) in a process pool. Derivatives are keyed by the SHA-256 of
+the original bytes, and an index of (size, mtime) per original means only
+new or changed files are re-read on later runs.
+
+Run from src/ with: python -m data_prep.preprocess
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+from PIL import Image, ImageOps
+
+from .fetch import hash_file
+from .manifest_writer import read_manifest
+
+
+DEFAULT_RESOLUTIONS = (224, 512)
+
+INDEX_COLUMNS = ['source', 'key', 'path', 'bytes', 'mtime_ns', 'sha256', 'width', 'height']
+
+# Met originals can exceed Pillow's default decompression-bomb limit
+Image.MAX_IMAGE_PIXELS = 400_000_000
+
+
+def derivative_path(output_root, resolution, sha256):
+    """Return the cache path of one derivative."""
+    return Path(output_root) / str(resolution) / sha256[:2] / f"{sha256}.jpg"
+
+
+def _process_one(path, sha256, resolutions, output_root, quality):
+    """
+    Hash (if needed) and resize one original. Runs in a worker process.
+
+    Returns:
+        tuple: (sha256, original width, original height)
+    """
+    if sha256 is None:
+        sha256 = hash_file(path)[1]
+
+    targets = [(r, derivative_path(output_root, r, sha256)) for r in sorted(resolutions, reverse=True)]
+    missing = [(r, p) for r, p in targets if not p.exists()]
+
+    with Image.open(path) as img:
+        # Original size as displayed, i.e. after applying EXIF orientation
+        width, height = img.size
+        if img.getexif().get(0x0112) in (5, 6, 7, 8):
+            width, height = height, width
+        if not missing:
+            return sha256, width, height
+        # Let the JPEG decoder skip detail we're about to throw away
+        img.draft('RGB', (missing[0][0], missing[0][0]))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+
+        # Resize largest first and derive smaller sizes from the previous result
+        for resolution, out_path in missing:
+            img.thumbnail((resolution, resolution), Image.LANCZOS)
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.part")
+            img.save(tmp_path, 'JPEG', quality=quality)
+            os.replace(tmp_path, out_path)
+
+    return sha256, width, height
+
+
+def iter_originals(repo_root=None):
+    """
+    Yield (source, key, path) for every downloaded original.
+
+    da Vinci images come from successful rows of manifest.parquet; Met
+    images from public domain catalog objects that have a file in
+    data/met-museum/images.
+    """
+    from .met_museum.catalog import MetCatalog
+
+    repo_root = Path(repo_root) if repo_root else Path(__file__).parent.parent.parent
+
+    dv_dir = repo_root / "data" / "da-vinci-works"
+    dv_manifest_path = dv_dir / "manifest.parquet"
+    manifest = read_manifest(dv_manifest_path)
+    if manifest is not None:
+        done = manifest[manifest['status'] == 'success']
+        # Images kept in the content store live at 'object', not under their filename
+        objects = done['object'] if 'object' in done.columns else [None] * len(done)
+        for filename, stored in zip(done['filename'], objects):
+            yield 'da_vinci', Path(filename).stem, dv_dir / (stored if isinstance(stored, str) else filename)
+
+    met_dir = repo_root / "data" / "met-museum" / "images"
+    met_catalog_path = repo_root / "data" / "met-museum" / "MetObjects.parquet"
+    if met_dir.exists() and met_catalog_path.exists():
+        # One directory listing instead of a stat per catalog object
+        files = {Path(entry.name).stem: entry.name for entry in os.scandir(met_dir) if entry.is_file()}
+        with MetCatalog(met_catalog_path) as catalog:
+            object_ids = catalog.object_ids(public_domain=True)
+        for object_id in object_ids.tolist():
+            name = files.get(str(object_id))
+            if name is not None:
+                yield 'met', str(object_id), met_dir / name
+
+
+def preprocess_images(originals=None, resolutions=DEFAULT_RESOLUTIONS, output_dir='data/derivatives',
+                      workers=None, quality=90, keep_unseen=False):
+    """
+    Resize all originals into the derivative cache, skipping unchanged ones.
+
+    Args:
+        originals: Iterable of (source, key, path); defaults to iter_originals()
+        resolutions: Longest-side sizes to produce
+        output_dir: Derivative cache root (relative to repo root)
+        workers: Number of worker processes (defaults to all cores)
+        quality: JPEG quality of the derivatives
+        keep_unseen: Keep index rows of earlier originals that are not in
+                     `originals` (and still exist), for incremental runs
+                     that only pass new files
+
+    Returns:
+        pd.DataFrame: Index of originals with their content hash and size
+    """
+    repo_root = Path(__file__).parent.parent.parent
+    output_root = repo_root / output_dir
+    output_root.mkdir(parents=True, exist_ok=True)
+    index_path = output_root / "index.parquet"
+
+    previous = {}
+    if index_path.exists():
+        for row in pd.read_parquet(index_path).to_dict('records'):
+            previous[row['path']] = row
+
+    originals = iter_originals(repo_root) if originals is None else originals
+    workers = workers or os.cpu_count() or 1
+
+    print("=" * 60)
+    print(f"Preprocessing images to {resolutions} with {workers} processes")
+    print(f"Cache: {output_root}")
+    print("=" * 60)
+
+    rows = []
+    counts = {"cached": 0, "processed": 0, "failed": 0, "missing": 0}
+    start = time.monotonic()
+    pending = {}
+
+    def drain():
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            row = pending.pop(future)
+            try:
+                row['sha256'], row['width'], row['height'] = future.result()
+                rows.append(row)
+                counts["processed"] += 1
+            except Exception as e:
+                print(f"  Failed: {row['path']}: {e}")
+                counts["failed"] += 1
+                continue
+            if counts["processed"] % 1000 == 0:
+                rate = counts["processed"] / (time.monotonic() - start)
+                print(f"[{counts['processed']:,}] processed ({rate:.1f} images/s)")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for source, key, path in originals:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Listed in a manifest but deleted or moved since
+                counts["missing"] += 1
+                continue
+            row = {"source": source, "key": key, "path": str(path),
+                   "bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            old = previous.get(str(path))
+            unchanged = old is not None and old['bytes'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns
+            if unchanged and all(derivative_path(output_root, r, old['sha256']).exists() for r in resolutions):
+                row.update(sha256=old['sha256'], width=old['width'], height=old['height'])
+                rows.append(row)
+                counts["cached"] += 1
+                continue
+
+            sha256 = old['sha256'] if unchanged else None
+            future = executor.submit(_process_one, str(path), sha256, tuple(resolutions), output_root, quality)
+            pending[future] = row
+            if len(pending) >= workers * 4:
+                drain()
+        while pending:
+            drain()
+
+    if keep_unseen:
+        seen = {row['path'] for row in rows}
+        rows.extend(old for path, old in previous.items() if path not in seen and os.path.exists(path))
+
+    index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+    tmp_path = index_path.with_name(".index.parquet.part")
+    index.to_parquet(tmp_path, index=False, engine='pyarrow')
+    os.replace(tmp_path, index_path)
+
+    print("\n" + "=" * 60)
+    print(f"✓ Preprocessing complete in {(time.monotonic() - start)/60:.1f} minutes")
+    print(f"  Processed: {counts['processed']:,}")
+    print(f"  Unchanged (cached): {counts['cached']:,}")
+    print(f"  Failed: {counts['failed']:,}")
+    if counts['missing']:
+        print(f"  Missing originals skipped: {counts['missing']:,}")
+    print(f"  Index: {index_path}")
+
+    return index
+
+
+if __name__ == "__main__":
+    preprocess_images()
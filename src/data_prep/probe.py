@@ -0,0 +1,318 @@
+"""
+Header-only image inventory.
+
+Reads just the first bytes of every downloaded original, enough to find
+the JPEG frame header (SOF), the PNG IHDR chunk or the GIF screen
+descriptor, and the EXIF orientation, without decoding any pixels. The
+results (format, colour mode, size as displayed, bytes, mtime) are
+written to data/probe.parquet. Files whose size and mtime are unchanged
+keep their previous row, so re-running after a download only touches
+the new files.
+
+open_inventory() exposes the index next to the da Vinci manifest and the
+Met catalog as DuckDB views, so filtering by resolution or aspect ratio is
+a query:
+
+    with open_inventory() as con:
+        con.execute("SELECT key FROM probe WHERE source = 'met' AND least(width, height) >= 1024").df()
+
+Run from src/ with: python -m data_prep.probe
+"""
+
+import argparse
+import os
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .manifest_writer import read_manifest
+
+
+PROBE_SCHEMA = pa.schema([
+    ("source", pa.string()),
+    ("key", pa.string()),
+    ("path", pa.string()),
+    ("bytes", pa.int64()),
+    ("mtime_ns", pa.int64()),
+    ("format", pa.string()),
+    ("mode", pa.string()),
+    ("bits", pa.int16()),
+    ("width", pa.int32()),     # as displayed, i.e. after EXIF orientation
+    ("height", pa.int32()),
+    ("orientation", pa.int16()),
+    ("error", pa.string()),
+])
+
+# Start-of-frame markers carrying the image size (all but DHT, JPG and DAC)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+PNG_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+
+EXIF_ORIENTATION = 0x0112
+
+
+def _exif_orientation(tiff):
+    """Orientation tag (1-8) of IFD0 in a TIFF-structured EXIF block; 1 if absent or malformed."""
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return 1
+    try:
+        offset = struct.unpack_from(endian + 'I', tiff, 4)[0]
+        count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+        for i in range(count):
+            tag, _, _ = struct.unpack_from(endian + 'HHI', tiff, offset + 2 + 12 * i)
+            if tag == EXIF_ORIENTATION:
+                value = struct.unpack_from(endian + 'H', tiff, offset + 10 + 12 * i)[0]
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        pass
+    return 1
+
+
+def _probe_jpeg(f):
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("no frame header before end of file")
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            raise ValueError("no frame header before end of file")
+        marker = marker[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue  # markers without a length field
+        if marker in (0xD9, 0xDA):
+            raise ValueError("no frame header before image data")
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker == 0xE1:
+            data = f.read(length - 2)
+            if data.startswith(b'Exif\x00\x00'):
+                orientation = _exif_orientation(data[6:])
+        elif marker in SOF_MARKERS:
+            bits, height, width, components = struct.unpack('>BHHB', f.read(6))
+            return {"format": "JPEG", "mode": JPEG_MODES.get(components, f"{components}ch"),
+                    "bits": bits, "width": width, "height": height, "orientation": orientation}
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _probe_png(f):
+    length, chunk_type = struct.unpack('>I4s', f.read(8))
+    if chunk_type != b'IHDR' or length < 13:
+        raise ValueError("PNG without leading IHDR chunk")
+    width, height, bits, color_type = struct.unpack('>IIBB', f.read(10))
+    return {"format": "PNG", "mode": PNG_MODES.get(color_type, str(color_type)),
+            "bits": bits, "width": width, "height": height, "orientation": 1}
+
+
+def _probe_gif(f):
+    width, height, flags = struct.unpack('<HHB', f.read(5))
+    return {"format": "GIF", "mode": "P", "bits": (flags & 0x07) + 1,
+            "width": width, "height": height, "orientation": 1}
+
+
+def _probe_pillow(path):
+    """Fallback for other formats; Image.open parses the header without decoding pixels."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        width, height = img.size
+        return {"format": img.format, "mode": img.mode, "bits": None,
+                "width": width, "height": height, "orientation": orientation}
+
+
+def probe_image(path):
+    """
+    Read format, colour mode, bit depth, size and EXIF orientation from an image header.
+
+    Width and height are as displayed: swapped for EXIF orientations 5-8.
+
+    Returns:
+        dict: format, mode, bits, width, height, orientation
+    """
+    with open(path, 'rb') as f:
+        signature = f.read(8)
+        if signature[:2] == b'\xff\xd8':
+            f.seek(2)
+            info = _probe_jpeg(f)
+        elif signature == b'\x89PNG\r\n\x1a\n':
+            info = _probe_png(f)
+        elif signature[:6] in (b'GIF87a', b'GIF89a'):
+            f.seek(6)
+            info = _probe_gif(f)
+        else:
+            info = None
+    if info is None:
+        info = _probe_pillow(path)
+    if info["orientation"] in (5, 6, 7, 8):
+        info["width"], info["height"] = info["height"], info["width"]
+    return info
+
+
+def _probe_row(row):
+    try:
+        row.update(probe_image(row["path"]))
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def build_probe_index(originals=None, output_path='data/probe.parquet', workers=16):
+    """
+    Probe every original's header, re-reading only new or changed files.
+
+    Args:
+        originals: Iterable of (source, key, path); defaults to
+                   preprocess.iter_originals()
+        output_path: Index file (relative to repo root)
+        workers: Threads reading headers (the work is I/O bound)
+
+    Returns:
+        pd.DataFrame: The index, one row per original
+    """
+    repo_root = Path(__file__).parent.parent.parent
+    output_path = repo_root / output_path
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    previous = {}
+    if output_path.exists():
+        for row in pd.read_parquet(output_path).to_dict('records'):
+            previous[row['path']] = row
+
+    if originals is None:
+        from .preprocess import iter_originals
+        originals = iter_originals(repo_root)
+
+    print("=" * 60)
+    print(f"Probing image headers with {workers} threads")
+    print("=" * 60)
+
+    rows = []
+    counts = {"unchanged": 0, "probed": 0, "failed": 0}
+    start = time.monotonic()
+    pending = set()
+
+    def drain():
+        nonlocal pending
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            row = future.result()
+            rows.append(row)
+            counts["failed" if row.get("error") else "probed"] += 1
+            if (counts["probed"] + counts["failed"]) % 10000 == 0:
+                rate = (counts["probed"] + counts["failed"]) / (time.monotonic() - start)
+                print(f"[{counts['probed'] + counts['failed']:,}] probed ({rate:.0f} files/s)")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for source, key, path in originals:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            row = {"source": source, "key": str(key), "path": str(path),
+                   "bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            old = previous.get(str(path))
+            if old is not None and old['bytes'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns:
+                rows.append({**old, "source": source, "key": str(key)})
+                counts["unchanged"] += 1
+                continue
+            pending.add(executor.submit(_probe_row, row))
+            if len(pending) >= workers * 8:
+                drain()
+        while pending:
+            drain()
+
+    index = pd.DataFrame(rows, columns=PROBE_SCHEMA.names)
+    table = pa.Table.from_pandas(index, schema=PROBE_SCHEMA, preserve_index=False)
+    tmp_path = output_path.with_name(f".{output_path.name}.part")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, output_path)
+
+    elapsed = time.monotonic() - start
+    print("\n" + "=" * 60)
+    print(f"✓ Probed {counts['probed']:,} files in {elapsed:.1f}s "
+          f"({counts['unchanged']:,} unchanged, {counts['failed']:,} unreadable)")
+    print(f"  Index: {output_path}")
+    return index
+
+
+def open_inventory(repo_root=None):
+    """
+    DuckDB connection with the probe index joined to the manifests.
+
+    Views:
+        probe       data/probe.parquet
+        da_vinci    da Vinci manifest (including uncompacted parts) with 'key'
+                    matching probe.key
+        met         Met catalog, when MetObjects.parquet exists
+        inventory   probe rows with title and department from both sources
+
+    Returns:
+        duckdb.DuckDBPyConnection: In-memory connection; close it when done
+    """
+    repo_root = Path(repo_root) if repo_root else Path(__file__).parent.parent.parent
+    con = duckdb.connect()
+    probe_path = str(repo_root / "data" / "probe.parquet").replace("'", "''")
+    con.execute(f"CREATE VIEW probe AS SELECT * FROM read_parquet('{probe_path}')")
+
+    manifest = read_manifest(repo_root / "data" / "da-vinci-works" / "manifest.parquet",
+                             columns=['filename', 'original_title', 'status'])
+    if manifest is None:
+        manifest = pd.DataFrame(columns=['filename', 'original_title', 'status'], dtype='object')
+    manifest['key'] = manifest['filename'].map(lambda f: Path(f).stem)
+    con.register('da_vinci', manifest)
+
+    met_path = repo_root / "data" / "met-museum" / "MetObjects.parquet"
+    if met_path.exists():
+        escaped = str(met_path).replace("'", "''")
+        con.execute(f"CREATE VIEW met AS SELECT * FROM read_parquet('{escaped}')")
+    else:
+        con.execute('CREATE VIEW met AS SELECT NULL::BIGINT AS "Object ID", NULL::VARCHAR AS "Title", '
+                    'NULL::VARCHAR AS "Department" WHERE false')
+    con.execute("""
+        CREATE VIEW inventory AS
+        SELECT p.*,
+               coalesce(d.original_title, m."Title") AS title,
+               CASE WHEN p.source = 'da_vinci' THEN 'Leonardo da Vinci' ELSE m."Department" END AS department,
+               p.width::DOUBLE / nullif(p.height, 0) AS aspect
+        FROM probe p
+        LEFT JOIN da_vinci d ON p.source = 'da_vinci' AND d.key = p.key
+        LEFT JOIN met m ON p.source = 'met' AND CAST(m."Object ID" AS VARCHAR) = p.key
+    """)
+    return con
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the header-only image inventory")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--min-side', type=int, default=None,
+                        help="Also report how many images have a shorter side of at least this many pixels")
+    args = parser.parse_args()
+
+    build_probe_index(workers=args.workers)
+    with open_inventory() as con:
+        print(con.execute("""
+            SELECT source, format, mode, count(*) AS images,
+                   median(width) AS median_width, median(height) AS median_height,
+                   sum(bytes) / 1e9 AS gb
+            FROM probe WHERE error IS NULL GROUP BY ALL ORDER BY ALL
+        """).df().to_string(index=False))
+        if args.min_side:
+            count = con.execute("SELECT count(*) FROM probe WHERE least(width, height) >= ?",
+                                [args.min_side]).fetchone()[0]
+            print(f"\nImages with shorter side >= {args.min_side}px: {count:,}")
@@ -0,0 +1,186 @@
+"""
+Adaptive per-host rate control for HTTP clients.
+
+Each host gets a token bucket whose rate follows AIMD (additive increase,
+multiplicative decrease): every successful response nudges the rate up,
+while a 429/503 (or latency above a target) cuts it. `Retry-After` pauses
+the whole host until the server says it is ready. RateLimitedAdapter
+applies this under a requests session and retries throttled requests, so
+callers run at the highest rate the server tolerates without tuning.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds carried by a Retry-After header, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket with an AIMD-adjusted rate.
+
+    Args:
+        rate: Initial requests per second
+        min_rate: Lower bound for the rate
+        max_rate: Upper bound for the rate
+        increase: Requests/second added per second of successful traffic
+        decrease: Factor applied to the rate on throttling
+        target_latency: Optional latency (seconds) above which the rate is
+                        gently reduced, before the server starts throttling
+        cooldown: Minimum seconds between two decreases, so one burst of
+                  429s from in-flight requests counts once
+        burst_seconds: Bucket capacity, in seconds of traffic at the current rate
+    """
+
+    def __init__(self, rate=10.0, min_rate=0.5, max_rate=100.0, increase=1.0, decrease=0.5,
+                 target_latency=None, cooldown=2.0, burst_seconds=1.0):
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.burst_seconds = burst_seconds
+        self.throttled = 0
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent; returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            burst = max(1.0, self.rate * self.burst_seconds)
+            self._tokens = min(burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve a token now; a negative balance queues this caller behind the others
+            self._tokens -= 1
+            wait = max(self._blocked_until - now, -self._tokens / self.rate if self._tokens < 0 else 0.0)
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+    def _cut(self, factor, now):
+        if now - self._last_decrease >= self.cooldown:
+            self.rate = max(self.min_rate, self.rate * factor)
+            self._last_decrease = now
+
+    def on_success(self, latency=None):
+        """Additive increase, or a gentle cut if latency exceeds the target."""
+        with self._lock:
+            if self.target_latency is not None and latency is not None and latency > self.target_latency:
+                self._cut(0.9, time.monotonic())
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after=None):
+        """Multiplicative decrease; pause the host for `retry_after` seconds if given."""
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            self._cut(self.decrease, now)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+
+class RateController:
+    """
+    One AdaptiveRateLimiter per host.
+
+    Args:
+        limits: Dict of hostname -> dict of AdaptiveRateLimiter arguments
+        default: Arguments for hosts not listed in `limits`
+    """
+
+    def __init__(self, limits=None, default=None):
+        self.limits = dict(limits or {})
+        self.default = dict(default or {})
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url):
+        """Return the limiter of the URL's host."""
+        host = urlparse(url).hostname
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = AdaptiveRateLimiter(**self.limits.get(host, self.default))
+            return self._limiters[host]
+
+    def summary(self):
+        """Current rate and number of throttled responses per host."""
+        with self._lock:
+            return {host: {"rate": round(limiter.rate, 2), "throttled": limiter.throttled}
+                    for host, limiter in self._limiters.items()}
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that paces requests through a RateController and retries
+    429/503 responses and connection errors with backoff.
+
+    Args:
+        controller: RateController shared by every session using it
+        max_retries: Retries per request before the last response (or error)
+                     is returned to the caller
+        backoff: Base delay in seconds for exponential backoff with jitter
+                 when the server sends no Retry-After
+    """
+
+    def __init__(self, controller, max_retries=5, backoff=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.controller = controller
+        self.retries = max_retries
+        self.backoff = backoff
+
+    def send(self, request, **kwargs):
+        limiter = self.controller.for_url(request.url)
+        for attempt in range(self.retries + 1):
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                continue
+
+            if response.status_code not in THROTTLE_STATUSES:
+                limiter.on_success(time.monotonic() - start)
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            limiter.on_throttle(retry_after)
+            if attempt == self.retries:
+                return response
+            response.close()
+            if retry_after is None:
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        return response
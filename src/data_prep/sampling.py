@@ -0,0 +1,389 @@
+"""
+Deterministic splits and class-balanced sample streams over da Vinci + Met.
+
+Every record's train/val/test split comes from a hash of its key. Records
+in a near-duplicate cluster (data/dedup/clusters.parquet) are hashed by
+the key of the cluster's earliest-indexed member, so a cluster never
+straddles two splits and that member keeps the split it had as a
+singleton. Adding objects therefore never moves existing ones between
+splits.
+
+Met samples are drawn by weighted reservoir (priority) sampling over the
+catalog, streamed in record batches. Each object's priority is also
+derived from a hash, so memory grows with the sample size rather than the
+collection, and the sample does not depend on batch boundaries.
+balanced_stream mixes the few hundred da Vinci works with Met samples at
+a fixed ratio.
+
+Run from src/ with: python -m data_prep.sampling --seed 0
+"""
+
+import argparse
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .manifest_writer import read_manifest
+from .met_museum.catalog import MetCatalog
+from .met_museum.sharding import splitmix64
+
+
+SPLITS = (('train', 0.8), ('val', 0.1), ('test', 0.1))
+
+SAMPLE_MODES = ('uniform', 'proportional', 'balanced', 'weighted')
+
+
+def _derive_seed(*parts):
+    """Independent 32-bit seed for each use of the user's seed (splits, samples, epochs)."""
+    return int.from_bytes(hashlib.blake2b(repr(parts).encode(), digest_size=4).digest(), 'little')
+
+
+def hash_uniform(keys, seed=0):
+    """
+    Map keys to deterministic floats in [0, 1).
+
+    Integer keys (Met object IDs) are hashed with vectorized splitmix64,
+    other keys through BLAKE2b of their string form.
+    """
+    keys = np.asarray(keys)
+    if np.issubdtype(keys.dtype, np.integer):
+        hashes = splitmix64(keys, seed)
+    else:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=8).digest(), 'little')
+             for key in keys),
+            dtype=np.uint64, count=len(keys),
+        )
+    return (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _hash_labels(labels, seed):
+    """hash_uniform of mixed labels, hashing integers and strings the way hash_uniform does for keys."""
+    u = np.empty(len(labels), dtype=np.float64)
+    is_int = np.fromiter((isinstance(label, (int, np.integer)) for label in labels), dtype=bool, count=len(labels))
+    if is_int.any():
+        u[is_int] = hash_uniform(labels[is_int].astype(np.int64), seed)
+    if (~is_int).any():
+        u[~is_int] = hash_uniform(labels[~is_int], seed)
+    return u
+
+
+def assign_splits(keys, fractions=SPLITS, seed=0, groups=None):
+    """
+    Assign each key to a split from its hash.
+
+    Args:
+        keys: Array of record keys
+        fractions: (name, fraction) pairs; fractions are normalised
+        seed: Split seed; each seed gives an independent assignment
+        groups: Optional array aligned with `keys` holding a group label
+                or None; grouped keys are hashed by their label instead of
+                their own key, so a whole group lands in one split. Labels
+                are record keys (see load_groups), so the record a group is
+                labelled by keeps the split it had on its own
+
+    Returns:
+        np.ndarray: Split name of every key
+    """
+    names = np.asarray([name for name, _ in fractions], dtype=object)
+    bounds = np.cumsum([fraction for _, fraction in fractions], dtype=np.float64)
+    bounds /= bounds[-1]
+    split_seed = _derive_seed('split', seed)
+    u = hash_uniform(keys, split_seed)
+    if groups is not None:
+        groups = np.asarray(groups, dtype=object)
+        grouped = pd.notna(groups)
+        if grouped.any():
+            u[grouped] = _hash_labels(groups[grouped], split_seed)
+    return names[np.minimum(np.searchsorted(bounds, u, side='right'), len(names) - 1)]
+
+
+def load_groups(repo_root=None):
+    """
+    Near-duplicate clusters from the dedup index.
+
+    A cluster is labelled by the key of its root, its earliest-indexed
+    member (an integer object ID for Met, the filename stem for da Vinci).
+    The root hashes to the same split as before it had duplicates, and
+    records joining the cluster later follow it.
+
+    Returns:
+        dict: source -> {key: root key} for clustered records (empty without an index)
+    """
+    repo_root = Path(repo_root) if repo_root else Path(__file__).parent.parent.parent
+    clusters_path = repo_root / "data" / "dedup" / "clusters.parquet"
+    if not clusters_path.exists():
+        return {}
+    clusters = pd.read_parquet(clusters_path, columns=['source', 'key', 'dup_cluster'])
+    # dup_cluster is the row position of the cluster's root in the index
+    labels = [int(key) if source == 'met' else key for source, key in zip(clusters['source'], clusters['key'])]
+    clusters['label'] = pd.Series(labels, dtype=object)
+    clustered = clusters[clusters['dup_cluster'] >= 0]
+    roots = clusters['label'].to_numpy()[clustered['dup_cluster'].to_numpy()]
+    return {source: dict(zip(rows['key'], roots[clustered['source'].to_numpy() == source]))
+            for source, rows in clustered.groupby('source', sort=False)}
+
+
+class Reservoir:
+    """
+    Weighted sample of `k` keys without replacement, fed in batches.
+
+    Uses Efraimidis-Spirakis priorities log(u) / weight with `u` hashed from
+    the key, keeping the k largest; memory is O(k + batch).
+
+    Args:
+        k: Sample size
+        seed: Sampling seed (independent of the split seed)
+    """
+
+    def __init__(self, k, seed=0):
+        self.k = k
+        self.seed = seed
+        self.seen = 0
+        self._keys = None
+        self._priorities = np.empty(0)
+
+    def add(self, keys, weights=None):
+        """Offer a batch of keys, optionally with positive weights."""
+        keys = np.asarray(keys)
+        if not len(keys) or not self.k:
+            return
+        self.seen += len(keys)
+        with np.errstate(divide='ignore'):
+            priorities = np.log(hash_uniform(keys, self.seed))
+        if weights is not None:
+            priorities = priorities / np.asarray(weights, dtype=np.float64)
+        if self._keys is None:
+            self._keys, self._priorities = keys, priorities
+        else:
+            self._keys = np.concatenate([self._keys, keys])
+            self._priorities = np.concatenate([self._priorities, priorities])
+        if len(self._keys) > self.k:
+            keep = np.argpartition(-self._priorities, self.k - 1)[:self.k]
+            self._keys, self._priorities = self._keys[keep], self._priorities[keep]
+
+    def sample(self):
+        """The sampled keys, highest priority first."""
+        if self._keys is None:
+            return np.empty(0, dtype=np.int64)
+        return self._keys[np.argsort(-self._priorities, kind='stable')]
+
+
+def da_vinci_keys(split='train', fractions=SPLITS, seed=0, groups=None, repo_root=None):
+    """
+    Keys (filename stems, as in the derivative index) of downloaded da Vinci works in `split`.
+
+    Returns:
+        np.ndarray: Keys in manifest order
+    """
+    repo_root = Path(repo_root) if repo_root else Path(__file__).parent.parent.parent
+    manifest = read_manifest(repo_root / "data" / "da-vinci-works" / "manifest.parquet",
+                             columns=['filename', 'status'])
+    if manifest is None:
+        return np.empty(0, dtype=object)
+    keys = manifest.loc[manifest['status'] == 'success', 'filename'].map(lambda f: Path(f).stem).to_numpy()
+    dv_groups = (groups or {}).get('da_vinci', {})
+    group_of = np.asarray([dv_groups.get(key) for key in keys], dtype=object)
+    return keys[assign_splits(keys, fractions, seed, groups=group_of) == split]
+
+
+def _met_splits(ids, fractions, seed, met_groups):
+    group_of = pd.Series(ids.astype(str)).map(met_groups).to_numpy() if met_groups else None
+    return assign_splits(ids, fractions, seed, groups=group_of)
+
+
+def sample_met(n, split='train', stratify_by='Department', mode='proportional', weights=None,
+               fractions=SPLITS, seed=0, epoch=0, groups=None, parquet_path=None, batch_size=65536):
+    """
+    Sample public domain Met object IDs from one split in a single streaming pass.
+
+    Args:
+        n: Sample size
+        split: Split to sample from
+        stratify_by: Catalog column defining strata (e.g. 'Department')
+        mode: 'uniform' (one reservoir over everything), 'proportional'
+              (strata allocated by size), 'balanced' (equal share per
+              stratum, capped by its size) or 'weighted' (priority by
+              `weights[stratum]`, default 1)
+        weights: Dict of stratum -> weight for mode 'weighted'
+        fractions: Split fractions, as in assign_splits
+        seed: Seed shared with the splits
+        epoch: Draws a different (still deterministic) sample per epoch
+        groups: Output of load_groups(), to keep duplicate clusters together
+        parquet_path: MetObjects.parquet (defaults to data/met-museum)
+        batch_size: Catalog rows read per batch
+
+    Returns:
+        np.ndarray: int64 object IDs, in random order
+    """
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f"mode must be one of {SAMPLE_MODES}")
+    sample_seed = _derive_seed('sample', seed, epoch)
+    met_groups = (groups or {}).get('met', {})
+    columns = ['Object ID'] + ([stratify_by] if mode != 'uniform' else [])
+    share = dict(fractions)[split] / sum(fraction for _, fraction in fractions)
+
+    with MetCatalog(parquet_path) as catalog:
+        if mode in ('proportional', 'balanced'):
+            # Split sizes are known in expectation from the hash, so allocate on that
+            population = {stratum: count * share
+                          for stratum, count in catalog.value_counts(stratify_by, public_domain=True).items()}
+            total = sum(population.values())
+            if mode == 'proportional':
+                sizes = {s: int(round(n * p / total)) for s, p in population.items()}
+            else:
+                sizes = {s: int(min(p, n / len(population))) for s, p in population.items()}
+            reservoirs = {s: Reservoir(size, sample_seed) for s, size in sizes.items()}
+        else:
+            reservoir = Reservoir(n, sample_seed)
+
+        for batch in catalog.batches(columns, batch_size=batch_size, public_domain=True):
+            ids = batch.column('Object ID').to_numpy()
+            in_split = _met_splits(ids, fractions, seed, met_groups) == split
+            if mode == 'uniform':
+                reservoir.add(ids[in_split])
+                continue
+            strata = batch.column(stratify_by).to_pandas().to_numpy()[in_split]
+            ids = ids[in_split]
+            if mode == 'weighted':
+                reservoir.add(ids, weights=[(weights or {}).get(s, 1.0) for s in strata])
+                continue
+            for stratum in pd.unique(strata):
+                if stratum in reservoirs:
+                    reservoirs[stratum].add(ids[strata == stratum])
+
+    if mode in ('proportional', 'balanced'):
+        sample = np.concatenate([r.sample() for r in reservoirs.values()] or [np.empty(0, np.int64)])
+    else:
+        sample = reservoir.sample()
+    return np.random.default_rng(sample_seed).permutation(sample.astype(np.int64))
+
+
+def balanced_stream(batch_size=64, split='train', ratio=0.5, met_pool_size=10_000,
+                    stratify_by='Department', mode='proportional', fractions=SPLITS, seed=0,
+                    num_batches=None, groups=None, parquet_path=None):
+    """
+    Yield mixed batches of da Vinci and Met records at a fixed expected ratio.
+
+    The da Vinci keys of the split are cycled, reshuffled every pass; Met
+    keys come from a pool of `met_pool_size` drawn by sample_met, which is
+    redrawn (as the next epoch) once used up. Memory is bounded by the pool.
+
+    Args:
+        batch_size: Records per batch
+        split: Split to draw from
+        ratio: Expected share of da Vinci records per batch
+        met_pool_size: Met objects sampled per pool
+        stratify_by: Passed to sample_met
+        mode: Passed to sample_met
+        fractions: Split fractions, as in assign_splits
+        seed: Seed for splits, pools and batch composition
+        num_batches: Stop after this many batches (None: endless)
+        groups: Output of load_groups()
+        parquet_path: MetObjects.parquet (defaults to data/met-museum)
+
+    Yields:
+        list: (source, key) tuples, with keys as used by the derivative index
+    """
+    rng = np.random.default_rng(_derive_seed('stream', seed))
+    dv_keys = da_vinci_keys(split, fractions, seed, groups=groups)
+    if ratio > 0 and not len(dv_keys):
+        raise ValueError(f"No downloaded da Vinci works in split '{split}'")
+
+    dv_order, dv_pos = rng.permutation(len(dv_keys)), 0
+    epoch, met_pool, met_pos = 0, None, 0
+    produced = 0
+    while num_batches is None or produced < num_batches:
+        n_dv = rng.binomial(batch_size, ratio)
+        batch = []
+        for _ in range(n_dv):
+            if dv_pos == len(dv_order):
+                dv_order, dv_pos = rng.permutation(len(dv_keys)), 0
+            batch.append(('da_vinci', dv_keys[dv_order[dv_pos]]))
+            dv_pos += 1
+        for _ in range(batch_size - n_dv):
+            if met_pool is None or met_pos == len(met_pool):
+                met_pool = sample_met(met_pool_size, split, stratify_by, mode, fractions=fractions,
+                                      seed=seed, epoch=epoch, groups=groups, parquet_path=parquet_path)
+                if not len(met_pool):
+                    raise ValueError(f"No Met objects in split '{split}'")
+                epoch, met_pos = epoch + 1, 0
+            batch.append(('met', str(met_pool[met_pos])))
+            met_pos += 1
+        rng.shuffle(batch)
+        yield batch
+        produced += 1
+
+
+def write_splits(output_path='data/splits.parquet', fractions=SPLITS, seed=0, parquet_path=None,
+                 batch_size=65536):
+    """
+    Write the split of every da Vinci work and public domain Met object.
+
+    Met rows are written batch by batch, so the collection is never held in memory.
+
+    Args:
+        output_path: Parquet file (relative to repo root) with source, key, split
+        fractions: Split fractions, as in assign_splits
+        seed: Split seed
+        parquet_path: MetObjects.parquet (defaults to data/met-museum)
+        batch_size: Catalog rows read per batch
+
+    Returns:
+        pd.DataFrame: Row counts per source and split
+    """
+    repo_root = Path(__file__).parent.parent.parent
+    output_path = repo_root / output_path
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    groups = load_groups(repo_root)
+    schema = pa.schema([('source', pa.string()), ('key', pa.string()), ('split', pa.string())])
+    counts = {}
+
+    def write(writer, source, keys, splits):
+        writer.write_table(pa.table({'source': [source] * len(keys), 'key': keys.astype(str),
+                                     'split': splits.astype(str)}, schema=schema))
+        for name, count in zip(*np.unique(splits.astype(str), return_counts=True)):
+            counts[(source, name)] = counts.get((source, name), 0) + int(count)
+
+    tmp_path = output_path.with_name(f".{output_path.name}.part")
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for name, _ in fractions:
+            keys = da_vinci_keys(name, fractions, seed, groups=groups, repo_root=repo_root)
+            write(writer, 'da_vinci', keys, np.full(len(keys), name, dtype=object))
+        with MetCatalog(parquet_path) as catalog:
+            for batch in catalog.batches(['Object ID'], batch_size=batch_size, public_domain=True):
+                ids = batch.column('Object ID').to_numpy()
+                write(writer, 'met', ids, _met_splits(ids, fractions, seed, groups.get('met', {})))
+    tmp_path.replace(output_path)
+
+    return pd.DataFrame([(source, name, count) for (source, name), count in sorted(counts.items())],
+                        columns=['source', 'split', 'count'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write train/val/test splits and preview a balanced stream")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='data/splits.parquet')
+    parser.add_argument('--ratio', type=float, default=0.5, help="Share of da Vinci records per batch")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--preview-batches', type=int, default=0,
+                        help="Draw this many training batches and report their composition")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Writing splits (seed {args.seed})")
+    print("=" * 60)
+    counts = write_splits(args.output, seed=args.seed)
+    print(counts.pivot(index='split', columns='source', values='count').fillna(0).astype(int).to_string())
+    print(f"\n✓ Splits saved to: {Path(__file__).parent.parent.parent / args.output}")
+
+    if args.preview_batches:
+        stream = balanced_stream(args.batch_size, ratio=args.ratio, seed=args.seed,
+                                 num_batches=args.preview_batches, groups=load_groups())
+        dv = sum(source == 'da_vinci' for batch in stream for source, _ in batch)
+        total = args.preview_batches * args.batch_size
+        print(f"✓ {args.preview_batches} batches: {dv / total:.1%} da Vinci records")
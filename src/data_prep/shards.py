@@ -0,0 +1,359 @@
+"""
+Sharded, training-ready image store.
+
+Images and their manifest rows are packed into fixed-size tar shards
+(WebDataset layout: `<key>.<ext>` followed by `<key>.json`). Each shard
+has a sidecar `.idx.jsonl` index with the byte offset of every record,
+appended as records are written, so a reader can either stream shards
+sequentially or fetch any record by key with a single seek.
+
+Run from src/ with: python -m data_prep.shards
+"""
+
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+
+SHARD_PATTERN = re.compile(r"^(?P<prefix>.+)-(?P<index>\d{6})\.tar$")
+
+
+def _shard_name(prefix, index):
+    return f"{prefix}-{index:06d}.tar"
+
+
+def _index_path(shard_path):
+    return Path(shard_path).with_suffix('.idx.jsonl')
+
+
+def _repair_shard(shard_path):
+    """
+    Cut a shard left behind by an interrupted writer back to its last indexed record.
+
+    Bytes after the last complete record in the index (a half-written
+    member, or one written just before the crash without an index line)
+    are truncated and the end-of-archive marker is written, so the shard
+    is a valid tar again. Index lines that are partial or point past the
+    end of the file are dropped.
+
+    Returns:
+        bool: True if the shard or its index had to be repaired
+    """
+    index_path = _index_path(shard_path)
+    size = shard_path.stat().st_size
+    entries, lines_ok = [], True
+    if index_path.exists():
+        with open(index_path, encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    lines_ok = False
+                    break
+                entry = json.loads(line)
+                if entry["meta_offset"] + entry["meta_size"] > size:
+                    lines_ok = False
+                    break
+                entries.append(entry)
+
+    last = entries[-1] if entries else None
+    end = 0 if last is None else last["meta_offset"] + last["meta_size"]
+    end += -end % tarfile.BLOCKSIZE
+    with open(shard_path, 'r+b') as f:
+        f.seek(end)
+        finished = f.read(2 * tarfile.BLOCKSIZE) == tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+        if not finished:
+            f.truncate(end)
+            f.seek(end)
+            f.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+    if not lines_ok:
+        tmp_path = index_path.with_name(f".{index_path.name}.part")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        os.replace(tmp_path, index_path)
+    return not finished or not lines_ok
+
+
+def _existing_shards(output_dir, prefix):
+    """Return {shard index: path} of shards already in `output_dir`."""
+    shards = {}
+    for path in Path(output_dir).glob(f"{prefix}-*.tar"):
+        match = SHARD_PATTERN.match(path.name)
+        if match and match.group('prefix') == prefix:
+            shards[int(match.group('index'))] = path
+    return dict(sorted(shards.items()))
+
+
+class ShardWriter:
+    """
+    Append records to a rolling series of tar shards.
+
+    A new shard is started whenever the current one reaches `max_bytes`
+    or `max_records`. Opening a writer on a directory that already holds
+    shards continues with the next shard number, so packing can run
+    incrementally as downloads complete. The last existing shard is first
+    cut back to its last indexed record, in case an earlier writer died
+    halfway through a record.
+
+    Args:
+        output_dir: Directory for shards and their indexes
+        prefix: Shard filename prefix
+        max_bytes: Target maximum size of one shard
+        max_records: Optional maximum number of records per shard
+    """
+
+    def __init__(self, output_dir, prefix='shard', max_bytes=1024**3, max_records=None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+
+        existing = _existing_shards(self.output_dir, prefix)
+        if existing and _repair_shard(existing[max(existing)]):
+            print(f"Repaired unfinished shard {existing[max(existing)].name}")
+        self._next_index = max(existing, default=-1) + 1
+        self._tar = None
+        self._index_file = None
+        self._records = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_next(self):
+        self._close_current()
+        shard_path = self.output_dir / _shard_name(self.prefix, self._next_index)
+        self._next_index += 1
+        self._tar = tarfile.open(shard_path, 'w', format=tarfile.PAX_FORMAT)
+        self._index_file = open(_index_path(shard_path), 'w', encoding='utf-8')
+        self._shard_name = shard_path.name
+        self._records = 0
+
+    def _close_current(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._index_file.close()
+            self._tar = None
+            self._index_file = None
+
+    def _add_member(self, name, fileobj, size):
+        """Add one member and return the offset of its data within the shard."""
+        info = tarfile.TarInfo(name)
+        info.size = size
+        data_offset = self._tar.offset + len(info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors))
+        self._tar.addfile(info, fileobj)
+        return data_offset
+
+    def write(self, key, data, metadata=None, ext='.jpg', size=None):
+        """
+        Add one record to the current shard.
+
+        Args:
+            key: Unique record key (e.g. manifest filename stem or object ID)
+            data: Image bytes, or a binary file object to stream from
+            metadata: Dict stored alongside the image as `<key>.json`
+            ext: Extension of the image member
+            size: Byte size of `data` when it is a file object
+
+        Returns:
+            dict: Index entry of the written record
+        """
+        key = str(key)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            size = len(data)
+            data = io.BytesIO(data)
+        meta_bytes = json.dumps(metadata or {}, default=str).encode('utf-8')
+
+        with self._lock:
+            full = self._tar is not None and (
+                self._tar.offset >= self.max_bytes
+                or (self.max_records is not None and self._records >= self.max_records)
+            )
+            if self._tar is None or full:
+                self._open_next()
+
+            offset = self._add_member(f"{key}{ext}", data, size)
+            meta_offset = self._add_member(f"{key}.json", io.BytesIO(meta_bytes), len(meta_bytes))
+            entry = {
+                "key": key,
+                "shard": self._shard_name,
+                "ext": ext,
+                "offset": offset,
+                "size": size,
+                "meta_offset": meta_offset,
+                "meta_size": len(meta_bytes),
+            }
+            # Data first: an index line must never point at bytes that aren't written
+            self._tar.fileobj.flush()
+            self._index_file.write(json.dumps(entry) + "\n")
+            self._index_file.flush()
+            self._records += 1
+        return entry
+
+    def write_file(self, key, path, metadata=None):
+        """Stream an image file from disk into the current shard."""
+        path = Path(path)
+        with open(path, 'rb') as f:
+            return self.write(key, f, metadata, ext=path.suffix or '.jpg', size=path.stat().st_size)
+
+    def close(self):
+        """Finish the current shard."""
+        with self._lock:
+            self._close_current()
+
+
+class ShardReader:
+    """
+    Read records back from a directory of shards.
+
+    Args:
+        shard_dir: Directory written by ShardWriter
+        prefix: Shard filename prefix
+    """
+
+    def __init__(self, shard_dir, prefix='shard'):
+        self.shard_dir = Path(shard_dir)
+        self.prefix = prefix
+        self.shards = list(_existing_shards(self.shard_dir, prefix).values())
+        self._index = {}
+        self._local = threading.local()
+        for shard_path in self.shards:
+            index_path = _index_path(shard_path)
+            if not index_path.exists():
+                continue
+            with open(index_path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # partially written by a live writer
+                    e = json.loads(line)
+                    self._index[e["key"]] = (e["shard"], e["ext"], e["offset"], e["size"],
+                                             e["meta_offset"], e["meta_size"])
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return str(key) in self._index
+
+    def keys(self):
+        """Return all record keys."""
+        return self._index.keys()
+
+    def _handle(self, shard):
+        # One open file per shard per thread so DataLoader threads don't share offsets
+        handles = getattr(self._local, 'handles', None)
+        if handles is None:
+            handles = self._local.handles = {}
+        if shard not in handles:
+            handles[shard] = open(self.shard_dir / shard, 'rb')
+        return handles[shard]
+
+    def get(self, key):
+        """
+        Random-access one record with a single seek and read.
+
+        Returns:
+            tuple: (image bytes, metadata dict)
+        """
+        shard, _, offset, size, meta_offset, meta_size = self._index[str(key)]
+        f = self._handle(shard)
+        f.seek(offset)
+        # The JSON member directly follows the image, so read both at once
+        block = f.read(meta_offset + meta_size - offset)
+        data = block[:size]
+        metadata = json.loads(block[meta_offset - offset:])
+        return data, metadata
+
+    def __iter__(self):
+        """Stream (key, image bytes, metadata) sequentially through every shard."""
+        for shard_path in self.shards:
+            with tarfile.open(shard_path, 'r|') as tar:
+                pending = {}
+                for member in tar:
+                    key, _, ext = member.name.rpartition('.')
+                    payload = tar.extractfile(member).read()
+                    if ext == 'json':
+                        yield key, pending.pop(key, None), json.loads(payload)
+                    else:
+                        pending[key] = payload
+
+    def index_frame(self):
+        """Return the combined offset index as a DataFrame."""
+        return pd.DataFrame(
+            [(key, *entry) for key, entry in self._index.items()],
+            columns=['key', 'shard', 'ext', 'offset', 'size', 'meta_offset', 'meta_size'],
+        )
+
+
+def pack_manifest(manifest, image_dir, output_dir, key_column='filename', prefix='shard',
+                  max_bytes=1024**3):
+    """
+    Pack every successfully downloaded manifest entry into shards.
+
+    Records already present in `output_dir` are skipped, so this can be
+    re-run as more downloads complete.
+
+    Args:
+        manifest: DataFrame or list of manifest dicts with `key_column` and 'status'
+        image_dir: Directory holding the downloaded images
+        output_dir: Shard directory
+        key_column: Manifest column holding the image filename
+        prefix: Shard filename prefix
+        max_bytes: Target maximum size of one shard
+
+    Returns:
+        int: Number of records written
+    """
+    manifest = pd.DataFrame(manifest)
+    image_dir = Path(image_dir)
+    already_packed = ShardReader(output_dir, prefix).keys() if Path(output_dir).exists() else set()
+
+    written = 0
+    with ShardWriter(output_dir, prefix=prefix, max_bytes=max_bytes) as writer:
+        for row in manifest.to_dict('records'):
+            if row.get('status') != 'success' or not row.get(key_column):
+                continue
+            key = Path(row[key_column]).stem
+            if key in already_packed:
+                continue
+            # Images kept in the content store live at 'object', not under their filename
+            stored = row.get('object')
+            writer.write_file(key, image_dir / (stored if isinstance(stored, str) else row[key_column]),
+                              metadata=row)
+            written += 1
+    return written
+
+
+if __name__ == "__main__":
+    from .manifest_writer import read_manifest
+    from .state import DownloadState
+
+    repo_root = Path(__file__).parent.parent.parent
+    shard_root = repo_root / "data" / "shards"
+
+    print("=" * 60)
+    print("Packing images into shards")
+    print("=" * 60)
+
+    dv_dir = repo_root / "data" / "da-vinci-works"
+    dv_manifest = read_manifest(dv_dir / "manifest.parquet")
+    count = pack_manifest(dv_manifest, dv_dir, shard_root / "da-vinci", prefix='da-vinci')
+    print(f"✓ da Vinci: {count} new records")
+
+    with DownloadState() as state:
+        met_manifest = state.query(
+            "SELECT item_id AS object_id, filename, status, url, bytes, sha256 "
+            "FROM downloads WHERE dataset = 'met' AND status = 'success'"
+        )
+    count = pack_manifest(met_manifest, repo_root / "data" / "met-museum" / "images",
+                          shard_root / "met", prefix='met')
+    print(f"✓ Met: {count} new records")
+    print(f"  Location: {shard_root}")
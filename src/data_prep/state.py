@@ -0,0 +1,228 @@
+"""
+Persistent, crash-safe download state backed by DuckDB.
+
+Every item of a download job (a Met object, a da Vinci work) gets one row
+recording its status, byte count, content hash, HTTP status and number of
+attempts. Updates are buffered and written in batched transactions, so an
+interrupted run can resume from exactly the pending and failed items
+without touching the filesystem.
+
+Example queries:
+
+    state.query("SELECT count(*) FROM downloads "
+                "WHERE http_status = 404 AND department = ?", ['Arms and Armor'])
+"""
+
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    dataset VARCHAR NOT NULL,
+    item_id VARCHAR NOT NULL,
+    department VARCHAR,
+    url VARCHAR,
+    filename VARCHAR,
+    status VARCHAR NOT NULL,
+    bytes BIGINT,
+    sha256 VARCHAR,
+    http_status INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error VARCHAR,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (dataset, item_id)
+)
+"""
+
+RECORD_COLUMNS = ['dataset', 'item_id', 'url', 'filename', 'status',
+                  'bytes', 'sha256', 'http_status', 'error', 'updated_at']
+
+
+class DownloadState:
+    """
+    Job-state table for resumable downloads.
+
+    Args:
+        db_path: DuckDB file (defaults to data/download_state.duckdb)
+        batch_size: Number of buffered results written per transaction
+    """
+
+    def __init__(self, db_path=None, batch_size=1000):
+        if db_path is None:
+            repo_root = Path(__file__).parent.parent.parent
+            db_path = repo_root / "data" / "download_state.duckdb"
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.db_path = Path(db_path)
+        self.batch_size = batch_size
+        self._con = duckdb.connect(str(self.db_path))
+        self._con.execute(SCHEMA)
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def register(self, dataset, item_ids, departments=None, urls=None):
+        """
+        Add items as 'pending'; items already known keep their current state.
+
+        Args:
+            dataset: Job name, e.g. 'met' or 'da_vinci'
+            item_ids: Iterable of item identifiers
+            departments: Optional iterable of departments aligned with item_ids
+            urls: Optional iterable of source URLs aligned with item_ids
+
+        Returns:
+            int: Number of newly registered items
+        """
+        new_items = pd.DataFrame({'item_id': pd.Series(list(item_ids), dtype='object').astype(str)})
+        new_items['department'] = list(departments) if departments is not None else None
+        new_items['url'] = list(urls) if urls is not None else None
+
+        with self._lock:
+            before = self._count(dataset)
+            self._con.register('new_items', new_items)
+            try:
+                self._con.execute("BEGIN TRANSACTION")
+                self._con.execute("""
+                    INSERT INTO downloads (dataset, item_id, department, url, status, attempts)
+                    SELECT ?, item_id, department, url, 'pending', 0 FROM new_items
+                    ON CONFLICT DO NOTHING
+                """, [dataset])
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+            finally:
+                self._con.unregister('new_items')
+            return self._count(dataset) - before
+
+    def _count(self, dataset):
+        return self._con.execute(
+            "SELECT count(*) FROM downloads WHERE dataset = ?", [dataset]
+        ).fetchone()[0]
+
+    def pending(self, dataset, max_attempts=None):
+        """
+        List items still to download: never attempted, or failed.
+
+        Args:
+            dataset: Job name
+            max_attempts: Skip failed items already tried this many times
+
+        Returns:
+            list: Item IDs (as strings) to (re)try
+        """
+        sql = "SELECT item_id FROM downloads WHERE dataset = ? AND status IN ('pending', 'failed')"
+        params = [dataset]
+        if max_attempts is not None:
+            sql += " AND attempts < ?"
+            params.append(max_attempts)
+        with self._lock:
+            return [row[0] for row in self._con.execute(sql + " ORDER BY item_id", params).fetchall()]
+
+    def completed(self, dataset, statuses=('success',)):
+        """
+        Return the set of item IDs whose download succeeded.
+
+        Args:
+            dataset: Job name
+            statuses: Final statuses counted as completed, e.g. add
+                      'no_image' for objects that have nothing to fetch
+        """
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT item_id FROM downloads WHERE dataset = ? AND status IN (SELECT unnest(?::VARCHAR[]))",
+                [dataset, list(statuses)],
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def record(self, dataset, item_id, status, url=None, filename=None, bytes=None,
+               sha256=None, http_status=None, error=None):
+        """
+        Buffer the outcome of one download attempt; flushed in batches.
+        """
+        row = (dataset, str(item_id), url, filename, status, bytes, sha256,
+               http_status, error, datetime.now(timezone.utc).replace(tzinfo=None))
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        """Write all buffered results in a single transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        updates = pd.DataFrame(self._buffer, columns=RECORD_COLUMNS)
+        updates['bytes'] = updates['bytes'].astype('Int64')
+        updates['http_status'] = updates['http_status'].astype('Int32')
+        # Last write wins when an item appears twice in one batch
+        updates = updates.drop_duplicates(['dataset', 'item_id'], keep='last')
+
+        self._con.register('updates', updates)
+        try:
+            self._con.execute("BEGIN TRANSACTION")
+            self._con.execute("""
+                INSERT INTO downloads (dataset, item_id, url, filename, status, bytes,
+                                       sha256, http_status, attempts, error, updated_at)
+                SELECT dataset, item_id, url, filename, status, bytes,
+                       sha256, http_status, 1, error, updated_at
+                FROM updates
+                ON CONFLICT (dataset, item_id) DO UPDATE SET
+                    url = COALESCE(excluded.url, downloads.url),
+                    filename = COALESCE(excluded.filename, downloads.filename),
+                    status = excluded.status,
+                    bytes = excluded.bytes,
+                    sha256 = excluded.sha256,
+                    http_status = excluded.http_status,
+                    attempts = downloads.attempts + 1,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+            """)
+            self._con.execute("COMMIT")
+        except Exception:
+            self._con.execute("ROLLBACK")
+            raise
+        finally:
+            self._con.unregister('updates')
+        self._buffer.clear()
+
+    def summary(self, dataset=None):
+        """
+        Count items by dataset, status and HTTP status.
+
+        Returns:
+            pd.DataFrame: One row per (dataset, status, http_status)
+        """
+        sql = "SELECT dataset, status, http_status, count(*) AS items, sum(bytes) AS bytes FROM downloads"
+        params = []
+        if dataset is not None:
+            sql += " WHERE dataset = ?"
+            params.append(dataset)
+        sql += " GROUP BY ALL ORDER BY ALL"
+        return self.query(sql, params)
+
+    def query(self, sql, params=None):
+        """Run an arbitrary SQL query against the state table and return a DataFrame."""
+        self.flush()
+        with self._lock:
+            return self._con.execute(sql, params or []).df()
+
+    def close(self):
+        """Flush pending results and close the database."""
+        with self._lock:
+            self._flush_locked()
+            self._con.close()
@@ -0,0 +1,47 @@
+"""
+leofinder command line entry point.
+
+Runs the data pipeline (scrape, catalog, fetch, preprocess, pack, details) with
+overlapping stages; see data_prep.pipeline.
+
+Run from src/ with: python main.py [--no-met] [--met-limit 1000] ...
+"""
+
+import argparse
+import sys
+
+from data_prep.pipeline import STAGES, run_pipeline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='leofinder', description="Build the da Vinci + Met training data")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES),
+                        help="Stages to run (default: all)")
+    parser.add_argument('--no-da-vinci', action='store_true', help="Skip the da Vinci source")
+    parser.add_argument('--no-met', action='store_true', help="Skip the Met source")
+    parser.add_argument('--scrape-workers', type=int, default=4)
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--preprocess-workers', type=int, default=None)
+    parser.add_argument('--queue-size', type=int, default=256, help="Capacity of each stage's queue")
+    parser.add_argument('--met-limit', type=int, default=None, help="Only fetch the first N pending Met objects")
+    parser.add_argument('--force', action='store_true', help="Re-run stages even if their inputs are unchanged")
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args(argv)
+
+    errors = run_pipeline(
+        stages=args.stages,
+        da_vinci=not args.no_da_vinci,
+        met=not args.no_met,
+        scrape_workers=args.scrape_workers,
+        fetch_workers=args.fetch_workers,
+        preprocess_workers=args.preprocess_workers,
+        queue_size=args.queue_size,
+        met_limit=args.met_limit,
+        force=args.force,
+        timeout=args.timeout,
+    )
+    return 1 if any(errors.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Smoke tests for packing derivatives into the memory-mapped array and reading it back."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+from data_prep.dataset import (LABEL_DA_VINCI, LABEL_OTHER, MemmapImageDataset,
+                               MemmapImageIterableDataset, build_image_array)
+from data_prep.preprocess import derivative_path
+
+
+SIZE = 32
+
+
+def _write_derivatives(root, shapes):
+    """Write one solid-colour derivative per (source, key, width, height) and their index."""
+    rows = []
+    for i, (source, key, width, height) in enumerate(shapes):
+        sha256 = f"{i:02x}" * 32
+        path = derivative_path(root, SIZE, sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('RGB', (width, height), (10 * i, 100, 200)).save(path, quality=95)
+        rows.append({"source": source, "key": key, "sha256": sha256, "width": width, "height": height})
+    index = pd.DataFrame(rows, columns=['source', 'key', 'sha256', 'width', 'height'])
+    index.to_parquet(root / "index.parquet", index=False)
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    derivatives, arrays = tmp_path / "derivatives", tmp_path / "arrays"
+    derivatives.mkdir()
+    return derivatives, arrays
+
+
+def test_pack_and_read(dirs):
+    derivatives, arrays = dirs
+    _write_derivatives(derivatives, [('da_vinci', 'Mona-Lisa', SIZE, 24),
+                                     ('da_vinci', 'Study', 16, SIZE),
+                                     ('met', '436535', SIZE, SIZE)])
+    build_image_array(size=SIZE, derivatives_dir=str(derivatives), output_dir=str(arrays), workers=1)
+
+    dataset = MemmapImageDataset(size=SIZE, array_dir=str(arrays))
+    assert len(dataset) == 3
+    image, label = dataset[0]
+    assert image.shape == (3, SIZE, SIZE)
+    assert label.item() == LABEL_DA_VINCI
+    assert dataset[2][1].item() == LABEL_OTHER
+    # Letterboxed: the 32x24 image leaves black bars above and below
+    assert image[:, 0].sum() == 0 and image[:, SIZE // 2].sum() > 0
+
+    iterable = MemmapImageIterableDataset(size=SIZE, array_dir=str(arrays), block_size=2)
+    assert sorted(label.item() for _, label in iterable) == [LABEL_OTHER, LABEL_DA_VINCI, LABEL_DA_VINCI]
+
+
+def test_empty_index(dirs):
+    derivatives, arrays = dirs
+    _write_derivatives(derivatives, [])
+    build_image_array(size=SIZE, derivatives_dir=str(derivatives), output_dir=str(arrays), workers=1)
+
+    dataset = MemmapImageDataset(size=SIZE, array_dir=str(arrays))
+    assert len(dataset) == 0
+    assert dataset.images.shape == (0, SIZE, SIZE, 3)
+    assert list(MemmapImageIterableDataset(size=SIZE, array_dir=str(arrays))) == []
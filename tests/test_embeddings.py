@@ -0,0 +1,23 @@
+"""IVF index over an embedding store, including an empty one."""
+
+import numpy as np
+
+from data_prep.embeddings import EmbeddingStore
+
+
+def test_empty_store_builds_an_empty_index(tmp_path):
+    store = EmbeddingStore("clip", "v1", dim=8, root=str(tmp_path))
+    index = store.build_index()
+
+    rows, scores = store.load_index().search(np.ones(8), 5, store.vectors)
+    assert len(index.centroids) == 0
+    assert len(rows) == 0 and len(scores) == 0
+
+
+def test_nearest_after_append(tmp_path):
+    store = EmbeddingStore("clip", "v1", dim=4, root=str(tmp_path))
+    store.append(["met/1", "met/2", "da_vinci/Mona-Lisa"],
+                 [[1, 0, 0, 0], [0, 1, 0, 0], [0.9, 0.1, 0, 0]])
+    store.build_index(nlist=2)
+
+    assert [r for r, _ in store.nearest("da_vinci/Mona-Lisa", k=1, nprobe=2)] == ["met/1"]
@@ -0,0 +1,36 @@
+"""Compaction merges rewritten manifest entries column by column."""
+
+import pandas as pd
+
+from data_prep.da_vinci.downloader import new_manifest_entry
+from data_prep.manifest_writer import ManifestWriter, read_manifest
+
+
+def test_rewrite_keeps_metadata_and_extra_columns(tmp_path):
+    manifest_path = tmp_path / "manifest.parquet"
+    entry = new_manifest_entry(1, "Mona Lisa", "https://example.org/mona-lisa.jpg")
+    other = new_manifest_entry(2, "Study", "https://example.org/study.jpg")
+
+    with ManifestWriter(str(manifest_path)) as writer:
+        writer.write_many([{**entry, "status": "failed", "error": "timeout", "year": "1503", "medium": "oil"},
+                           other])
+        writer.compact()
+
+    # Columns only the compacted file has, like dedup's cluster IDs
+    manifest = pd.read_parquet(manifest_path)
+    manifest['dup_cluster'] = [7, -1]
+    manifest.to_parquet(manifest_path, index=False)
+
+    with ManifestWriter(str(manifest_path)) as writer:
+        writer.write({**entry, "status": "success", "sha256": "ab" * 32})
+        assert read_manifest(manifest_path).loc[0, 'year'] == "1503"
+        writer.compact()
+
+    manifest = read_manifest(manifest_path).set_index('original_title')
+    assert list(manifest.index) == ["Mona Lisa", "Study"]
+    row = manifest.loc["Mona Lisa"]
+    assert (row['year'], row['medium'], row['dup_cluster']) == ("1503", "oil", 7)
+    # The outcome of the latest attempt replaces the earlier one
+    assert (row['status'], row['sha256']) == ("success", "ab" * 32)
+    assert pd.isna(row['error'])
+    assert manifest.loc["Study", 'dup_cluster'] == -1
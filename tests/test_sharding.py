@@ -0,0 +1,40 @@
+"""Lease queue: several workers sharing one queue all finish."""
+
+import threading
+
+from benchmarks.fake_server import FakeServer, ServerConfig
+from data_prep.met_museum.bulk_download import download_from_queue
+from data_prep.met_museum.client import MetClient
+from data_prep.met_museum.sharding import LeaseQueue
+from data_prep.state import DownloadState
+
+
+def test_two_workers_drain_queue(tmp_path):
+    object_ids = list(range(1, 301))
+    config = ServerConfig(image_median_bytes=4_000, image_max_bytes=64_000, no_image_rate=0.1)
+    errors = []
+
+    def worker(index, server):
+        try:
+            with LeaseQueue(tmp_path / "queue.sqlite", worker_id=f"worker-{index}", lease_seconds=30,
+                            num_shards=2, shard_index=index) as work, \
+                    DownloadState(tmp_path / f"state-{index}.duckdb") as state, \
+                    MetClient(cache_path=tmp_path / f"cache-{index}.duckdb", api_url=server.api_url) as client:
+                work.fill(object_ids)
+                state.register("met", object_ids)
+                download_from_queue(work, state, client=client, output_dir=str(tmp_path / "images"),
+                                    progress_every=0)
+        except Exception as e:
+            errors.append(e)
+
+    with FakeServer(config) as server:
+        threads = [threading.Thread(target=worker, args=(i, server), daemon=True) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+        assert not any(thread.is_alive() for thread in threads)
+
+    assert errors == []
+    with LeaseQueue(tmp_path / "queue.sqlite") as work:
+        assert work.summary() == {"done": len(object_ids)}